@@ -2,14 +2,25 @@ import argparse
 import os
 
 from FORHD import Main
+from FORHD.const import DETECTORBACKEND, DETECTORINSTANCES
+from FORHD.detectorBackend import BACKENDS
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Run FORHD server')
     parser.add_argument('-v', dest='verbose', action='store_const',
                        const=True, default=False,
                        help='verbose (default : False)')
+    parser.add_argument('-d', dest='detector', choices=sorted(BACKENDS),
+                       default=DETECTORBACKEND,
+                       help='object detector backend (default : %s)' %
+                            DETECTORBACKEND)
+    parser.add_argument('-n', dest='instances', type=int,
+                       default=DETECTORINSTANCES,
+                       help='number of detector instances (default : %d)' %
+                            DETECTORINSTANCES)
 
     args = parser.parse_args()
 
     os.chdir("FORHD")
-    Main(verbose = args.verbose)
+    Main(verbose = args.verbose, detector = args.detector,
+         instances = args.instances)
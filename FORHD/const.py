@@ -3,15 +3,150 @@
 LOCALIP = ""
 LOCALPORT = 8000
 
+# CONST:frameStore.py
+
+# number of frames kept in shared memory, a frame can be read safely until
+# FRAMESTORESLOTS more frames have been received
+FRAMESTORESLOTS = 8
+# maximum size of a decoded photo (3 bytes per pixel), enough for 1920x1080
+FRAMESTORESLOTSIZE = 8*1024*1024
+# besides its full resolution, each photo is kept downscaled by these factors
+# for the consumers that don't need every pixel
+FRAMESTORESCALES = (2,)
+# prefix of the names of the shared memory segments
+FRAMESTOREPREFIX = "FORHD_"
+# where the shared memory segments can be read as files
+SHMDIR = "/dev/shm/"
+
+# CONST:frameDispatcher.py
+
+# how long (in seconds) a consumer waits for a frame before checking that it
+# should still be running
+DISPATCHERTIMEOUT = 1
+
+# CONST:session.py
+
+# maximum number of clients served at once, each of them gets its own
+# FRAMESTORESLOTS slots in the frameStore
+MAXSESSIONS = 4
+# how long (in seconds) a client may stay silent before its session can be
+# given to another one
+SESSIONTTL = 300
+
+# CONST:pacer.py
+
+# number of frames of a client we aim to have in flight
+PACINGINFLIGHT = 2
+# fastest upload rate (in photos per second) we ask a client for
+PACINGMAXRATE = 30.
+# longest time (in seconds) we ask a client to wait before its next upload
+PACINGMAXDELAY = 2.
+# weight of a new latency in the smoothed latency of the frames
+PACINGSMOOTHING = .2
+
+# CONST:frameWindow.py
+
+# maximum number of frames in flight, it must be lower than FRAMESTORESLOTS
+# since the frames are read from the frameStore until they are processed
+FRAMEWINDOWSIZE = 4
+
 # CONST:httpHandler.py
 
-# Path where images from the HoloLens will be stored
-IMGPATH = "imgs/HLImage.jpg"
-# Path where matrices from the HoloLens will be stored
-MATSPATH = "imgs/HLMats"
+# header of a PUT request asking to wait (at most its value in milliseconds)
+# for the results of the frame it sends
+WAITRESULTSHEADER = "X-Wait-Results"
+# header of the answer to a PUT request giving the id of the frame it sent
+FRAMEIDHEADER = "X-Frame-Id"
+# header naming the session of a request, the address of the client is used
+# when it is missing
+SESSIONHEADER = "X-Session-Id"
+# header of the answers carrying the rays, giving how long (in milliseconds)
+# the client should wait before sending its next photo (see Pacer)
+UPLOADDELAYHEADER = "X-Upload-Delay"
+# how long (in seconds) the collector waits for results before checking that
+# it should still be running
+COLLECTORTIMEOUT = 1
+# how long (in seconds) an idle keep-alive connection stays open
+KEEPALIVETIMEOUT = 60
+# uploads starting with UPLOADMAGIC carry binary matrices (see
+# HttpHandler.splitImageMats)
+UPLOADMAGIC = b"FHDM"
+UPLOADVERSION = 1
+# GET path streaming the rays as server-sent events
+STREAMPATH = "/rays/stream"
+# GET path long-polling the rays
+POLLPATH = "/rays/poll"
+# how often (in seconds) we send something on an idle stream
+STREAMKEEPALIVE = 15
+# how long (in milliseconds) a long-poll waits by default
+STREAMPOLLTIMEOUT = 10000
+# path of the metrics, in the Prometheus text format
+METRICSPATH = "/metrics"
+METRICSCONTENTTYPE = "text/plain; version=0.0.4"
+
+# CONST:metrics.py
+
+# upper bounds (in seconds) of the buckets of the latency histograms
+METRICSBUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1., 2.5,
+                  5., 10.)
+# maximum number of processes recording metrics, each one has its own row
+METRICSWRITERS = 32
+
+# CONST:worldMap.py
+
+# size (in meters) of the cells of the spatial hash of the objects
+WORLDMAPCELLSIZE = .5
+# a ray belongs to an object if it passes closer than WORLDMAPRADIUS meters
+WORLDMAPRADIUS = .3
+# how far (in meters) from the camera objects are looked for along a ray
+WORLDMAPMAXDISTANCE = 8.
+# the position of an object is only estimated once its rays are spread
+# enough, about the square of the sine of the angle between them (.01 is
+# about 6 degrees)
+WORLDMAPMINSPREAD = .01
+# an object is sent again when its position moved by more than
+# WORLDMAPUPDATEDISTANCE meters
+WORLDMAPUPDATEDISTANCE = .1
+# an object still without a position is forgotten after WORLDMAPTTL frames
+# without being seen
+WORLDMAPTTL = 30
+# maximum number of objects in the map, the least recently seen ones are
+# forgotten first
+WORLDMAPMAXOBJECTS = 512
+
+# CONST:knownObjects.py
+
+# rays passing closer than KNOWNOBJECTTOLERANCE meters to an object the client
+# already holds are not sent
+KNOWNOBJECTTOLERANCE = .3
+
+# CONST:rayStream.py
+
+# maximum number of frames buffered for a listener
+STREAMBUFFERSIZE = 32
+# how long (in seconds) a long-polling listener is kept between two polls
+STREAMIDLETIMEOUT = 60
+
+# CONST:rayEncoding.py
+
+BINARYRAYSMAGIC = b"FRAY"
+BINARYRAYSVERSION = 1
+# content type of the binary rays, a request accepting it gets binary rays
+BINARYRAYSCONTENTTYPE = "application/x-forhd-rays"
 
 # CONST:yoloHandler.py
 
+# the detector backend used by default (see detectorBackend.BACKENDS)
+DETECTORBACKEND = "darknet"
+# number of detector instances running side by side
+DETECTORINSTANCES = 2
+# how long (in seconds) a detector may work on a frame, past that we consider
+# it crashed or stuck and give the frame back without any ray so the frames
+# after it aren't held back
+DETECTORFRAMETIMEOUT = 10
+
+# CONST:detectorBackend.py
+
 DARKNETBASEPATH = "darknet/"
 
 # YOLO arguments
@@ -25,10 +160,27 @@ DARKNETMAKECOMMAND = "make"
 PROGRAM = "detector"
 MODE = "test"
 
-# the pipe used by yolo to ask for an input
+# the pipe used by yolo to ask for an input, followed by the index of the
+# instance
 FEEDPIPE = "/tmp/yolofeed"
-# the pipe used by yolo to send the detections back
+# the pipe used by yolo to send the detections back, followed by the index of
+# the instance
 DETECTIONSPIPE = "/tmp/detections"
+# the line yolo sends on DETECTIONSPIPE once all the detections of a frame
+# have been sent
+ENDOFFRAMEMSG = "EndOfFrame"
+
+# detections below that confidence are ignored, NMSTHRESHOLD is the overlap
+# above which two detections of the same class are merged (darknet defaults)
+DETECTIONTHRESHOLD = .24
+NMSTHRESHOLD = .4
+# size of the input of the network in the OpenCV backend (see cfg/yolo.cfg)
+OPENCVINPUTSIZE = 416
+# the detectors read the photo downscaled by DETECTORSCALE (one of
+# FRAMESTORESCALES), the input of the network is smaller than that anyway
+DETECTORSCALE = 2
+# number of threads OpenCV may use for a detection, 0 lets OpenCV decide
+OPENCVTHREADS = 0
 
 # CONST:rosFeeder.py
 
@@ -39,9 +191,65 @@ OBJECTFEEDPIPE = "/tmp/objectfeed"
 FACERECOGNIZERBASEPATH = "faceRecognizer/"
 FACERECOGNIZERPATH = "./faceRecognizer"
 FACERECOGNIZERMAKECOMMAND = "make"
+# what faceRecognizer prints when it waits for a path, and when it doesn't
+# know the person
+FACERECOGNIZERPROMPT = "Enter a path"
+FACERECOGNIZERUNKNOWN = "Coudln't recognize this person, give me their name"
+# number of faceRecognizer running side by side
+FACERECOGNIZERWORKERS = 4
+# number of times a face is given again to a faceRecognizer that died while
+# recognizing it
+FACERECOGNIZERRETRIES = 1
+# how long (in seconds) a faceRecognizer may take to answer about a face,
+# past that we consider it stuck and kill it
+FACERECOGNIZERTIMEOUT = 10
 
 DUMMYNAME = "Unknown person"
-FACEDIR = "imgs/facesToRecognize/"
+# the faces given to faceRecognizer are written there, in memory (SHMDIR),
+# as uncompressed PGM images
+FACEDIR = "/dev/shm/FORHD_faces/"
+FACEEXTENSION = ".pgm"
+
+# parameters of the face cascade
+FACESCALEFACTOR = 1.3
+FACEMINNEIGHBORS = 5
+# follow the faces from one frame to the next instead of running the cascade
+# on the whole photo every time
+FACETRACKING = True
+
+# remember who the faces seen recently belong to instead of asking
+# faceRecognizer every frame
+FACECACHING = True
+
+# CONST:faceCache.py
+
+# maximum number of people remembered
+FACECACHESIZE = 32
+# a person not seen for FACECACHETTL frames is forgotten
+FACECACHETTL = 30
+# a face is given to faceRecognizer again every FACECACHEVERIFYPERIOD frames
+FACECACHEVERIFYPERIOD = 15
+# a face matches a person seen recently if their rays are less than
+# FACECACHEMAXANGLE radians apart, or if their boxes overlap by at least
+# FACECACHEMINIOU (intersection over union)
+FACECACHEMAXANGLE = .05
+FACECACHEMINIOU = .3
+# a face matching a person with a lower confidence is given to faceRecognizer
+# again
+FACECACHEMINCONFIDENCE = .5
+
+# CONST:faceTracker.py
+
+# the cascade runs on the whole photo every FACEDETECTIONPERIOD frames
+FACEDETECTIONPERIOD = 5
+# the photo is downscaled by FACEDETECTIONSCALE before running the cascade on
+# the whole of it
+FACEDETECTIONSCALE = .5
+# between two full detections we look for each face in its previous box
+# expanded by FACEROIMARGIN times its size on each side
+FACEROIMARGIN = .5
+# minimum template matching score to keep following a face the cascade lost
+FACETRACKTHRESHOLD = .6
 
 # CONST:common
 
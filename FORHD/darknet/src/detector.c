@@ -506,17 +506,17 @@ void validate_detector_recall(char *cfgfile, char *weightfile)
 
 // Slightly different test_detector function, instead of showing the image it sends the detections through a pipe
 // and notifies the feeder script that it's waiting for another image through another pipe
-void test_detector(char *datacfg, char *cfgfile, char *weightfile, char *filename, float thresh, float hier_thresh)
+void test_detector(char *datacfg, char *cfgfile, char *weightfile, char *filename, float thresh, float hier_thresh, char *feedPath, char *detectionsPath)
 {
     char* feedmeMsg = "SendMore\n";
+    char* endOfFrameMsg = "EndOfFrame";
+    char endOfFrameBuff[256];
 
     int feedfd;
-    char* feedPath = "/tmp/yolofeed";
     mkfifo(feedPath, 0666);
     feedfd = open(feedPath, O_WRONLY);
 
     int detectionsfd;
-    char* detectionsPath = "/tmp/detections";
     mkfifo(detectionsPath, 0666);
     detectionsfd = open(detectionsPath, O_WRONLY);
 
@@ -545,7 +545,18 @@ void test_detector(char *datacfg, char *cfgfile, char *weightfile, char *filenam
             if(!input) continue;
             strtok(input, "\n");
         }
-        image im = load_image_color(input,0,0);
+        // inputs may look like "frameId;path", the frame id is sent back with
+        // the end of frame message
+        char *frameId = "";
+        char *path = strchr(input, ';');
+        if(path){
+            *path = '\0';
+            frameId = input;
+            ++path;
+        } else {
+            path = input;
+        }
+        image im = load_image_color(path,0,0);
         image sized = resize_image(im, net.w, net.h);
         layer l = net.layers[net.n-1];
 
@@ -556,7 +567,7 @@ void test_detector(char *datacfg, char *cfgfile, char *weightfile, char *filenam
         float *X = sized.data;
         time=clock();
         network_predict(net, X);
-        printf("%s: Predicted in %f seconds.\n", input, sec(clock()-time));
+        printf("%s: Predicted in %f seconds.\n", path, sec(clock()-time));
         get_region_boxes(l, 1, 1, thresh, probs, boxes, 0, 0, hier_thresh);
         if (l.softmax_tree && nms) do_nms_obj(boxes, probs, l.w*l.h*l.n, l.classes, nms);
         else if (nms) do_nms_sort(boxes, probs, l.w*l.h*l.n, l.classes, nms);
@@ -577,8 +588,11 @@ void test_detector(char *datacfg, char *cfgfile, char *weightfile, char *filenam
                                                                     b.w*im.w,
                                                                     b.h*im.h);
             write(detectionsfd, boxDesc, strlen(boxDesc));
+            free(boxDesc);
           }
         }
+        snprintf(endOfFrameBuff, 256, "%s;%s\n", endOfFrameMsg, frameId);
+        write(detectionsfd, endOfFrameBuff, strlen(endOfFrameBuff));
         draw_detections(im, l.w*l.h*l.n, thresh, boxes, probs, names, alphabet, l.classes);
         save_image(im, "../imgs/predictions");
 
@@ -606,6 +620,9 @@ void run_detector(int argc, char **argv)
     }
     char *gpu_list = find_char_arg(argc, argv, "-gpus", 0);
     char *outfile = find_char_arg(argc, argv, "-out", 0);
+    // each instance running side by side needs its own pair of pipes
+    char *feedPath = find_char_arg(argc, argv, "-feed", "/tmp/yolofeed");
+    char *detectionsPath = find_char_arg(argc, argv, "-detections", "/tmp/detections");
     int *gpus = 0;
     int gpu = 0;
     int ngpus = 0;
@@ -634,7 +651,7 @@ void run_detector(int argc, char **argv)
     char *cfg = argv[4];
     char *weights = (argc > 5) ? argv[5] : 0;
     char *filename = (argc > 6) ? argv[6]: 0;
-    if(0==strcmp(argv[2], "test")) test_detector(datacfg, cfg, weights, filename, thresh, hier_thresh);
+    if(0==strcmp(argv[2], "test")) test_detector(datacfg, cfg, weights, filename, thresh, hier_thresh, feedPath, detectionsPath);
     else if(0==strcmp(argv[2], "train")) train_detector(datacfg, cfg, weights, gpus, ngpus, clear);
     else if(0==strcmp(argv[2], "valid")) validate_detector(datacfg, cfg, weights, outfile);
     else if(0==strcmp(argv[2], "recall")) validate_detector_recall(cfg, weights);
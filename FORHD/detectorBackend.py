@@ -0,0 +1,264 @@
+ #-*- coding: utf-8 -*-
+""" The object detectors YoloHandler can drive """
+
+import os, os.path
+from time import sleep
+
+from subprocess import Popen, PIPE, DEVNULL, STDOUT
+
+import numpy as np
+import cv2
+
+from .objects import Object2D
+from .utils import infolog, warninglog
+from .const import DARKNETBASEPATH, DARKNETPATH, DARKNETMAKECOMMAND, DATAPATH,\
+                   CFGPATH, WEIGHTPATH, PROGRAM, MODE, FEEDPIPE, DETECTIONSPIPE,\
+                   ENDOFFRAMEMSG, DETECTIONTHRESHOLD, NMSTHRESHOLD,\
+                   OPENCVINPUTSIZE, OPENCVTHREADS, DETECTORSCALE
+
+class DetectorBackend:
+    """ Interface of an object detector. The backend is created in the main
+        process, then start and detect are called in the process YoloHandler
+        spawns to run the detections
+    """
+
+    def start(self):
+        """ Get ready to detect objects, called once before the first call to
+            detect
+        """
+        pass
+
+    def detect(self, frameStore, slot, seq):
+        """ Return the list of the Object2D found on the photo of the frame seq
+            stored in slot, or None if the frame has been overwritten in the
+            meantime. Raise EOFError if the detector is gone for good
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """ Release everything the backend holds, called from the main
+            process
+        """
+        pass
+
+    @staticmethod
+    def rescale(objects2D, fromSize, toSize):
+        """ Move objects2D, found on a photo of fromSize (width, height), to
+            the same photo at toSize
+        """
+        fx = toSize[0] / fromSize[0]
+        fy = toSize[1] / fromSize[1]
+        return [Object2D(o.label, o.confidence, o.x*fx, o.y*fy, o.w*fx, o.h*fy)
+                for o in objects2D]
+
+class DarknetBackend(DetectorBackend):
+    """ Run YOLO in a darknet subprocess. We send it "frameId;path\\n" on its
+        stdin whenever it asks for more on its feed pipe ("SendMore\\n"), it
+        reads the photo from path (the frameStore slot, which lives in memory,
+        holding the photo downscaled by DETECTORSCALE as a PPM image, so
+        darknet doesn't decode a JPEG) and sends back one
+        "label;confidence;x;y;width;height\\n" line per object on its
+        detections pipe, followed by "EndOfFrame;frameId\\n".
+        Each instance (see index) has its own pair of pipes
+    """
+
+    def __init__(self, index = 0):
+        self.feedpath = "%s%d" % (FEEDPIPE, index)
+        self.detectionspath = "%s%d" % (DETECTIONSPIPE, index)
+
+        # open YOLO in a new thread, after it is opened we can send it
+        # filepaths by writing to yolo.stdin
+        infolog("Launching YOLO %d" % index)
+
+        if not os.path.isfile(DARKNETBASEPATH+DARKNETPATH):
+            warninglog("Couldn't find %s%s, running %s%s" %\
+                        (DARKNETBASEPATH,
+                         DARKNETPATH,
+                         DARKNETBASEPATH,
+                         DARKNETMAKECOMMAND))
+            Popen(DARKNETMAKECOMMAND.split(), cwd = DARKNETBASEPATH)
+
+        self.yolo = Popen([DARKNETPATH, PROGRAM, MODE, DATAPATH, CFGPATH,
+                           WEIGHTPATH, "-feed", self.feedpath,
+                           "-detections", self.detectionspath],
+                           stdin = PIPE, bufsize = 1,
+                           stdout = DEVNULL, stderr = STDOUT,
+                           universal_newlines = True, cwd = DARKNETBASEPATH)
+
+    def start(self):
+        """ Open the pipes YOLO creates. They are opened read only (which
+            waits for YOLO to open them too, in the same order) so that we
+            read an end of file if YOLO dies
+        """
+        while not os.path.exists(self.feedpath):
+            sleep(1)
+        self.feedpipe = open(self.feedpath, 'rb', buffering = 0)
+        while not os.path.exists(self.detectionspath):
+            sleep(1)
+        self.detectionspipe = open(self.detectionspath, 'rb', buffering = 0)
+
+    @staticmethod
+    def readLine(pipe):
+        """ Return the next line YOLO sent on pipe, without its end of line.
+            Raise EOFError if YOLO closed it
+        """
+        line = pipe.readline()
+        if not line:
+            raise EOFError("YOLO closed %s" % pipe.name)
+        return line[:-1].decode("utf8")
+
+    @staticmethod
+    def parseDetection(line):
+        """ Parse a line sent by YOLO on its detections pipe (which looks like
+            "label;confidence;x;y;width;height") and return the corresponding
+            Object2D
+        """
+        parsedLine = line.split(";")
+        return Object2D(parsedLine[0], *(float(s) for s in parsedLine[1:6]))
+
+    def detect(self, frameStore, slot, seq):
+        """ Wait for YOLO to ask for a new photo, give it the frame and read
+            its detections until it tells us the frame is over
+        """
+        while self.readLine(self.feedpipe) != "SendMore":
+            pass
+        try:
+            self.yolo.stdin.write("%d;%s\n" % (seq,
+                                               frameStore.path(slot,
+                                                               DETECTORSCALE)))
+        except BrokenPipeError:
+            raise EOFError("YOLO stopped reading its input")
+
+        objects2D = []
+        while True:
+            # Lines look like label;x;y;w;h where x,y are the center of the
+            # the bounding rect and w,h its width and height
+            lastLine = self.readLine(self.detectionspipe)
+            if lastLine.startswith(ENDOFFRAMEMSG):
+                if lastLine == "%s;%d" % (ENDOFFRAMEMSG, seq):
+                    break
+                continue
+            try:
+                objects2D.append(self.parseDetection(lastLine))
+            except:
+                pass
+
+        if not frameStore.isValid(slot, seq):
+            return None
+        return self.rescale(objects2D, frameStore.size(slot, DETECTORSCALE),
+                            frameStore.size(slot))
+
+    def close(self):
+        """ Stop YOLO
+        """
+        self.yolo.terminate()
+
+class OpenCVBackend(DetectorBackend):
+    """ Run the same YOLO network in-process, on the CPU, through OpenCV's dnn
+        module. The photo is read straight from the frameStore, downscaled by
+        DETECTORSCALE, and never goes through a file
+    """
+
+    def __init__(self, index = 0, cfgpath = DARKNETBASEPATH+CFGPATH,
+                 weightpath = DARKNETBASEPATH+WEIGHTPATH,
+                 datapath = DARKNETBASEPATH+DATAPATH):
+        self.cfgpath = cfgpath
+        self.weightpath = weightpath
+        self.labels = self.readLabels(datapath)
+
+    @staticmethod
+    def readLabels(datapath):
+        """ Return the labels listed in the names file of the darknet data
+            file datapath
+        """
+        namespath = "data/names.list"
+        with open(datapath, 'r') as f:
+            for line in f:
+                key, _, value = line.partition("=")
+                if key.strip() == "names":
+                    namespath = value.strip()
+        with open(DARKNETBASEPATH+namespath, 'r') as f:
+            return [line.strip() for line in f if line.strip()]
+
+    def start(self):
+        """ Load the network, each process needs its own
+        """
+        if OPENCVTHREADS:
+            cv2.setNumThreads(OPENCVTHREADS)
+        infolog("Loading %s in OpenCV" % self.weightpath)
+        self.net = cv2.dnn.readNetFromDarknet(self.cfgpath, self.weightpath)
+        self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+        self.outputs = self.net.getUnconnectedOutLayersNames()
+
+    def detect(self, frameStore, slot, seq):
+        """ Run the network on the photo of the frame
+        """
+        # the frameStore holds RGB pixels, the blob is a copy of them
+        blob = self.blob(frameStore.image(slot, DETECTORSCALE), swapRB = False)
+        if not frameStore.isValid(slot, seq):
+            return None
+        width, height = frameStore.size(slot)
+        return self.detectBlob(blob, width, height)
+
+    @staticmethod
+    def blob(img, swapRB = True):
+        """ Return the input of the network for img, a BGR image (RGB if
+            swapRB is False)
+        """
+        return cv2.dnn.blobFromImage(img, 1/255.,
+                                     (OPENCVINPUTSIZE, OPENCVINPUTSIZE),
+                                     swapRB = swapRB, crop = False)
+
+    def detectImage(self, img):
+        """ Return the list of the Object2D found on img (a BGR image)
+        """
+        height, width = img.shape[:2]
+        return self.detectBlob(self.blob(img), width, height)
+
+    def detectBlob(self, blob, width, height):
+        """ Return the list of the Object2D found on the photo of blob, in
+            the pixels of that photo at width x height
+        """
+        self.net.setInput(blob)
+        # each row is x, y, w, h (relative to the image), objectness, then the
+        # probability of each class
+        detections = np.concatenate([out.reshape(-1, out.shape[-1])
+                                     for out in self.net.forward(self.outputs)])
+        classes = detections[:, 5:].argmax(axis = 1)
+        confidences = detections[np.arange(len(detections)), 5 + classes]
+        keep = confidences > DETECTIONTHRESHOLD
+        detections = detections[keep]
+        classes = classes[keep]
+        confidences = confidences[keep]
+        if not len(detections):
+            return []
+
+        boxes = detections[:, :4] * [width, height, width, height]
+        # NMS is done per class, like darknet does
+        cornerBoxes = np.column_stack((boxes[:, :2] - boxes[:, 2:]/2,
+                                       boxes[:, 2:]))
+        indices = cv2.dnn.NMSBoxesBatched(cornerBoxes.tolist(),
+                                          confidences.tolist(),
+                                          classes.tolist(),
+                                          DETECTIONTHRESHOLD,
+                                          NMSTHRESHOLD)
+        indices = np.array(indices, dtype = int).flatten()
+        # plain python numbers rather than numpy scalars
+        return [Object2D(self.labels[label], confidence, *box)
+                for label, confidence, box
+                in zip(classes[indices].tolist(),
+                       confidences[indices].tolist(),
+                       boxes[indices].tolist())]
+
+BACKENDS =\
+{
+    "darknet" : DarknetBackend,
+    "opencv" : OpenCVBackend,
+}
+
+def makeBackend(name, index = 0):
+    """ Return a new backend given its name (see BACKENDS), index tells
+        apart the instances of a backend running side by side
+    """
+    return BACKENDS[name](index = index)
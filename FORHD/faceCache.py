@@ -0,0 +1,203 @@
+ #-*- coding: utf-8 -*-
+""" Remember who the faces seen recently belong to """
+
+from collections import OrderedDict
+
+import numpy as np
+
+from .const import FACECACHESIZE, FACECACHETTL, FACECACHEVERIFYPERIOD,\
+                   FACECACHEMAXANGLE, FACECACHEMINIOU,\
+                   FACECACHEMINCONFIDENCE
+
+class FaceCacheEntry:
+    """ The last time we saw a person and what the recognizer told us """
+
+    def __init__(self, name, recognized, raycast, box, frameId):
+        self.name = name
+        self.recognized = recognized
+        self.direction = FaceCache.direction(raycast)
+        self.box = box
+        self.lastSeen = frameId
+        self.lastVerified = frameId
+        # whether the recognizer hasn't answered about the person yet, and
+        # the (frameId, index) of the faces waiting for its answer
+        self.pending = False
+        self.waiting = []
+
+class FaceCache:
+    """ Associate the faces of a frame with the ones of the previous frames so
+        that the recognizer is only asked about new faces.
+        A face matches an entry when its ray points in nearly the same
+        direction (less than maxAngle radians apart) or when its box overlaps
+        the entry's one enough (an IoU of at least minIoU). How well it
+        matches is the confidence of the association, a face is given back to
+        the recognizer when it is too low, or when the entry hasn't been
+        verified for verifyPeriod frames. Once a face is given to the
+        recognizer its entry is pending, the faces matching it wait for the
+        answer instead of being given to the recognizer again.
+        Entries not seen for ttl frames expire, and the least recently seen
+        entries are evicted when there are more than size of them. This only
+        happens when the faces of a new frame are matched, so that the keys
+        given for a frame stay valid until the next one. Pending entries are
+        kept until the recognizer answers
+    """
+
+    def __init__(self, size = FACECACHESIZE, ttl = FACECACHETTL,
+                 verifyPeriod = FACECACHEVERIFYPERIOD,
+                 maxAngle = FACECACHEMAXANGLE, minIoU = FACECACHEMINIOU,
+                 minConfidence = FACECACHEMINCONFIDENCE):
+        self.size = size
+        self.ttl = ttl
+        self.verifyPeriod = verifyPeriod
+        self.maxAngle = maxAngle
+        self.minIoU = minIoU
+        self.minConfidence = minConfidence
+        # entries ordered from the least to the most recently seen
+        self.entries = OrderedDict()
+        self.nextKey = 0
+
+    @staticmethod
+    def direction(raycast):
+        """ Return the unit vector raycast points along
+        """
+        direction = np.subtract(raycast.wpointCenterFar[:3],
+                                raycast.wpointCenterNear[:3]).astype(float)
+        norm = np.linalg.norm(direction)
+        return direction / norm if norm else direction
+
+    @staticmethod
+    def iou(box, boxes):
+        """ Return the intersection over union of box with each of boxes, all
+            of them being (x, y, w, h)
+        """
+        boxes = np.asarray(boxes, dtype = float).reshape(-1, 4)
+        x0 = np.maximum(box[0], boxes[:, 0])
+        y0 = np.maximum(box[1], boxes[:, 1])
+        x1 = np.minimum(box[0]+box[2], boxes[:, 0]+boxes[:, 2])
+        y1 = np.minimum(box[1]+box[3], boxes[:, 1]+boxes[:, 3])
+        intersection = np.clip(x1-x0, 0, None) * np.clip(y1-y0, 0, None)
+        union = box[2]*box[3] + boxes[:, 2]*boxes[:, 3] - intersection
+        return np.divide(intersection, union, out = np.zeros(len(boxes)),
+                         where = union > 0)
+
+    def expire(self, frameId):
+        """ Forget the entries not seen for ttl frames, and the least recently
+            seen ones if there are too many
+        """
+        for key, entry in list(self.entries.items()):
+            if frameId - entry.lastSeen <= self.ttl and\
+               len(self.entries) <= self.size:
+                break
+            if not entry.pending:
+                del self.entries[key]
+
+    def match(self, faces, frameId):
+        """ Return, for each face of faces (all found on the frame frameId),
+            the key of the entry it matches and the confidence of the
+            association, or (None, 0) if it matches none. Two faces of a frame
+            never match the same entry
+        """
+        self.expire(frameId)
+        matches = [(None, 0.)] * len(faces)
+        if not self.entries or not faces:
+            return matches
+
+        keys = list(self.entries)
+        entries = list(self.entries.values())
+        directions = np.array([entry.direction for entry in entries])
+        boxes = np.array([entry.box for entry in entries], dtype = float)
+
+        # confidence of every (face, entry) pair
+        confidences = np.zeros((len(faces), len(entries)))
+        for i, face in enumerate(faces):
+            cosines = directions.dot(self.direction(face.raycast))
+            angles = np.arccos(np.clip(cosines, -1., 1.))
+            angleConfidences = np.clip(1. - angles/self.maxAngle, 0., None)
+            ious = self.iou(face.box, boxes)
+            iouConfidences = np.where(ious >= self.minIoU, ious, 0.)
+            confidences[i] = np.maximum(angleConfidences, iouConfidences)
+
+        # greedily give each entry to the face it matches best
+        for _ in range(min(len(faces), len(entries))):
+            i, j = np.unravel_index(confidences.argmax(), confidences.shape)
+            if confidences[i, j] <= 0:
+                break
+            matches[i] = (keys[j], confidences[i, j])
+            confidences[i, :] = 0
+            confidences[:, j] = 0
+
+        return matches
+
+    def needsVerification(self, key, confidence, frameId):
+        """ Return True if the face matching the entry key with confidence
+            must be given to the recognizer
+        """
+        if key is None:
+            return True
+        entry = self.entries[key]
+        if entry.pending:
+            return False
+        return confidence < self.minConfidence or\
+               frameId - entry.lastVerified >= self.verifyPeriod
+
+    def get(self, key):
+        """ Return the entry key
+        """
+        return self.entries[key]
+
+    def seen(self, key, face, frameId):
+        """ Tell the cache that face, found on frameId, matched the entry key
+            and give it the name of the entry. Return the entry
+        """
+        entry = self.entries[key]
+        entry.direction = self.direction(face.raycast)
+        entry.box = face.box
+        # results of older frames may come after the ones of newer frames
+        entry.lastSeen = max(entry.lastSeen, frameId)
+        self.entries.move_to_end(key)
+        face.name = entry.name
+        return entry
+
+    def submitted(self, key, face, frameId):
+        """ Tell the cache that face, found on frameId, was given to the
+            recognizer as the entry key (a new one if key is None). The entry
+            is pending until verified. Return the key
+        """
+        if key is None:
+            key = self.nextKey
+            self.nextKey += 1
+            self.entries[key] = FaceCacheEntry(face.name, False, face.raycast,
+                                               face.box, frameId)
+        self.entries[key].pending = True
+        return key
+
+    def wait(self, key, frameId, index):
+        """ Make the face index of frameId, which matched the pending entry
+            key, wait for the answer of the recognizer
+        """
+        self.entries[key].waiting.append((frameId, index))
+
+    def verified(self, key, face, recognized, frameId):
+        """ Store what the recognizer told us about face, found on frameId,
+            in the entry key (a new one if key is None or if the entry expired
+            in the meantime). Return the key and the (frameId, index) of the
+            faces that waited for this answer
+        """
+        waiting = []
+        if key not in self.entries:
+            key = self.nextKey
+            self.nextKey += 1
+            self.entries[key] = FaceCacheEntry(face.name, recognized,
+                                               face.raycast, face.box, frameId)
+        else:
+            entry = self.entries[key]
+            entry.name = face.name
+            entry.recognized = recognized
+            entry.lastVerified = max(entry.lastVerified, frameId)
+            entry.pending = False
+            waiting, entry.waiting = entry.waiting, []
+            self.seen(key, face, frameId)
+        return key, waiting
+
+    def __len__(self):
+        return len(self.entries)
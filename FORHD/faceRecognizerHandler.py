@@ -2,36 +2,67 @@
 
 import os, os.path
 import shutil
+import queue
 
-from multiprocessing import Process, Manager, Value, Queue, Array
-from ctypes import c_char_p
-from subprocess import Popen, PIPE
+from collections import OrderedDict
+from multiprocessing import Process, Value, Queue
+from subprocess import Popen
+from threading import Thread
+from time import perf_counter
 
 import numpy as np
 import cv2
 
 from blinker import signal
 
-from .const import PHOTORECEIVEDSIGNAL, DUMMYNAME, FACEDIR,\
+from .const import PHOTORECEIVEDSIGNAL, DUMMYNAME, FACEDIR, FACEEXTENSION,\
                    FACERECOGNIZERBASEPATH, FACERECOGNIZERPATH,\
-                   FACERECOGNIZERMAKECOMMAND
+                   FACERECOGNIZERMAKECOMMAND, FACESCALEFACTOR,\
+                   FACEMINNEIGHBORS, FACETRACKING, FACECACHING,\
+                   FACERECOGNIZERWORKERS, DISPATCHERTIMEOUT
 from .raycast import Raycast
+from .frameDispatcher import FrameDispatcher
+from .faceTracker import FaceTracker
+from .faceCache import FaceCache
+from .faceRecognizerPool import FaceRecognizerPool
+from .sharedState import SharedState, CAMSIZE
+from .session import SessionStates
+from .metrics import Metrics, HAARSTAGE, CROPSTAGE, RECOGNIZESTAGE
 from .objects import Object2D, Face
-from .utils import infolog, warninglog
+from .resultBatch import FaceBatch
+from .utils import debuglog, infolog, warninglog
+
+class PendingFrame:
+    """ The faces of a frame being recognized, and the FaceCache of its
+        session (None if we don't cache faces)
+    """
+
+    def __init__(self, frameFaces, cache = None):
+        self.faces = frameFaces
+        self.cache = cache
+        # for each face, whether faceRecognizer knows the person
+        self.recognized = [False] * len(frameFaces)
+        self.pending = len(frameFaces)
 
 class FaceRecognizerHandler:
     """ The class used to communicate with faceRecognizer """
 
-    def __init__(self, verbose = True):
+    def __init__(self, frameStore, tracking = FACETRACKING,
+                 caching = FACECACHING, workers = FACERECOGNIZERWORKERS,
+                 metrics = None, verbose = True):
         self.verbose = verbose
+        self.frameStore = frameStore
+        # where our processes record how long their stages take
+        self.metrics = Metrics() if metrics is None else metrics
+        self.tracking = tracking
+        self.caching = caching
+        self.workers = workers
 
         infolog("Initializing faceRecognizerHandler")
         self.running = Value('i', 1)
 
-        # open faceRecognizer in a new thread, after it is opened we can send
-        # it filepaths by writing to faceRecognizer.stdin
-        infolog("Launching faceRecognizer")
-
+        # the faceRecognizer are launched by the faceRecognizerHandle process
+        # (see FaceRecognizerPool), we only make sure they are built
         if not os.path.isfile(FACERECOGNIZERBASEPATH+FACERECOGNIZERPATH):
             warninglog("Couldn't find %s%s, running %s%s" %\
                         (FACERECOGNIZERBASEPATH,
@@ -40,25 +71,28 @@ class FaceRecognizerHandler:
                          FACERECOGNIZERMAKECOMMAND))
             Popen(FACERECOGNIZERMAKECOMMAND.split(), cwd = FACERECOGNIZERBASEPATH)
 
-        self.faceRecognizer = Popen([FACERECOGNIZERPATH], stdin = PIPE,
-                                    stdout = PIPE, bufsize = 1,
-                                    universal_newlines = True,
-                                    cwd = FACERECOGNIZERBASEPATH)
-
-        self.manager = Manager()
-        # synchronized string that stores the path to the last photo taken
-        self.nextPhoto = self.manager.Value(c_char_p, "")
-        self.nextMats = self.manager.Value(c_char_p, "")
-        # synchronized queues that stores faces
+        # dispatcher handing the last frame received to the faceMaker process
+        self.dispatcher = FrameDispatcher()
+        # synchronized queue that stores, for each frame, its id, the
+        # frameStore ring (that is the session) it comes from, the generation
+        # of that session and the faces we found in it
         self.faces = Queue()
-        self.unknownFaces = Queue()
-        self.recognizedFaces = Queue()
-        # synchronized float array used to store the camera resolution
-        self.camsize = Array('f', (1280., 720.))
+        # synchronized queue that stores, as a FaceBatch, the faces of each
+        # frame whose faces have all been given to the recognizer
+        self.doneFrames = Queue()
+        # camera resolution of the frames whose session didn't send its own,
+        # read without any lock by the faceMaker process
+        self.camsize = SharedState(CAMSIZE, size = (1280., 720.))
 
         # cascade classifier that will get faces from images
         self.face_cascade = cv2.CascadeClassifier('models/haarcascade_frontalface_default.xml')
 
+        # the faces are numbered in the order they are found, which gives them
+        # unique filepaths (see getFaceFilepath)
+        self.nextFaceId = 0
+        if not os.path.isdir(FACEDIR):
+            os.makedirs(FACEDIR)
+
         # we connect to the photoreceived signal
         self.PhotoReceivedEvent = signal(PHOTORECEIVEDSIGNAL)
         self.PhotoReceivedEvent.connect(self.write)
@@ -71,124 +105,233 @@ class FaceRecognizerHandler:
         self.faceRecognizerHandle = Process(target = self.handleFaceRecognizer)
         self.faceRecognizerHandle.start()
 
-        if not os.path.isdir(FACEDIR):
-            os.makedirs(FACEDIR)
-
     def write(self, sender, **kw):
-        """ Give faceRecognizerHandler the new IMGPATH and the corresponding
-            matrices in MATSPATH.
+        """ Give faceRecognizerHandler the slot and the sequence number of the
+            new frame in the frameStore
         """
-        IMGPATH = kw['imgpath']
-        MATSPATH = kw['matspath']
-
-        self.nextPhoto.value = IMGPATH+"\n"
-        self.nextMats.value = MATSPATH
+        self.dispatcher.publish(kw['slot'], kw['seq'], kw.get('session', 0))
 
     def getFaceFilepath(self):
-        """ Get a valid unused filepath in FACEDIR to save a new image
+        """ Get a new filepath in FACEDIR to save a face. Only the faceMaker
+            process saves faces, so the number of the face is enough to make
+            it unique
         """
-        i = 0
-        while True:
-            filepath = FACEDIR+str(i)+".jpg"
-            if not os.path.exists(filepath):
-                return filepath
-            i += 1
+        filepath = FACEDIR+str(self.nextFaceId)+FACEEXTENSION
+        self.nextFaceId += 1
+        return filepath
 
     def makeFaces(self):
         """ Launched in a new process. Find faces in the images, cut them out
             and save them before telling the recognizer handler that it needs
-            to recognize new files
+            to recognize new files. The faces are saved in memory (FACEDIR is
+            in SHMDIR) and without compression, so that saving and reading
+            them back costs next to nothing
         """
+        # the trackers only live in this process, they follow the faces from
+        # one frame of a session to the next
+        trackers = SessionStates(lambda: FaceTracker(self.face_cascade))
         while self.running.value:
-            while self.nextPhoto.value == "":
-                pass
-            img = cv2.imread(self.nextPhoto.value[:-1], cv2.IMREAD_GRAYSCALE)
-            if img is not None:
-                faces = self.face_cascade.detectMultiScale(img, 1.3, 5)
-                for (x, y, w, h) in faces:
-                    faceimg = img[x:x+w, y:y+w]
-                    filepath = self.getFaceFilepath()
-                    cv2.imwrite(filepath, faceimg)
-                    object2D = Object2D("Unknown face", 100, x+w/2., y+h/2.,
-                                        w, h)
-                    matsString = self.nextMats.value
-                    with open(matsString, 'r') as f:
-                        projection, world = Raycast.parseMats(f.read())
-                    raycast = Raycast.fromObject2D(object2D, projection, world, self.camsize)
-                    face = Face(filepath, raycast, "Unknown")
-
-                    self.faces.put(face)
-                self.nextPhoto.value = ""
-
-    def handleFaceRecognizer(self):
-        """ Launched in a new process. We listen for "Enter a path" and provide
-            a path to the face recognizer, then we wait for an answer. If the
-            face was recognized it goes to the recognizedFaces queue, else it
-            goes to the unknownFaces queue
+            frame = self.dispatcher.take()
+            if frame is None:
+                continue
+            slot, seq = frame
+            ring = self.frameStore.ringOf(slot)
+            generation = self.frameStore.generation(slot)
+            tracker = trackers.get(ring, generation) if self.tracking\
+                      else None
+            # we read the decoded photo straight from the shared memory, and
+            # make sure it was not overwritten while we were reading it
+            img = cv2.cvtColor(self.frameStore.image(slot),
+                               cv2.COLOR_RGB2GRAY)
+            # the tracker runs its full detections on a downscaled photo,
+            # the frameStore may already have it
+            small = None
+            if tracker is not None:
+                scale = round(1 / tracker.scale)
+                if scale in self.frameStore.scales:
+                    small = cv2.cvtColor(self.frameStore.image(slot, scale),
+                                         cv2.COLOR_RGB2GRAY)
+            mats = self.frameStore.mats(slot)
+            frameFaces = []
+            if self.frameStore.isValid(slot, seq):
+                with self.metrics.time(HAARSTAGE):
+                    if tracker is not None:
+                        faces = tracker.update(img, small)
+                    else:
+                        faces = self.face_cascade.detectMultiScale(
+                            img, FACESCALEFACTOR, FACEMINNEIGHBORS)
+                filepaths = []
+                objects2D = []
+                with self.metrics.time(CROPSTAGE):
+                    for (x, y, w, h) in faces:
+                        faceimg = img[y:y+h, x:x+w]
+                        filepath = self.getFaceFilepath()
+                        cv2.imwrite(filepath, faceimg)
+                        filepaths.append(filepath)
+                        objects2D.append(Object2D("Unknown face", 100.,
+                                                  x+w/2., y+h/2., float(w),
+                                                  float(h)))
+                camsize = mats.camsize or self.camsize.read()["size"]
+                raycasts = Raycast.fromObjects2D(objects2D, mats, camsize, seq)
+                frameFaces = [Face(filepath, raycast, "Unknown",
+                                   tuple(int(v) for v in box))
+                              for filepath, raycast, box
+                              in zip(filepaths, raycasts, faces)]
+            # frames without faces go through the queue too so that the
+            # recognizer handler can tell they are done
+            self.faces.put((seq, ring, generation, frameFaces))
+
+    def feedFrames(self, events):
+        """ Launched in a new thread. Forward the frames coming from faceMaker
+            to events, as (None, (frameId, ring, generation, frameFaces))
+            tuples
         """
         while self.running.value:
-            lastline = self.faceRecognizer.stdout.readline()
-            if lastline == "Enter a path":
-                nextFace = self.faces.get(block = True)
-                debuglog("Giving %s to faceRecognizer" % nextFace.filepath,
-                         self.verbose)
-                self.faceRecognizer.stdin.write(nextFace.filepath)
-                lastline = self.faceRecognizer.stdout.readline()
-                if lastline == "Coudln't recognize this person, give me their name":
-                    self.unknownFaces.put(nextFace)
-                    debuglog("Unrecognized face", self.verbose)
-                else:
-                    nextFace.name = lastline[-1]
-                    self.addRecognizedFace(nextFace)
-                    debuglog("Recognized %s" % nextFace.name, self.verbose)
-                os.remove(nextFace.filepath)
-        self.faceRecognizer.stdin.write("Stop")
-
-
-    def getRecognizedFace(self, block = True, timeout = None):
-        """ Return the first element in recognizedFaces queue
+            try:
+                frame = self.faces.get(timeout = DISPATCHERTIMEOUT)
+            except queue.Empty:
+                continue
+            events.put((None, frame))
+
+    def startFrame(self, frameId, frameFaces, frames, cache, pool):
+        """ Give the faces of the frame frameId to the pool, except the ones
+            matching a person of cache that doesn't need to be verified,
+            which get their name from it, or wait for it if the recognizer
+            is still busy with that person
         """
-        return self.recognizedFaces.get(block, timeout)
-
-    def addRecognizedFace(self, face):
-        """ Put an element in recognizedFaces queue
+        frame = PendingFrame(frameFaces, cache)
+        frames[frameId] = frame
+        if cache is None:
+            matches = [(None, 0.)] * len(frameFaces)
+        else:
+            matches = cache.match(frameFaces, frameId)
+        for index, (face, (key, confidence)) in enumerate(zip(frameFaces,
+                                                              matches)):
+            if cache is None or\
+               cache.needsVerification(key, confidence, frameId):
+                if cache is not None:
+                    key = cache.submitted(key, face, frameId)
+                pool.submit((frameId, index, key, perf_counter()),
+                            face.filepath)
+                continue
+            entry = cache.seen(key, face, frameId)
+            os.remove(face.filepath)
+            if entry.pending:
+                cache.wait(key, frameId, index)
+                debuglog("Face waiting for the recognizer", self.verbose)
+                continue
+            frame.recognized[index] = entry.recognized
+            frame.pending -= 1
+            debuglog("%s from the cache" % face.name, self.verbose)
+
+    def endFace(self, task, name, frames):
+        """ Store the name faceRecognizer gave to the face of task (None if it
+            doesn't know the person), and to the faces waiting for it
         """
-        self.recognizedFaces.put(face)
-
-    def getUnknownFace(self, block=True, timeout = None):
-        """ Return the first element in unknownFaces queue
+        frameId, index, key, submitted = task
+        self.metrics.observe(RECOGNIZESTAGE, perf_counter() - submitted)
+        frame = frames[frameId]
+        face = frame.faces[index]
+        if name is None:
+            debuglog("Unrecognized face", self.verbose)
+        else:
+            face.name = name
+            frame.recognized[index] = True
+            debuglog("Recognized %s" % face.name, self.verbose)
+        frame.pending -= 1
+        os.remove(face.filepath)
+        if frame.cache is None:
+            return
+        _, waiting = frame.cache.verified(key, face, frame.recognized[index],
+                                          frameId)
+        for waitingFrameId, waitingIndex in waiting:
+            waitingFrame = frames[waitingFrameId]
+            waitingFrame.faces[waitingIndex].name = face.name
+            waitingFrame.recognized[waitingIndex] = frame.recognized[index]
+            waitingFrame.pending -= 1
+
+    def endFrames(self, frames):
+        """ Give the faces of the frames whose faces are all recognized, in
+            the order the frames came, one FaceBatch per frame
         """
-        return self.unknownFaces.get(block, timeout)
+        while frames:
+            frameId, frame = next(iter(frames.items()))
+            if frame.pending:
+                break
+            del frames[frameId]
+            self.addDoneFrame(FaceBatch.fromFaces(frameId, frame.faces,
+                                                  frame.recognized))
 
-    def hasRecognizedFaces(self):
-        """ Return True if there is at least one element in recognizedFaces,
-            else false
+    def handleFaceRecognizer(self):
+        """ Launched in a new process. The faces of each frame are given to a
+            pool of faceRecognizer (unless the cache of its session already
+            knows them), and
+            each frame is done once all its faces are. Frames are done in the
+            order they came, so that the faces of a frame never come before
+            the ones of the previous frames
         """
-        return not self.recognizedFaces.empty()
-
-    def hasUnknownFaces(self):
-        """ Return True if there is at least one element in unknownFaces,
-            else false
+        # the caches (one per frameStore ring, that is per session) and the
+        # pool only live in this process
+        caches = SessionStates(FaceCache)
+        events = queue.Queue()
+        pool = FaceRecognizerPool(self.workers, events, self.verbose)
+        pool.start()
+        feeder = Thread(target = self.feedFrames, args = (events,),
+                        daemon = True)
+        feeder.start()
+
+        # frames whose faces are being recognized, in the order they came
+        frames = OrderedDict()
+        while self.running.value:
+            try:
+                task, result = events.get(timeout = DISPATCHERTIMEOUT)
+            except queue.Empty:
+                continue
+            if task is None:
+                frameId, ring, generation, frameFaces = result
+                cache = caches.get(ring, generation) if self.caching\
+                        else None
+                self.startFrame(frameId, frameFaces, frames, cache, pool)
+            else:
+                self.endFace(task, result, frames)
+            self.endFrames(frames)
+
+        feeder.join()
+        pool.close()
+
+    def addDoneFrame(self, batch):
+        """ Put the FaceBatch of a frame in doneFrames queue
         """
+        self.doneFrames.put(batch)
 
-    def emptyRecognizedFaces(self):
-        """ Empty the queue
+    def getDoneFrame(self, block = True, timeout = None):
+        """ Return the FaceBatch of the first frame in doneFrames queue
         """
-        while self.hasRecognizedFaces():
-            self.recognizedFaces.get()
+        return self.doneFrames.get(block, timeout)
 
-    def emptyUnknownFaces(self):
-        """ Empty the queue
+    def takeFrames(self):
+        """ Return the FaceBatch of all the frames in doneFrames queue, in
+            order, without waiting
+        """
+        batches = []
+        while True:
+            try:
+                batches.append(self.doneFrames.get_nowait())
+            except queue.Empty:
+                return batches
+
+    def hasDoneFrames(self):
+        """ Return True if there is at least one element in doneFrames, else
+            false
         """
-        while self.hasUnknownFaces():
-            self.unknownFaces.get()
+        return not self.doneFrames.empty()
 
     def close(self):
         """ Clean everything, that means stop the processes by setting running
             to false (0) and join them
         """
         self.running.value = 0
-        if os.exists(FACEDIR):
+        if os.path.exists(FACEDIR):
             shutil.rmtree(FACEDIR)
         self.faceRecognizerHandle.join()
         self.faceMaker.join()
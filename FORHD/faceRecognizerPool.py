@@ -0,0 +1,193 @@
+ #-*- coding: utf-8 -*-
+""" Run several faceRecognizer at once """
+
+import queue
+from threading import Thread, Timer
+from subprocess import Popen, PIPE
+
+from .const import FACERECOGNIZERBASEPATH, FACERECOGNIZERPATH,\
+                   FACERECOGNIZERPROMPT, FACERECOGNIZERUNKNOWN,\
+                   FACERECOGNIZERRETRIES, FACERECOGNIZERTIMEOUT
+from .utils import debuglog, warninglog
+
+class RecognizerError(Exception):
+    """ Raised when a faceRecognizer dies or gets stuck while recognizing a
+        face
+    """
+    pass
+
+class RecognizerWorker:
+    """ One faceRecognizer subprocess. We wait for it to ask for a path
+        (FACERECOGNIZERPROMPT), give it the path of a face, and it answers
+        with the name of the person or FACERECOGNIZERUNKNOWN. If it takes
+        more than timeout seconds to do so it is killed
+    """
+
+    def __init__(self, index, verbose = True,
+                 timeout = FACERECOGNIZERTIMEOUT):
+        self.index = index
+        self.verbose = verbose
+        self.timeout = timeout
+        self.faceRecognizer = None
+        self.restarts = 0
+        self.timedOut = False
+
+    def start(self):
+        """ Launch faceRecognizer
+        """
+        self.faceRecognizer = Popen([FACERECOGNIZERPATH], stdin = PIPE,
+                                    stdout = PIPE, bufsize = 1,
+                                    universal_newlines = True,
+                                    cwd = FACERECOGNIZERBASEPATH)
+
+    def isHealthy(self):
+        """ Return True if faceRecognizer is still running
+        """
+        return self.faceRecognizer is not None and\
+               self.faceRecognizer.poll() is None
+
+    def restart(self):
+        """ Kill faceRecognizer if needed and launch a new one
+        """
+        warninglog("Restarting faceRecognizer %d" % self.index)
+        if self.isHealthy():
+            self.faceRecognizer.kill()
+        if self.faceRecognizer is not None:
+            self.faceRecognizer.wait()
+            self.closePipes()
+        self.restarts += 1
+        self.start()
+
+    def closePipes(self):
+        """ Close our ends of the pipes of faceRecognizer
+        """
+        for pipe in (self.faceRecognizer.stdin, self.faceRecognizer.stdout):
+            try:
+                pipe.close()
+            except (BrokenPipeError, ValueError):
+                pass
+
+    def kill(self):
+        """ Kill faceRecognizer because it is stuck
+        """
+        self.timedOut = True
+        self.faceRecognizer.kill()
+
+    def readline(self):
+        """ Return the next line faceRecognizer prints, without its newline
+        """
+        line = self.faceRecognizer.stdout.readline()
+        if not line:
+            if self.timedOut:
+                raise RecognizerError("faceRecognizer %d took more than %gs, "
+                                      "killed it" % (self.index, self.timeout))
+            raise RecognizerError("faceRecognizer %d died" % self.index)
+        return line[:-1]
+
+    def recognize(self, filepath):
+        """ Return the name of the person whose face is saved at filepath, or
+            None if faceRecognizer doesn't know them
+        """
+        # a stuck faceRecognizer is killed, which ends our reads
+        self.timedOut = False
+        watchdog = Timer(self.timeout, self.kill)
+        watchdog.start()
+        try:
+            while self.readline() != FACERECOGNIZERPROMPT:
+                pass
+            debuglog("Giving %s to faceRecognizer %d" % (filepath, self.index),
+                     self.verbose)
+            self.faceRecognizer.stdin.write(filepath+"\n")
+            answer = self.readline()
+        except (BrokenPipeError, ValueError) as e:
+            raise RecognizerError(str(e))
+        finally:
+            watchdog.cancel()
+        if answer == FACERECOGNIZERUNKNOWN:
+            return None
+        return answer
+
+    def stop(self):
+        """ Ask faceRecognizer to stop
+        """
+        if not self.isHealthy():
+            if self.faceRecognizer is not None:
+                self.closePipes()
+            return
+        try:
+            self.faceRecognizer.stdin.write("Stop\n")
+        except (BrokenPipeError, ValueError):
+            pass
+        self.closePipes()
+        self.faceRecognizer.terminate()
+        self.faceRecognizer.wait()
+
+class FaceRecognizerPool:
+    """ Recognize faces with size faceRecognizer running side by side. Each
+        of them is driven by its own thread (faceRecognizer does the work,
+        the threads just wait for it), the faces are given to the first
+        thread available and the results are put in results as
+        (task, name) tuples, name being None for unknown people.
+        A faceRecognizer that dies or gets stuck is restarted and the face
+        it was recognizing is given to the new one, up to
+        FACERECOGNIZERRETRIES times before giving up on the face (which is
+        then unknown). Every face gets a result, even if faceRecognizer
+        can't be restarted
+    """
+
+    def __init__(self, size, results, verbose = True):
+        self.verbose = verbose
+        self.results = results
+        self.tasks = queue.Queue()
+        self.workers = [RecognizerWorker(i, verbose) for i in range(size)]
+        self.threads = []
+
+    def start(self):
+        """ Launch the faceRecognizer and their threads
+        """
+        for worker in self.workers:
+            worker.start()
+            thread = Thread(target = self.work, args = (worker,), daemon = True)
+            thread.start()
+            self.threads.append(thread)
+
+    def submit(self, task, filepath):
+        """ Ask for the face saved at filepath to be recognized, task is given
+            back along with the result
+        """
+        self.tasks.put((task, filepath))
+
+    def work(self, worker):
+        """ Launched in a new thread. Give the faces to worker until the pool
+            is closed
+        """
+        while True:
+            item = self.tasks.get()
+            if item is None:
+                break
+            task, filepath = item
+            name = None
+            try:
+                if not worker.isHealthy():
+                    worker.restart()
+                for _ in range(FACERECOGNIZERRETRIES + 1):
+                    try:
+                        name = worker.recognize(filepath)
+                        break
+                    except RecognizerError as e:
+                        warninglog(str(e))
+                        worker.restart()
+            except OSError as e:
+                warninglog("Couldn't restart faceRecognizer %d: %s" %
+                           (worker.index, e))
+            self.results.put((task, name))
+
+    def close(self):
+        """ Stop the threads and their faceRecognizer
+        """
+        for _ in self.threads:
+            self.tasks.put(None)
+        for thread in self.threads:
+            thread.join()
+        for worker in self.workers:
+            worker.stop()
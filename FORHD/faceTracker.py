@@ -0,0 +1,109 @@
+ #-*- coding: utf-8 -*-
+""" Find the faces of consecutive photos without running the cascade on the
+    whole photo every time """
+
+import numpy as np
+import cv2
+
+from .const import FACESCALEFACTOR, FACEMINNEIGHBORS, FACEDETECTIONPERIOD,\
+                   FACEDETECTIONSCALE, FACEROIMARGIN, FACETRACKTHRESHOLD
+
+class FaceTracker:
+    """ Every period frames (or when no face is tracked) the cascade runs on
+        the whole photo, downscaled by scale, and the boxes it finds are
+        mapped back to full resolution.
+        On the other frames we only look around the faces of the previous
+        frame: the cascade runs at full resolution in each box expanded by
+        margin (a fraction of its size), and if it finds nothing there we
+        follow the face by template matching. A face that can't be followed
+        is forgotten until the next full detection
+    """
+
+    def __init__(self, cascade, period = FACEDETECTIONPERIOD,
+                 scale = FACEDETECTIONSCALE, margin = FACEROIMARGIN,
+                 threshold = FACETRACKTHRESHOLD):
+        self.cascade = cascade
+        self.period = period
+        self.scale = scale
+        self.margin = margin
+        self.threshold = threshold
+        # boxes (x, y, w, h) of the faces of the last frame and their crops,
+        # used as templates
+        self.boxes = []
+        self.templates = []
+        self.framesSinceDetection = 0
+
+    def detect(self, img, small = None):
+        """ Run the cascade on the whole img, downscaled, and return the boxes
+            at full resolution. small is img already downscaled by scale, if
+            we have it
+        """
+        if small is None:
+            small = cv2.resize(img, None, fx = self.scale, fy = self.scale,
+                               interpolation = cv2.INTER_AREA)
+        faces = self.cascade.detectMultiScale(small, FACESCALEFACTOR,
+                                              FACEMINNEIGHBORS)
+        if not len(faces):
+            return []
+        faces = np.round(np.asarray(faces) / self.scale).astype(int)
+        return [tuple(face) for face in faces]
+
+    def roi(self, img, box):
+        """ Return the (x0, y0, x1, y1) bounds of box expanded by margin and
+            clipped to img
+        """
+        x, y, w, h = box
+        dx, dy = int(w*self.margin), int(h*self.margin)
+        return (max(x-dx, 0), max(y-dy, 0),
+                min(x+w+dx, img.shape[1]), min(y+h+dy, img.shape[0]))
+
+    def follow(self, img, box, template):
+        """ Return the new box of the face that was in box on the previous
+            frame, or None if we lost it
+        """
+        x0, y0, x1, y1 = self.roi(img, box)
+        _, _, w, h = box
+        roi = img[y0:y1, x0:x1]
+        faces = self.cascade.detectMultiScale(roi, FACESCALEFACTOR,
+                                              FACEMINNEIGHBORS,
+                                              minSize = (w//2, h//2))
+        if len(faces):
+            # the face closest to where it was
+            faces = np.asarray(faces)
+            centers = faces[:, :2] + faces[:, 2:]/2
+            target = np.array([box[0]-x0 + w/2, box[1]-y0 + h/2])
+            fx, fy, fw, fh = faces[((centers - target)**2).sum(axis = 1)
+                                   .argmin()]
+            return (x0+int(fx), y0+int(fy), int(fw), int(fh))
+
+        if roi.shape[0] < h or roi.shape[1] < w:
+            return None
+        scores = cv2.matchTemplate(roi, template, cv2.TM_CCOEFF_NORMED)
+        _, score, _, (tx, ty) = cv2.minMaxLoc(scores)
+        if score < self.threshold:
+            return None
+        return (x0+tx, y0+ty, w, h)
+
+    def update(self, img, small = None):
+        """ Return the boxes (x, y, w, h) of the faces on img, the grayscale
+            photo following the last one given (small being img downscaled by
+            scale, if we have it)
+        """
+        if not self.boxes or self.framesSinceDetection >= self.period - 1:
+            boxes = self.detect(img, small)
+            self.framesSinceDetection = 0
+        else:
+            boxes = [self.follow(img, box, template)
+                     for box, template in zip(self.boxes, self.templates)]
+            boxes = [box for box in boxes if box is not None]
+            self.framesSinceDetection += 1
+
+        self.boxes = boxes
+        self.templates = [img[y:y+h, x:x+w].copy() for (x, y, w, h) in boxes]
+        return boxes
+
+    def reset(self):
+        """ Forget the tracked faces, the next frame gets a full detection
+        """
+        self.boxes = []
+        self.templates = []
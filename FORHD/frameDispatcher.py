@@ -0,0 +1,82 @@
+ #-*- coding: utf-8 -*-
+""" Hand the frames received by the server to the processes consuming them """
+
+from multiprocessing import Condition
+
+import numpy as np
+
+from .sharedState import SharedState, FRAMEDESCRIPTOR
+from .const import DISPATCHERTIMEOUT
+
+class FrameDispatcher:
+    """ Hand the last frame received from each session to a consumer running
+        in another process. Only the last frame published by a session is
+        kept (the latest frame wins): a frame published while the previous
+        one of its session has not been taken yet replaces it, and we count
+        it as dropped. The sessions are served in turn (round-robin), so a
+        session sending many frames only gets its share of the consumers and
+        can't starve the others.
+        Consumers block on a condition until a frame is published, instead
+        of polling. The frames waiting to be taken and the counters live in
+        a SharedState, written under the condition, so they can be peeked at
+        from any process without taking it
+    """
+
+    def __init__(self):
+        self.condition = Condition()
+        # slot and sequence number (see FrameStore) of the frame of each
+        # session waiting to be taken, session served next, number of frames
+        # published and number of frames replaced before being taken
+        self.state = SharedState(FRAMEDESCRIPTOR)
+
+    def publish(self, slot, seq, session = 0):
+        """ Make the frame seq stored in slot the next frame of session to be
+            taken and wake the consumers up
+        """
+        with self.condition:
+            state = self.state.read()
+            slots, seqs = state["slot"], state["seq"]
+            dropped = state["dropped"] + (seqs[session] != 0)
+            slots[session] = slot
+            seqs[session] = seq
+            self.state.write(slot = slots, seq = seqs,
+                             published = state["published"] + 1,
+                             dropped = dropped)
+            self.condition.notify_all()
+
+    def take(self, timeout = DISPATCHERTIMEOUT, onTake = None):
+        """ Wait until a frame is available and return its slot and sequence
+            number, taking the sessions in turn. Return None if no frame was
+            published before timeout (in seconds, None to wait forever).
+            onTake is called with the slot and the sequence number before
+            the frame is given to any other consumer, so several consumers
+            can use it to record the order in which they took the frames
+        """
+        with self.condition:
+            if not self.condition.wait_for(self.hasFrame, timeout):
+                return None
+            state = self.state.read()
+            seqs = state["seq"]
+            # the first session with a frame, starting from the one whose
+            # turn it is
+            order = np.roll(np.arange(len(seqs)), -int(state["next"]))
+            session = order[seqs[order] != 0][0]
+            frame = (int(state["slot"][session]), int(seqs[session]))
+            seqs[session] = 0
+            self.state.write(seq = seqs, next = (session + 1) % len(seqs))
+            if onTake is not None:
+                onTake(*frame)
+            return frame
+
+    def hasFrame(self):
+        """ Return True if a frame is waiting to be taken, without taking the
+            condition
+        """
+        return bool(self.state.read()["seq"].any())
+
+    def peek(self):
+        """ Return the frames waiting to be taken (a sequence number of 0
+            means there is none) and the counters, without taking the
+            condition
+        """
+        return self.state.read()
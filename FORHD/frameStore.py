@@ -0,0 +1,185 @@
+ #-*- coding: utf-8 -*-
+""" Shared memory storage for the frames sent by the HoloLens """
+
+import os
+from multiprocessing import shared_memory
+
+import numpy as np
+import cv2
+
+from .const import FRAMESTORESLOTS, FRAMESTORESLOTSIZE, FRAMESTOREPREFIX,\
+                   FRAMESTORESCALES, SHMDIR
+from .raycast import CameraMats
+
+# layout of the header of a slot
+SLOTHEADER = np.dtype([("seq", "<i8"),
+                       ("generation", "<i8"),
+                       ("size", "<i4", (2,)),
+                       ("projection", "<f8", (4, 4)),
+                       ("world", "<f8", (4, 4)),
+                       ("camsize", "<f8", (2,))])
+# room left for the PPM header at the beginning of each segment
+PPMHEADERSIZE = 32
+
+def ppmHeader(width, height):
+    """ Return the header of a binary PPM image of width x height pixels
+    """
+    return b"P6\n%d %d\n255\n" % (width, height)
+
+def scaledSize(size, scale):
+    """ Return the (width, height) of a photo of size downscaled by scale
+    """
+    return max(size[0] // scale, 1), max(size[1] // scale, 1)
+
+class FrameStore:
+    """ nrings fixed-size rings of nslots shared memory slots, each one
+        holding the decoded photo of a frame and the camera (matrices and
+        resolution) at the time it was taken. Each session has a ring of its
+        own, so a client sending many frames never overwrites the frames of
+        the others.
+        The store is created by the main process before the handlers spawn
+        their processes, they inherit it and read the frames directly from
+        the shared memory. Each frame gets a sequence number, unique across
+        the rings, a slot only holds the frame with that sequence number
+        until it is reused nslots frames of its ring later, readers check
+        that number to detect that the frame they are reading has been
+        overwritten.
+        The photo is decoded once, before it is stored, and every consumer
+        reads its pixels (RGB) from the slot. A slot holds the photo at full
+        resolution and downscaled by each of scales, for the consumers that
+        don't need every pixel. Each of them is a binary PPM image stored at
+        the beginning of its own segment, so processes we don't control (such
+        as darknet) can read it as a file from SHMDIR without touching the
+        disk nor decoding a JPEG again.
+        slotsize is the size of the segment of the full resolution photo, the
+        segments of the downscaled ones are smaller.
+    """
+
+    def __init__(self, nslots = FRAMESTORESLOTS, slotsize = FRAMESTORESLOTSIZE,
+                 nrings = 1, scales = FRAMESTORESCALES):
+        self.nslots = nslots
+        self.slotsize = slotsize
+        self.nrings = nrings
+        # the full resolution comes first
+        self.scales = (1,) + tuple(scale for scale in scales if scale != 1)
+        self.lastSeq = 0
+        # number of frames stored in each ring
+        self.counts = [0] * nrings
+
+        prefix = "%s%d_" % (FRAMESTOREPREFIX, os.getpid())
+        self.headerShm = shared_memory.SharedMemory(name = prefix+"header",
+                                                    create = True,
+                                                    size = SLOTHEADER.itemsize*nslots*nrings)
+        self.headers = np.ndarray((nslots*nrings,), dtype = SLOTHEADER,
+                                  buffer = self.headerShm.buf)
+        self.headers["seq"] = 0
+        self.headers["size"] = 0
+
+        # for each slot, a segment per scale
+        self.slots = [{scale: shared_memory.SharedMemory(
+                               name = "%s%d_%d" % (prefix, i, scale),
+                               create = True,
+                               size = slotsize // scale**2 + PPMHEADERSIZE)
+                       for scale in self.scales}
+                      for i in range(nslots*nrings)]
+
+    def view(self, slot, scale, size):
+        """ Return the pixels of the photo of slot downscaled by scale, given
+            that its full resolution is size, as a numpy array sharing its
+            memory with the slot
+        """
+        width, height = scaledSize(size, scale)
+        return np.ndarray((height, width, 3), dtype = np.uint8,
+                          buffer = self.slots[slot][scale].buf,
+                          offset = len(ppmHeader(width, height)))
+
+    def put(self, img, projection, world, ring = 0, camsize = None,
+            generation = 0):
+        """ Store a new frame, whose photo img is a decoded BGR image, in the
+            next slot of ring and return the slot index and the sequence
+            number of the frame. camsize is the resolution of the camera,
+            None if it isn't known, and generation the one of the session
+            sending the frame (see Session)
+        """
+        height, width = img.shape[:2]
+        if width * height * 3 > self.slotsize:
+            raise ValueError("Photo of %dx%d pixels doesn't fit in a %d bytes "
+                             "slot" % (width, height, self.slotsize))
+        seq = self.lastSeq + 1
+        slot = ring * self.nslots + self.counts[ring] % self.nslots
+
+        # invalidate the slot while we are writing it
+        self.headers["seq"][slot] = 0
+        full = self.view(slot, 1, (width, height))
+        cv2.cvtColor(img, cv2.COLOR_BGR2RGB, dst = full)
+        for scale in self.scales:
+            header = ppmHeader(*scaledSize((width, height), scale))
+            self.slots[slot][scale].buf[:len(header)] = header
+            if scale != 1:
+                cv2.resize(full, scaledSize((width, height), scale),
+                           dst = self.view(slot, scale, (width, height)),
+                           interpolation = cv2.INTER_AREA)
+        self.headers["size"][slot] = (width, height)
+        self.headers["projection"][slot] = projection
+        self.headers["world"][slot] = world
+        self.headers["camsize"][slot] = (0., 0.) if camsize is None\
+                                        else camsize
+        self.headers["generation"][slot] = generation
+        self.headers["seq"][slot] = seq
+
+        self.lastSeq = seq
+        self.counts[ring] += 1
+        return slot, seq
+
+    def ringOf(self, slot):
+        """ Return the ring slot belongs to
+        """
+        return slot // self.nslots
+
+    def generation(self, slot):
+        """ Return the generation of the session the frame stored in slot
+            comes from
+        """
+        return int(self.headers["generation"][slot])
+
+    def isValid(self, slot, seq):
+        """ Return True if slot still holds the frame seq
+        """
+        return self.headers["seq"][slot] == seq
+
+    def size(self, slot, scale = 1):
+        """ Return the (width, height) of the photo stored in slot,
+            downscaled by scale
+        """
+        return scaledSize(tuple(int(v) for v in self.headers["size"][slot]),
+                          scale)
+
+    def path(self, slot, scale = 1):
+        """ Return a path from which the photo stored in slot, downscaled by
+            scale (one of scales), can be read as a PPM file
+        """
+        return SHMDIR + self.slots[slot][scale].name
+
+    def image(self, slot, scale = 1):
+        """ Return the photo stored in slot, downscaled by scale (one of
+            scales), as a numpy array of RGB pixels sharing its memory with
+            the slot. Don't forget to check isValid once done with it
+        """
+        return self.view(slot, scale, self.size(slot))
+
+    def mats(self, slot):
+        """ Return the CameraMats of the frame stored in slot
+        """
+        camsize = self.headers["camsize"][slot]
+        return CameraMats(self.headers["projection"][slot].copy(),
+                          self.headers["world"][slot].copy(),
+                          tuple(camsize) if camsize.any() else None)
+
+    def close(self):
+        """ Release and destroy the shared memory segments
+        """
+        self.headers = None
+        for shm in [shm for segments in self.slots
+                    for shm in segments.values()] + [self.headerShm]:
+            shm.close()
+            shm.unlink()
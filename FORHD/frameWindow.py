@@ -0,0 +1,88 @@
+ #-*- coding: utf-8 -*-
+""" Bookkeeping of the frames that are being processed """
+
+from collections import OrderedDict
+from time import time
+
+from .const import FRAMEWINDOWSIZE
+
+# the stages each frame goes through
+OBJECTSTAGE = "objects"
+FACESTAGE = "faces"
+STAGES = (OBJECTSTAGE, FACESTAGE)
+
+class FrameRecord:
+    """ What we know about a frame in flight """
+
+    def __init__(self, frameId):
+        self.frameId = frameId
+        self.received = time()
+        self.pending = set(STAGES)
+        self.dropped = False
+
+class FrameWindow:
+    """ A bounded window of the frames in flight, identified by their frame id
+        (that is their sequence number in the frameStore).
+        Each stage processes the frames in order and may skip some of them
+        when it can't keep up, so a stage completing a frame means that
+        the older frames it didn't complete were dropped by that stage.
+        Frames leave the window once all their stages are over, or when the
+        window is full and they are the oldest one.
+    """
+
+    def __init__(self, size = FRAMEWINDOWSIZE):
+        self.size = size
+        self.frames = OrderedDict()
+        self.lastLatency = None
+        self.expired = 0
+        self.dropped = 0
+
+    def open(self, frameId):
+        """ Start tracking frameId
+        """
+        self.frames[frameId] = FrameRecord(frameId)
+        while len(self.frames) > self.size:
+            self.frames.popitem(last = False)
+            self.expired += 1
+
+    def complete(self, frameId, stage):
+        """ Tell the window that stage is over for frameId. Return the
+            latencies of the frames this completed (the dropped ones aside)
+        """
+        latencies = []
+        for record in list(self.frames.values()):
+            if record.frameId > frameId:
+                break
+            if stage not in record.pending:
+                continue
+            record.pending.remove(stage)
+            if record.frameId < frameId:
+                record.dropped = True
+            if not record.pending:
+                self.close(record)
+                if not record.dropped:
+                    latencies.append(self.lastLatency)
+        return latencies
+
+    def close(self, record):
+        """ Stop tracking a frame whose stages are all over
+        """
+        del self.frames[record.frameId]
+        if record.dropped:
+            self.dropped += 1
+        else:
+            self.lastLatency = time() - record.received
+
+    def clear(self):
+        """ Forget the frames in flight, they count as dropped
+        """
+        self.dropped += len(self.frames)
+        self.frames.clear()
+
+    def isPending(self, frameId):
+        """ Return True if frameId is still being processed
+        """
+        return frameId in self.frames
+
+    def __len__(self):
+        return len(self.frames)
@@ -1,34 +1,83 @@
  #-*- coding: utf-8 -*-
 
+import base64
+import struct
 from http.server import BaseHTTPRequestHandler
 from multiprocessing import Process, Queue
-from time import sleep
+from threading import Condition, RLock
+from urllib.parse import urlsplit, parse_qs
 
+import numpy as np
+import cv2
 from blinker import signal
 from enum import Enum
 
-from .const import IMGPATH, MATSPATH, PHOTORECEIVEDSIGNAL
-from .utils import debuglog, infolog
+from .const import PHOTORECEIVEDSIGNAL, WAITRESULTSHEADER, FRAMEIDHEADER,\
+                   KEEPALIVETIMEOUT, BINARYRAYSCONTENTTYPE, UPLOADMAGIC,\
+                   UPLOADVERSION, COLLECTORTIMEOUT, STREAMPATH, POLLPATH,\
+                   STREAMKEEPALIVE, STREAMPOLLTIMEOUT, METRICSPATH,\
+                   METRICSCONTENTTYPE, SESSIONHEADER, UPLOADDELAYHEADER
+from .frameWindow import OBJECTSTAGE, FACESTAGE
+from .rayEncoding import LabelTable, encodeRays
+from .knownObjects import KnownObjects
+from .session import Sessions
+from .metrics import Metrics, UPLOADSTAGE, DECODESTAGE, STORESTAGE,\
+                     SIGNALSTAGE, RESPONSESTAGE, FRAMESTAGE
+from .raycast import Raycast
+from .resultBatch import RayBatch
+from .utils import debuglog, infolog, warninglog
+
+# header of the binary upload format: magic, version, reserved, length of the
+# photo
+UPLOADHEADER = struct.Struct("<4sHHI")
 
 class HttpHandler(BaseHTTPRequestHandler):
-    """ The handler for each HTTP request the server will receive. One instance
-        of this class is fired at each request and is closed after it has
-        answered.
+    """ The handler for each HTTP connection the server will receive. One
+        instance of this class is fired at each connection, in its own thread,
+        and answers all the requests sent on that connection (HTTP/1.1
+        keep-alive) until the client closes it or it stays idle for
+        KEEPALIVETIMEOUT seconds.
+        Every state shared between the instances is a class attribute and
+        must only be accessed while holding lock. What belongs to a client
+        lives in its Session, a client being identified by the
+        SESSIONHEADER header of its requests or else by its address.
     """
 
+    protocol_version = "HTTP/1.1"
+    timeout = KEEPALIVETIMEOUT
+    # our answers are small, we don't want them to wait for more data
+    disable_nagle_algorithm = True
+
     # We need to access the yoloHandler to give it the images and the matrices
     # but we don't want to instanciate a new yoloHandler object at each
     # request we receive.
     yoloHandler = None
     faceRecognizerHandler = None
+    frameStore = None
+    # the latency histograms, shared with the handlers
+    metrics = Metrics()
     verbose = True
+    lock = RLock()
     PhotoReceivedEvent = signal(PHOTORECEIVEDSIGNAL)
     ServerProperty = Enum("ServerProperty",
-                          "SEND_FACES")
+                          "SEND_FACES SEND_FRAME_IDS BINARY_RAYS WORLD_MAP")
+    # the settings new sessions start with
     props =\
     {
         ServerProperty.SEND_FACES : True,
+        ServerProperty.SEND_FRAME_IDS : False,
+        ServerProperty.BINARY_RAYS : False,
+        ServerProperty.WORLD_MAP : False,
     }
+    # the sessions of the clients, each one holds its frames being processed
+    # and the results we got from the handlers that haven't been sent yet.
+    # When WORLD_MAP is set only the rays of new objects are sent, along
+    # with the positions of the objects that moved
+    sessions = Sessions()
+    # condition notified whenever results are collected
+    resultsCondition = Condition(lock)
+    # the labels used by the binary rays, shared by all the clients
+    labelTable = LabelTable()
 
     # LOG UTILITIES
 
@@ -37,23 +86,32 @@ class HttpHandler(BaseHTTPRequestHandler):
 
     # ANSWERS
 
-    def generic_answer(self, msg):
+    def generic_answer(self, msg, headers = {}):
         """ Send a generic HTTP answer with msg:
                 - Status code: 200
-                - Header fields: Content-Type, Content-Length
+                - Header fields: Content-Type, Content-Length and headers
                 - Body: msg
         """
+        self.raw_answer(msg.encode("utf8"), "text/html", headers)
+        self.debuglog("Sent:\n%s" % msg)
+
+    def raw_answer(self, body, contentType, headers = {}):
+        """ Send an HTTP answer with body (bytes):
+                - Status code: 200
+                - Header fields: Content-Type, Content-Length and headers
+                - Body: body
+        """
         try:
             self.send_response(200)
-            self.send_header("Content-Type", "text/html")
-            self.send_header("Content-Length", len(msg))
+            self.send_header("Content-Type", contentType)
+            self.send_header("Content-Length", len(body))
+            for key, value in headers.items():
+                self.send_header(key, value)
             self.end_headers()
-            self.wfile.write(msg.encode("utf8"))
-            self.debuglog("Sent:\n%s" % msg)
+            self.wfile.write(body)
         except ConnectionResetError as cre:
             print(cre)
-            self.finish()
-            self.connection.close()
+            self.close_connection = True
 
     def dummy_answer(self):
         """ Send an answer that won't be used by the HoloLens.
@@ -62,75 +120,476 @@ class HttpHandler(BaseHTTPRequestHandler):
         """
         self.generic_answer("Good")
 
+    def bad_request(self, msg):
+        """ Answer that the request is malformed (status code 400), msg
+            telling why
+        """
+        warninglog("Bad request: %s" % msg)
+        try:
+            self.send_error(400, msg)
+        except ConnectionResetError as cre:
+            print(cre)
+            self.close_connection = True
+
     def request_photo(self):
         """ Send "PhotoRequest" as an answer to ask a photo from the HoloLens
         """
         self.generic_answer("PhotoRequest")
 
-    def get_object_rays(self):
-        """ Send all the rays we computed since last time we called this function.
-            null stands for no ray
+    @classmethod
+    def get_session(cls, key):
+        """ Return the session of key, opening it if needed
         """
-        rays = ""
-        # Get all the object rays we have ..
-        while self.yoloHandler.hasObject():
-            nextRay = self.yoloHandler.getNextRaycast()
-            rays += "\nray:%s" % str(nextRay)
-        return rays
+        with cls.lock:
+            return cls.sessions.get(key, cls.props)
 
-    def get_recognized_faces(self):
-        """ Send all the faces we did recognize
+    def session(self):
+        """ Return the session of the client sending the request
         """
-        rays = ""
-        while self.faceRecognizerHandler.hasRecognizedFaces():
-            nextRecognizedFace = self.faceRecognizerHandler.getRecognizedFace()
-            rays += "\nfaceray:%s" % str(nextRecognizedFace)
-        return rays
+        return self.get_session(self.headers[SESSIONHEADER] or
+                                self.client_address[0])
 
-
-    def get_unknown_faces(self):
-        """ Send all the faces we didn't recognize
+    @classmethod
+    def complete_frame(cls, frameId, stage):
+        """ Tell the frame window of its session that stage is over for
+            frameId and record the latency of the frames it completed
+        """
+        session = cls.sessions.sessionOf(frameId)
+        if session is None:
+            return
+        for latency in session.frameWindow.complete(frameId, stage):
+            cls.metrics.observe(FRAMESTAGE, latency)
+            session.pacer.observe(latency)
+
+    @classmethod
+    def collect_results(cls):
+        """ Move the results the handlers have computed to the pending lists
+            of the sessions they belong to, or push them to the stream
+            listeners of the sessions that have some, and tell the frame
+            windows which frames are done. The handlers give all the results of a frame at once, as a batch,
+            and we take all the frames they have done at once, under the lock
+            so that they are collected in order. The batches are kept as they
+            are until they are sent
         """
-        rays = ""
-        while self.faceRecognizerHandler.hasUnknownFaces():
-            nextUnknownFace = self.faceRecognizerHandler.get()
-            rays += "\nunknownface:ray:%s" % str(nextUnknownFace.raycast)
-        return rays
+        with cls.lock:
+            frames = cls.yoloHandler.takeFrames()
+            # session to its new ray batches, face batches and objects
+            results = {}
+            def resultsOf(frameId):
+                session = cls.sessions.sessionOf(frameId)
+                if session is None:
+                    return None, None
+                return session, results.setdefault(session, ([], [], []))
+
+            for batch in frames:
+                session, sessionResults = resultsOf(batch.frameId)
+                if session is None:
+                    continue
+                rays, _, objects = sessionResults
+                if session.props[cls.ServerProperty.WORLD_MAP]:
+                    raycasts, updates = session.worldMap.update(
+                        batch.raycasts(), batch.frameId)
+                    batch = RayBatch.fromRaycasts(batch.frameId, raycasts)
+                    objects.extend(updates)
+                rays.append(batch)
+                cls.complete_frame(batch.frameId, OBJECTSTAGE)
+            doneFrames = cls.faceRecognizerHandler.takeFrames()
+            for batch in doneFrames:
+                session, sessionResults = resultsOf(batch.frameId)
+                if session is not None:
+                    sessionResults[1].append(batch)
+                cls.complete_frame(batch.frameId, FACESTAGE)
+
+            for session, (rays, faces, objects) in results.items():
+                # the results go to the listeners instead of the next answer,
+                # so that they are sent once and don't pile up for the
+                # clients that never ask for them
+                if session.rayStream.hasListeners():
+                    if any(len(batch) for batch in rays + faces) or objects:
+                        session.rayStream.publish((rays, faces, objects))
+                    continue
+                session.pendingRays.extend(rays)
+                session.pendingFaces.extend(faces)
+                session.pendingObjects.extend(objects)
+            if frames or doneFrames:
+                cls.resultsCondition.notify_all()
+
+    @classmethod
+    def collect_forever(cls, stop):
+        """ Launched in a new thread. Collect the results as soon as the
+            handlers compute them, until stop is set
+        """
+        while not stop.is_set():
+            cls.yoloHandler.waitFrame(timeout = COLLECTORTIMEOUT)
+            cls.collect_results()
 
-    def send_all_rays(self):
-        rays = "rays:"
-        rays += self.get_object_rays()[1:]
-        if self.props[self.ServerProperty.SEND_FACES]:
-            rays += self.get_recognized_faces()
-            rays += self.get_unknown_faces()
+    def wait_results(self, session, frameId, timeout):
+        """ Wait until frameId (of session) is done or timeout (in seconds) is
+            over
+        """
+        frameWindow = session.frameWindow
+        with self.resultsCondition:
+            done = self.resultsCondition.wait_for(
+                lambda: not frameWindow.isPending(frameId), timeout)
+            if done:
+                self.debuglog("Frame %d done in %.3fs" %
+                              (frameId, frameWindow.lastLatency or 0.))
+
+    @classmethod
+    def get_object_rays(cls, rays, props = None):
+        """ Return the text of the rays. null stands for no ray. props are the
+            settings of the session, the default ones if None
+        """
+        props = cls.props if props is None else props
+        withFrameId = props[cls.ServerProperty.SEND_FRAME_IDS]
+        text = ""
+        for nextRay in rays:
+            text += "\nray:%s" % nextRay.toString(withFrameId)
+        return text
+
+    @classmethod
+    def get_recognized_faces(cls, faces, props = None):
+        """ Return the text of the faces we did recognize
+        """
+        props = cls.props if props is None else props
+        withFrameId = props[cls.ServerProperty.SEND_FRAME_IDS]
+        text = ""
+        for nextRecognizedFace in faces:
+            text += "\nfaceray:%s" % nextRecognizedFace.toString(withFrameId)
+        return text
+
+    @classmethod
+    def get_unknown_faces(cls, faces, props = None):
+        """ Return the text of the faces we didn't recognize
+        """
+        props = cls.props if props is None else props
+        withFrameId = props[cls.ServerProperty.SEND_FRAME_IDS]
+        text = ""
+        for nextUnknownFace in faces:
+            text += "\nunknownface:ray:%s" %\
+                    nextUnknownFace.raycast.toString(withFrameId)
+        return text
+
+    @classmethod
+    def get_objects(cls, objects):
+        """ Return the text of the objects of the world map
+        """
+        text = ""
+        for nextObject in objects:
+            text += "\nobject:%s" % nextObject
+        return text
+
+    @classmethod
+    def get_text_rays(cls, rays, recognizedFaces, unknownFaces, objects = (),
+                      props = None):
+        """ Return the text of the rays, faces and objects
+        """
+        props = cls.props if props is None else props
+        text = "rays:"
+        text += cls.get_object_rays(rays, props)[1:]
+        if props[cls.ServerProperty.SEND_FACES]:
+            text += cls.get_recognized_faces(recognizedFaces, props)
+            text += cls.get_unknown_faces(unknownFaces, props)
+        text += cls.get_objects(objects)
+        return text
+
+    @classmethod
+    def get_text_results(cls, rays, faces, objects = (), props = None):
+        """ Return the text of the rays (RayBatch), faces (FaceBatch) and
+            objects, see get_text_rays
+        """
+        raycasts = [ray for batch in rays for ray in batch.raycasts()]
+        recognizedFaces = []
+        unknownFaces = []
+        for batch in faces:
+            recognized, unknown = batch.faces()
+            recognizedFaces.extend(recognized)
+            unknownFaces.extend(unknown)
+        return cls.get_text_rays(raycasts, recognizedFaces, unknownFaces,
+                                 objects, props)
+
+    def get_binary_rays(self, session, rays, faces, objects = (),
+                        allLabels = False):
+        """ Return the rays (RayBatch), faces (FaceBatch) and objects encoded
+            with encodeRays, along with the labels the client of session
+            doesn't know yet, or all of them if allLabels
+        """
+        if not session.props[self.ServerProperty.SEND_FACES]:
+            faces = []
+        if allLabels:
+            return encodeRays(self.labelTable, 0, rays, faces, objects)
+        body = encodeRays(self.labelTable, session.labelsSent, rays, faces,
+                          objects)
+        session.labelsSent = len(self.labelTable)
+        return body
+
+    def wants_binary_rays(self, session):
+        """ Return True if the rays must be sent in binary, that is if the
+            client asked for it in its request or through a setting
+        """
+        accept = self.headers["Accept"] or ""
+        return BINARYRAYSCONTENTTYPE in accept\
+            or session.props[self.ServerProperty.BINARY_RAYS]
+
+    def send_all_rays(self, session, headers = {}):
+        """ Send all the rays and faces we computed for session since last
+            time we called this function, along with how long the client
+            should wait before sending its next photo
+        """
+        with self.lock:
+            self.collect_results()
+            delay = session.pacer.delay(len(session.frameWindow))
+            headers = dict(headers)
+            headers[UPLOADDELAYHEADER] = "%d" % round(delay * 1000.)
+            rays, faces, objects = session.takeResults()
+            with self.metrics.time(RESPONSESTAGE):
+                binary, body = self.encode_results(session, rays, faces,
+                                                   objects)
+
+        if binary:
+            self.raw_answer(body, BINARYRAYSCONTENTTYPE, headers)
+        else:
+            self.generic_answer(body, headers)
+
+    def encode_results(self, session, rays, faces, objects,
+                       allLabels = False):
+        """ Drop the rays and objects of session the client already knows
+            about and encode the rest the way the client wants them. Return
+            whether the body is binary and the body. See get_binary_rays for
+            allLabels. Must be called with the lock held
+        """
+        rays = [session.knownObjects.cullRays(batch) for batch in rays]
+        objects = session.knownObjects.cullObjects(objects)
+        if self.wants_binary_rays(session):
+            return True, self.get_binary_rays(session, rays, faces, objects,
+                                              allLabels)
+        return False, self.get_text_results(rays, faces, objects,
+                                            session.props)
+
+    def encode_events(self, session, events):
+        """ Merge the results pushed to a listener of session and encode them
+            with encode_results. Listeners can join late and lose events when
+            their buffer is full, so binary events carry the whole label table
+        """
+        rays, faces, objects = [], [], []
+        for eventRays, eventFaces, eventObjects in events:
+            rays.extend(eventRays)
+            faces.extend(eventFaces)
+            objects.extend(eventObjects)
+        with self.lock:
+            return self.encode_results(session, rays, faces, objects,
+                                       allLabels = True)
+
+    def stream_rays(self, session):
+        """ Push the results of each frame of session to the client as soon
+            as they are computed, as server-sent events, until the client
+            goes away. Binary results are sent base64-encoded as binaryrays
+            events
+        """
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        self.close_connection = True
+
+        listener = session.rayStream.subscribe()
+        try:
+            while True:
+                events = listener.take(STREAMKEEPALIVE)
+                chunk = ""
+                for event in events:
+                    binary, body = self.encode_events(session, [event])
+                    if binary:
+                        chunk += "event: binaryrays\n"
+                        chunk += "data: %s\n" %\
+                                 base64.b64encode(body).decode("ascii")
+                    else:
+                        chunk += "event: rays\n"
+                        for line in body.split("\n"):
+                            chunk += "data: %s\n" % line
+                    chunk += "\n"
+                # comments keep the connection alive and let us notice when
+                # the client is gone
+                if not chunk:
+                    chunk = ": ping\n\n"
+                data = chunk.encode("utf8")
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        except (ConnectionResetError, BrokenPipeError):
+            pass
+        finally:
+            session.rayStream.unsubscribe(listener)
+
+    def poll_rays(self, session, query):
+        """ Long-polling fallback of stream_rays: wait for the results of at
+            least one frame of session (at most timeout milliseconds) and send
+            all the results computed since the last poll of this client. A
+            malformed timeout gets a 400 answer
+        """
+        key = query.get("id", [self.client_address[0]])[0]
+        try:
+            timeout = self.parse_milliseconds(
+                query.get("timeout", [STREAMPOLLTIMEOUT])[0])
+        except ValueError as ve:
+            self.bad_request(str(ve))
+            return
+        events = session.rayStream.pollListener(key).take(timeout)
+        binary, body = self.encode_events(session, events)
+        if binary:
+            self.raw_answer(body, BINARYRAYSCONTENTTYPE)
+        else:
+            self.generic_answer(body)
+
+    @staticmethod
+    def queue_depth(queue):
+        """ Return the approximate size of a multiprocessing queue, or NaN on
+            the platforms that can't tell
+        """
+        try:
+            return queue.qsize()
+        except NotImplementedError:
+            return float("nan")
 
-        self.generic_answer(rays)
+    def send_metrics(self):
+        """ Send the stage latency histograms, the queue depths and the drop
+            counters in the Prometheus text format
+        """
+        with self.lock:
+            sessions = list(self.sessions)
+            depths = [({"queue": "pendingRays"},
+                       sum(len(batch) for session in sessions
+                           for batch in session.pendingRays)),
+                      ({"queue": "framesInFlight"},
+                       sum(len(session.frameWindow) for session in sessions))]
+            dropped, expired = self.sessions.counters()
+            drops = [({"reason": "window"}, dropped),
+                     ({"reason": "expired"}, expired)]
+            listeners = sum(len(session.rayStream.listeners)
+                            for session in sessions)
+            rates = [({"session": session.key}, "%.2f" % session.pacer.rate())
+                     for session in sessions]
+        handlers = (("yolo", self.yoloHandler),
+                    ("face", self.faceRecognizerHandler))
+        for name, handler in handlers:
+            if handler is None:
+                continue
+            state = handler.dispatcher.peek()
+            drops.append(({"reason": "dispatcher", "handler": name},
+                          state["dropped"]))
+        if self.yoloHandler is not None:
+            with self.yoloHandler.orderLock:
+                depths.append(({"queue": "yoloInFlight"},
+                               len(self.yoloHandler.inFlight)))
+        if self.faceRecognizerHandler is not None:
+            faceHandler = self.faceRecognizerHandler
+            depths.extend([
+                ({"queue": "faces"}, self.queue_depth(faceHandler.faces)),
+                ({"queue": "doneFrames"},
+                 self.queue_depth(faceHandler.doneFrames))])
+        published = [({"handler": name}, handler.dispatcher.peek()["published"])
+                     for name, handler in handlers if handler is not None]
+        samples = [("forhd_queue_depth", "gauge",
+                    "Items waiting in each queue", depths),
+                   ("forhd_frames_dropped_total", "counter",
+                    "Frames dropped, by reason", drops),
+                   ("forhd_frames_published_total", "counter",
+                    "Frames handed to each handler", published),
+                   ("forhd_stream_listeners", "gauge",
+                    "Clients listening to the ray stream",
+                    [({}, listeners)]),
+                   ("forhd_sessions", "gauge", "Clients with a session",
+                    [({}, len(sessions))]),
+                   ("forhd_upload_rate", "gauge",
+                    "Photos per second each client is asked for", rates)]
+        self.raw_answer(self.metrics.render(samples).encode("utf8"),
+                        METRICSCONTENTTYPE)
 
     # HTTP REQUESTS
 
+    def store_frame(self, session, body):
+        """ Store the photo and the matrices sent in body in the frameStore
+            ring of session and notify the handlers that we have a new frame.
+            Return the id of the frame, or None if we had to drop it.
+            The photo is decoded here, once for all the handlers, and before
+            taking the lock so that photos sent on several connections are
+            decoded side by side
+        """
+        try:
+            rawImage, projection, world = self.splitImageMats(body)
+            with self.metrics.time(DECODESTAGE):
+                img = self.decodePhoto(rawImage)
+        except ValueError as ve:
+            warninglog("Dropping frame: %s" % ve)
+            return None
+        # frames must be stored and published in order
+        with self.lock:
+            try:
+                with self.metrics.time(STORESTAGE):
+                    slot, seq = self.frameStore.put(img, projection, world,
+                                                    session.index,
+                                                    session.camsize,
+                                                    session.generation)
+            except ValueError as ve:
+                warninglog("Dropping frame: %s" % ve)
+                return None
+            session.frameWindow.open(seq)
+            session.pacer.uploaded()
+            self.sessions.addFrame(seq, session)
+            with self.metrics.time(SIGNALSTAGE):
+                self.PhotoReceivedEvent.send("HttpHandler", slot = slot,
+                                             seq = seq,
+                                             session = session.index)
+        return seq
+
     def do_PUT(self):
         """ Deal with a PUT request. PUT requests are only used to send photos
             and matrices (see parse_input). We parse the message we get and
-            store the photo in IMAGEPATH and the matrices in MATSPATH. We then
-            notify the yoloHandler that we have new inputs
+            store the photo and the matrices in the frameStore. We then
+            notify the handlers that we have a new frame.
+            If the request has a WAITRESULTSHEADER header, we wait (at most
+            its value in milliseconds) for the results of that frame before
+            answering, an invalid value is ignored. The answer tells the client
+            when to send its next photo (UPLOADDELAYHEADER)
         """
         msg_length = int(self.headers['Content-Length'])
         self.debuglog('### PUT ### %d' % msg_length)
 
-        rawImage, mats = self.splitImageMats(self.rfile.read(msg_length))
-        with open(IMGPATH, "w+b") as f:
-            f.write(rawImage)
-        with open(MATSPATH, "w+") as f:
-            f.write(mats)
-        self.PhotoReceivedEvent.send("HttpHandler", imgpath = IMGPATH,
-                                                    matspath = MATSPATH)
-        self.send_all_rays()
+        with self.metrics.time(UPLOADSTAGE):
+            body = self.rfile.read(msg_length)
+        session = self.session()
+        seq = self.store_frame(session, body)
+        if seq is None:
+            self.send_all_rays(session)
+            return
+
+        waitResults = self.headers[WAITRESULTSHEADER]
+        if waitResults is not None:
+            try:
+                timeout = self.parse_milliseconds(waitResults)
+            except ValueError as ve:
+                warninglog("Ignoring %s: %s" % (WAITRESULTSHEADER, ve))
+            else:
+                self.wait_results(session, seq, timeout)
+        self.send_all_rays(session, {FRAMEIDHEADER : seq})
 
     def do_GET(self):
-        """ Deal with GET requests. We ignore them since they are the first
-            request sent by the HoloLens when it tries to reach the server
+        """ Deal with GET requests. Depending on the path we do :
+                - STREAMPATH: push the rays to the client as they are computed
+                - POLLPATH: wait for new rays and send them
+                - METRICSPATH: send the metrics of the pipeline
+                - anything else: we ignore them since they are the first
+                  request sent by the HoloLens when it tries to reach the
+                  server
         """
-        self.dummy_answer()
+        url = urlsplit(self.path)
+        if url.path == STREAMPATH:
+            self.stream_rays(self.session())
+        elif url.path == POLLPATH:
+            self.poll_rays(self.session(), parse_qs(url.query))
+        elif url.path == METRICSPATH:
+            self.send_metrics()
+        else:
+            self.dummy_answer()
 
     def do_POST(self):
         """ Deal with a POST request. Depending on what message we get we do :
@@ -154,63 +613,152 @@ class HttpHandler(BaseHTTPRequestHandler):
     # HANDLE MESSAGES
 
     def handle_msg(self, msg):
+        """ Every message gets exactly one answer, otherwise the client would
+            wait for it forever on a keep-alive connection
+        """
         if msg == "letsgo":
             self.handle_letsgo(msg)
-        if msg[:7] == "camsize":
+        elif msg == "nextrays":
+            self.handle_nextrays(msg)
+        elif msg[:7] == "camsize":
             self.handle_camsize(msg)
-        if msg[:3] == "obj":
+        elif msg[:3] == "obj":
             self.handle_obj(msg)
-        if msg[:7] == "setting":
+        elif msg[:7] == "setting":
             self.handle_setting(msg)
+        else:
+            self.dummy_answer()
 
     def handle_letsgo(self, msg):
-        """ Request an image
+        """ Request an image. The client starts over (see Session.reset)
         """
+        session = self.session()
+        with self.lock:
+            self.sessions.reset(session)
         self.request_photo()
 
+    def handle_nextrays(self, msg):
+        """ Send the rays computed since the last time we sent some
+        """
+        self.send_all_rays(self.session())
+
     def handle_camsize(self, msg):
-        """ Set camsize on faceRecognizer and yoloHandler and send a dummy
-            answer
+        """ Set the camsize of the session, it is stored with each of its
+            frames, and send a dummy answer
         """
         debuglog("Resolution: %s" % msg[7:])
         parseMsg = msg[7:].split("x")
-        self.yoloHandler.camsize[0] = float(parseMsg[0])
-        self.yoloHandler.camsize[1] = float(parseMsg[1])
-        self.faceRecognizerHandler.camsize[0] = float(parseMsg[0])
-        self.faceRecognizerHandler.camsize[1] = float(parseMsg[1])
+        camsize = (float(parseMsg[0]), float(parseMsg[1]))
+        session = self.session()
+        with self.lock:
+            session.camsize = camsize
         self.dummy_answer()
 
     def handle_obj(self, msg):
-        """ obj messages contain the actual 3D objects displayed by the Hololens
+        """ obj messages contain the actual 3D objects displayed by the
+            Hololens, we won't send it rays pointing at them anymore
         """
+        objects = KnownObjects.parse(msg)
+        session = self.session()
+        with self.lock:
+            session.knownObjects.update(objects)
+        self.debuglog("%d objects known by %s" % (len(objects), session.key))
         self.dummy_answer()
 
     def handle_setting(self, msg):
-        """ Change settings
+        """ Change the settings of the session
         """
         settingStrings = msg[7:].split("\n")
-        for setting in settingStrings:
-            if setting[:9] == "SENDFACES":
-                if setting[9:] == "true":
-                    self.props[ServerProperty.SEND_FACES] = True;
-                elif setting[9:] == "false":
-                    self.props[ServerProperty.SEND_FACES] = False;
+        props = self.session().props
+        with self.lock:
+            for setting in settingStrings:
+                if setting[:9] == "SENDFACES":
+                    if setting[9:] == "true":
+                        props[self.ServerProperty.SEND_FACES] = True;
+                    elif setting[9:] == "false":
+                        props[self.ServerProperty.SEND_FACES] = False;
+                if setting[:12] == "SENDFRAMEIDS":
+                    if setting[12:] == "true":
+                        props[self.ServerProperty.SEND_FRAME_IDS] = True;
+                    elif setting[12:] == "false":
+                        props[self.ServerProperty.SEND_FRAME_IDS] = False;
+                if setting[:10] == "BINARYRAYS":
+                    if setting[10:] == "true":
+                        props[self.ServerProperty.BINARY_RAYS] = True;
+                    elif setting[10:] == "false":
+                        props[self.ServerProperty.BINARY_RAYS] = False;
+                if setting[:8] == "WORLDMAP":
+                    if setting[8:] == "true":
+                        props[self.ServerProperty.WORLD_MAP] = True;
+                    elif setting[8:] == "false":
+                        props[self.ServerProperty.WORLD_MAP] = False;
         self.dummy_answer()
 
     # UTILS
 
-    def splitImageMats(self, byteArray):
-        """ byteArray looks like b"Length(4 bytes)
-                                   [Photo]
-                                   Projection:[Matrix];
-                                   World:[Matrix]"
-            We separate the photo from the matrices and return them
+    @staticmethod
+    def splitImageMats(byteArray):
+        """ byteArray looks either like
+                b"Magic(4 bytes)Version(2 bytes)Reserved(2 bytes)
+                  Length(4 bytes)
+                  [Photo]
+                  [Projection matrix, 16 little-endian float32, row-major]
+                  [World matrix, 16 little-endian float32, row-major]"
+            or, for older clients, like
+                b"Length(4 bytes)
+                  [Photo]
+                  Projection:[Matrix];
+                  World:[Matrix]"
+            We separate the photo from the matrices and return the photo (as
+            a memoryview on byteArray, it is not copied) and the projection
+            and world matrices as 4x4 numpy arrays. Raise ValueError if
+            byteArray is truncated or malformed
         """
-        length = int.from_bytes(byteArray[:4], 'little')
-        rawImage = byteArray[4:length+4]
-        mats = byteArray[length+4:].decode("utf8")
+        view = memoryview(byteArray)
+        if bytes(view[:4]) == UPLOADMAGIC:
+            if len(view) < UPLOADHEADER.size:
+                raise ValueError("Truncated upload header")
+            magic, version, _, length = UPLOADHEADER.unpack_from(view)
+            if version != UPLOADVERSION:
+                raise ValueError("Unknown upload format version %d" % version)
+            start = UPLOADHEADER.size
+            rawImage = view[start:start+length]
+            mats = np.frombuffer(view, dtype = "<f4", count = 32,
+                                 offset = start+length)
+            mats = mats.astype(np.float64).reshape(2, 4, 4)
+            return rawImage, mats[0], mats[1]
+
+        length = int.from_bytes(view[:4], 'little')
+        rawImage = view[4:length+4]
+        mats = bytes(view[length+4:]).decode("utf8")
         # The message always contain these characters near the matrices, and
         # they can't be translated to utf8. So we get rid of them
         mats = mats.replace("\x00", " ")
+        projection, world = Raycast.parseMats(mats)
+
+        return rawImage, projection, world
 
-        return rawImage, mats
+    @staticmethod
+    def parse_milliseconds(value):
+        """ Return value, a duration in milliseconds sent by the client, in
+            seconds. Raise ValueError if it isn't a finite non negative number
+        """
+        try:
+            seconds = float(value) / 1000.
+        except (TypeError, ValueError):
+            seconds = None
+        # NaN fails the comparison too
+        if seconds is None or not 0. <= seconds < float("inf"):
+            raise ValueError("Invalid duration %r" % value)
+        return seconds
+
+    @staticmethod
+    def decodePhoto(rawImage):
+        """ Return the photo rawImage (as returned by splitImageMats)
+            decoded to a BGR image, raise ValueError if it can't be decoded
+        """
+        img = cv2.imdecode(np.frombuffer(rawImage, dtype = np.uint8),
+                           cv2.IMREAD_COLOR)
+        if img is None:
+            raise ValueError("Couldn't decode the photo")
+        return img
@@ -0,0 +1,92 @@
+ #-*- coding: utf-8 -*-
+""" The objects a client already placed in the world """
+
+import numpy as np
+
+from .objects import Object3D
+from .const import KNOWNOBJECTTOLERANCE
+
+class KnownObjects:
+    """ The positions of the objects a client holds, by label. Rays passing
+        closer than tolerance to a known object of their label, and objects
+        closer than tolerance to it, point at something the client already
+        has, so they are not sent
+    """
+
+    def __init__(self, tolerance = KNOWNOBJECTTOLERANCE):
+        self.tolerance = tolerance
+        # label to the Nx3 array of the positions of the objects of that label
+        self.positions = {}
+
+    @staticmethod
+    def parse(msg):
+        """ Parse an obj message, which looks like "obj" followed by one
+            "label;confidence;x;y;z" line per object (see Object3D), and
+            return the list of the Object3D. Malformed lines are ignored
+        """
+        objects = []
+        for line in msg[3:].split("\n"):
+            parsedLine = line.strip().split(";")
+            if len(parsedLine) != 5:
+                continue
+            try:
+                objects.append(Object3D(parsedLine[0], float(parsedLine[1]),
+                                        parsedLine[2], parsedLine[3],
+                                        parsedLine[4], 0, 0))
+            except ValueError:
+                pass
+        return objects
+
+    def update(self, objects):
+        """ Replace the known objects by objects
+        """
+        positions = {}
+        for obj in objects:
+            positions.setdefault(obj.label, []).append((obj.x, obj.y, obj.z))
+        self.positions = {label: np.array(points)
+                          for label, points in positions.items()}
+
+    def cullRays(self, batch):
+        """ Return the batch of the rays of batch (a RayBatch) that don't pass
+            close to a known object of their label
+        """
+        if not self.positions or not len(batch):
+            return batch
+        keep = np.ones(len(batch), dtype = bool)
+        labelIds = batch.records["label"]
+        for label, positions in self.positions.items():
+            if label not in batch.labels:
+                continue
+            indices = np.flatnonzero(labelIds == batch.labels.index(label))
+            if not len(indices):
+                continue
+            origins = batch.records["near"][indices]
+            directions = batch.records["far"][indices] - origins
+            norms = np.linalg.norm(directions, axis = 1)
+            directions /= np.where(norms > 0, norms, 1.)[:, None]
+            # distance from every known position to every ray (as a half
+            # line starting at the camera)
+            offsets = positions[None, :, :] - origins[:, None, :]
+            along = np.clip((offsets * directions[:, None, :]).sum(axis = 2),
+                            0., None)
+            distances = np.linalg.norm(
+                offsets - along[:, :, None] * directions[:, None, :], axis = 2)
+            keep[indices] = distances.min(axis = 1) > self.tolerance
+        return batch if keep.all() else batch.select(keep)
+
+    def cullObjects(self, objects):
+        """ Return the objects of objects (Object3D) that are not close to a
+            known object of their label
+        """
+        kept = []
+        for obj in objects:
+            positions = self.positions.get(obj.label)
+            if positions is not None and\
+               np.linalg.norm(positions - (obj.x, obj.y, obj.z), axis = 1)\
+                 .min() <= self.tolerance:
+                continue
+            kept.append(obj)
+        return kept
+
+    def __len__(self):
+        return sum(len(positions) for positions in self.positions.values())
@@ -1,28 +1,57 @@
-from http.server import HTTPServer
+from http.server import ThreadingHTTPServer
+from threading import Event, Thread
 
 from .yoloHandler import YoloHandler
 from .httpHandler import HttpHandler
 from .faceRecognizerHandler import FaceRecognizerHandler
-from .const import LOCALIP, LOCALPORT
+from .frameStore import FrameStore
+from .metrics import Metrics
+from .const import LOCALIP, LOCALPORT, DETECTORBACKEND, DETECTORINSTANCES,\
+                   MAXSESSIONS
 from .utils import infolog
 
 class Main:
     """ The main class of our program """
 
-    def __init__(self, verbose = True):
+    def __init__(self, verbose = True, detector = DETECTORBACKEND,
+                 instances = DETECTORINSTANCES):
         """ We start by instantiating yoloHandler and faceRecognizer and
             giving it to the HttpHandler as a static variable.
             Then we start the HTTP server
         """
         self.verbose = verbose
 
-        self.yoloHandler = YoloHandler(verbose = self.verbose)
+        # the frame store must exist before the handlers spawn their processes
+        # so that they inherit it, with a ring of slots per session
+        self.frameStore = FrameStore(nrings = MAXSESSIONS)
+        HttpHandler.frameStore = self.frameStore
+        # and so must the metrics, that all the processes record into
+        self.metrics = Metrics()
+        HttpHandler.metrics = self.metrics
+
+        self.yoloHandler = YoloHandler(self.frameStore, backend = detector,
+                                       instances = instances,
+                                       metrics = self.metrics,
+                                       verbose = self.verbose)
         HttpHandler.yoloHandler = self.yoloHandler
 
-        self.faceRecognizerHandler = FaceRecognizerHandler(verbose = self.verbose)
+        self.faceRecognizerHandler = FaceRecognizerHandler(self.frameStore,
+                                                           metrics = self.metrics,
+                                                           verbose = self.verbose)
         HttpHandler.faceRecognizerHandler = self.faceRecognizerHandler
 
-        self.server = HTTPServer((LOCALIP, LOCALPORT), HttpHandler)
+        # each connection is served by its own thread, so a slow upload
+        # doesn't hold back the other requests
+        self.server = ThreadingHTTPServer((LOCALIP, LOCALPORT), HttpHandler)
+        self.server.daemon_threads = True
+
+        # we collect the results as soon as they are computed to push them to
+        # the clients streaming them
+        self.stopCollecting = Event()
+        self.collector = Thread(target = HttpHandler.collect_forever,
+                                args = (self.stopCollecting,))
+        self.collector.daemon = True
+        self.collector.start()
 
         self.run()
 
@@ -36,6 +65,10 @@ class Main:
             self.close()
 
     def close(self):
-        """ Close and clean the server and the yoloHandler """
-        self.server.socket.close()
+        """ Close and clean the server, the handlers and the frame store """
+        self.server.server_close()
+        self.stopCollecting.set()
+        self.collector.join()
         self.yoloHandler.close()
+        self.faceRecognizerHandler.close()
+        self.frameStore.close()
@@ -0,0 +1,139 @@
+ #-*- coding: utf-8 -*-
+""" Latency histograms of the stages of the pipeline, shared by all the
+    processes, and their Prometheus text exposition """
+
+import os
+from bisect import bisect_left
+from multiprocessing import RawArray, RawValue, Lock
+from threading import Lock as ThreadLock
+from time import perf_counter
+
+import numpy as np
+
+from .const import METRICSBUCKETS, METRICSWRITERS
+
+# the stages we time
+UPLOADSTAGE = "upload"          # reading the body of a PUT request
+DECODESTAGE = "decode"          # decoding the photo, once for all handlers
+STORESTAGE = "store"            # copying the photo to the frameStore
+SIGNALSTAGE = "signal"          # handing the frame to the handlers
+DETECTSTAGE = "detect"          # running the object detector on a frame
+RAYCASTSTAGE = "raycast"        # computing the rays of the objects found
+HAARSTAGE = "haar"              # finding the faces of a frame
+CROPSTAGE = "crop"              # cutting the faces out and saving them
+RECOGNIZESTAGE = "recognize"    # recognizing a face, waiting included
+RESPONSESTAGE = "response"      # building the answer of send_all_rays
+FRAMESTAGE = "frame"            # from the upload to the end of all stages
+METRICSTAGES = (UPLOADSTAGE, DECODESTAGE, STORESTAGE, SIGNALSTAGE,
+                DETECTSTAGE, RAYCASTSTAGE, HAARSTAGE, CROPSTAGE,
+                RECOGNIZESTAGE, RESPONSESTAGE, FRAMESTAGE)
+
+class Timer:
+    """ Time the block of a with statement and record it for a stage """
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.stage, perf_counter() - self.start)
+
+class Metrics:
+    """ A latency histogram per stage, in shared memory. Every process writes
+        to its own row (claimed the first time it records something) so
+        processes never wait for each other, the threads of a process share
+        its row and a lock. Reading sums the rows.
+        It must be created before the processes recording into it are
+        spawned
+    """
+
+    def __init__(self, buckets = METRICSBUCKETS, writers = METRICSWRITERS):
+        self.buckets = tuple(buckets)
+        self.stages = {stage: i for i, stage in enumerate(METRICSTAGES)}
+        # per writer and per stage, the count of each bucket (the last one
+        # being +Inf) and the sum of the durations
+        shape = (writers, len(METRICSTAGES), len(self.buckets) + 1)
+        self.countsBuffer = RawArray('q', int(np.prod(shape)))
+        self.counts = np.frombuffer(self.countsBuffer,
+                                    dtype = np.int64).reshape(shape)
+        self.sumsBuffer = RawArray('d', writers * len(METRICSTAGES))
+        self.sums = np.frombuffer(self.sumsBuffer, dtype = np.float64)\
+                      .reshape(shape[:2])
+        self.nwriters = RawValue('i', 0)
+        self.claimLock = Lock()
+        # the row of the current process, see claim
+        self.pid = None
+        self.row = None
+        self.rowLock = None
+
+    def claim(self):
+        """ Give the current process a row of its own
+        """
+        with self.claimLock:
+            # another thread of this process may have claimed it meanwhile
+            if self.pid == os.getpid():
+                return
+            row = self.nwriters.value
+            # past the last row, the processes share it: counts may then be
+            # slightly off but nothing breaks
+            if row < len(self.counts) - 1:
+                self.nwriters.value += 1
+            self.row = min(row, len(self.counts) - 1)
+            self.rowLock = ThreadLock()
+            self.pid = os.getpid()
+
+    def observe(self, stage, seconds):
+        """ Record that stage took seconds
+        """
+        if self.pid != os.getpid():
+            self.claim()
+        stageIndex = self.stages[stage]
+        bucket = bisect_left(self.buckets, seconds)
+        with self.rowLock:
+            self.counts[self.row, stageIndex, bucket] += 1
+            self.sums[self.row, stageIndex] += seconds
+
+    def time(self, stage):
+        """ Return a context manager recording how long its block takes for
+            stage
+        """
+        return Timer(self, stage)
+
+    def histograms(self):
+        """ Return, for each stage, its cumulative bucket counts (the last one
+            being the total count) and the sum of its durations
+        """
+        counts = self.counts.sum(axis = 0).cumsum(axis = 1)
+        sums = self.sums.sum(axis = 0)
+        return {stage: (counts[i], sums[i])
+                for stage, i in self.stages.items()}
+
+    def render(self, samples = ()):
+        """ Return the histograms and samples in the Prometheus text format.
+            samples are (name, type, help, values) tuples, values being a
+            list of (labels, value) where labels is a dict
+        """
+        lines = ["# HELP forhd_stage_seconds Time spent in each stage",
+                 "# TYPE forhd_stage_seconds histogram"]
+        for stage, (counts, total) in self.histograms().items():
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                lines.append('forhd_stage_seconds_bucket{stage="%s",le="%s"}'
+                             ' %d' % (stage, bound, count))
+            lines.append('forhd_stage_seconds_sum{stage="%s"} %r'
+                         % (stage, float(total)))
+            lines.append('forhd_stage_seconds_count{stage="%s"} %d'
+                         % (stage, counts[-1]))
+        for name, kind, description, values in samples:
+            lines.append("# HELP %s %s" % (name, description))
+            lines.append("# TYPE %s %s" % (name, kind))
+            for labels, value in values:
+                labelText = ",".join('%s="%s"' % item
+                                     for item in sorted(labels.items()))
+                lines.append("%s%s %s" % (name,
+                                          "{%s}" % labelText if labels else "",
+                                          value))
+        return "\n".join(lines) + "\n"
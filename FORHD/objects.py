@@ -2,15 +2,19 @@
 """ Representation of 2D objects, 3D objects and faces """
 
 class Object2D:
-    """ Representation of a 2D object on a photograph """
+    """ Representation of a 2D object on a photograph. The confidence and
+        the box are numbers, parsing them is up to the caller
+    """
+
+    __slots__ = ("label", "confidence", "x", "y", "w", "h")
 
     def __init__(self, label, confidence, x, y, w, h):
         self.label = label
-        self.confidence = float(confidence)
-        self.x = float(x)
-        self.y = float(y)
-        self.w = float(w)
-        self.h = float(h)
+        self.confidence = confidence
+        self.x = x
+        self.y = y
+        self.w = w
+        self.h = h
 
     def __str__(self):
         return "%s;%s;%s;%s;%s;%s" % (self.label,
@@ -23,6 +27,8 @@ class Object2D:
 class Object3D:
     """ Representation of a 3D object in world space """
 
+    __slots__ = ("label", "confidence", "x", "y", "z", "w", "h")
+
     def __init__(self, label, confidence, x, y, z, w, h):
         self.label = label
         self.confidence = confidence
@@ -42,14 +48,31 @@ class Object3D:
                                    self.z)
 
 class Face:
+    """ A face found on a photograph: the file it was cut out to, the ray
+        pointing at it and the name of the person
+    """
 
-    def __init__(self, filepath, raycast, name = "Unknown"):
+    __slots__ = ("filepath", "raycast", "name", "box")
+
+    def __init__(self, filepath, raycast, name = "Unknown", box = None):
         self.filepath = filepath
         self.raycast = raycast
         self.name = name
+        # (x, y, w, h) of the face on the photograph
+        self.box = box
 
     def __str__(self):
-        return "ray:%s|name:%s" % (raycast, name)
+        return "ray:%s|name:%s" % (self.raycast, self.name)
+
+    def toString(self, withFrameId = False):
+        """ Same as str, with the frame id appended to the ray if withFrameId
+            is True
+        """
+        return "ray:%s|name:%s" % (self.raycast.toString(withFrameId),
+                                   self.name)
 
     def __eq__(self, otherFace):
-        return self.raycast == otherFace.raycast
+        if not isinstance(otherFace, Face):
+            return NotImplemented
+        return self.name == otherFace.name and\
+               self.raycast == otherFace.raycast
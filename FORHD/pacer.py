@@ -0,0 +1,63 @@
+ #-*- coding: utf-8 -*-
+""" How fast a client should send its photos """
+
+from time import time
+
+from .const import PACINGINFLIGHT, PACINGMAXRATE, PACINGMAXDELAY,\
+                   PACINGSMOOTHING
+
+class Pacer:
+    """ The upload rate of a client. Photos sent faster than the pipeline
+        processes them are dropped after we paid for their upload, so we
+        aim at inFlight frames in flight: by Little's law the client should
+        send a photo every latency / inFlight seconds, latency being the
+        (smoothed) time its recent frames took to go through the pipeline.
+        Frames in flight beyond inFlight mean the pipeline is falling behind
+        and each of them delays the next upload by one more interval
+    """
+
+    def __init__(self, inFlight = PACINGINFLIGHT, maxRate = PACINGMAXRATE,
+                 maxDelay = PACINGMAXDELAY, smoothing = PACINGSMOOTHING):
+        self.inFlight = inFlight
+        self.minInterval = 1. / maxRate
+        self.maxDelay = maxDelay
+        self.smoothing = smoothing
+        # smoothed latency of the frames, None until one is done
+        self.latency = None
+        self.lastUpload = None
+
+    def uploaded(self, now = None):
+        """ Record that the client just sent a photo
+        """
+        self.lastUpload = time() if now is None else now
+
+    def observe(self, latency):
+        """ Record that a frame of the client took latency seconds
+        """
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += self.smoothing * (latency - self.latency)
+
+    def interval(self):
+        """ Return the target time (in seconds) between two uploads
+        """
+        if self.latency is None:
+            return self.minInterval
+        return min(max(self.latency / self.inFlight, self.minInterval),
+                   self.maxDelay)
+
+    def rate(self):
+        """ Return the target upload rate (in photos per second)
+        """
+        return 1. / self.interval()
+
+    def delay(self, inFlight, now = None):
+        """ Return how long (in seconds) the client should wait before sending
+            its next photo, given that it has inFlight frames in flight
+        """
+        now = time() if now is None else now
+        wait = self.interval() * (1 + max(inFlight - self.inFlight, 0))
+        if self.lastUpload is not None:
+            wait -= now - self.lastUpload
+        return min(max(wait, 0.), self.maxDelay)
@@ -0,0 +1,144 @@
+ #-*- coding: utf-8 -*-
+""" Compact binary encoding of the rays sent to the HoloLens """
+
+import struct
+
+import numpy as np
+
+from .const import BINARYRAYSMAGIC, BINARYRAYSVERSION
+
+# kinds of records
+OBJECTRAY = 0
+RECOGNIZEDFACE = 1
+UNKNOWNFACE = 2
+# an object of the world map, near and far are both its position
+OBJECTPOSITION = 3
+
+# header: magic, version, number of new labels, id of the first new label,
+# number of records
+HEADER = struct.Struct("<4sHHII")
+# each label is its length followed by its utf8 bytes
+LABELLENGTH = struct.Struct("<H")
+# one record per ray, ids are stored as uint32 so that they stay exact
+RAYRECORD = np.dtype([("kind", "<u4"),
+                      ("label", "<u4"),
+                      ("confidence", "<f4"),
+                      ("near", "<f4", (3,)),
+                      ("far", "<f4", (3,)),
+                      ("frame", "<u4")])
+
+class LabelTable:
+    """ Give a stable id to every label (objects labels and people names) we
+        send. Ids are given in order, so a client only needs the labels added
+        since the last time it received the table
+    """
+
+    def __init__(self):
+        self.labels = []
+        self.ids = {}
+
+    def getId(self, label):
+        """ Return the id of label, giving it a new one if needed
+        """
+        if label not in self.ids:
+            self.ids[label] = len(self.labels)
+            self.labels.append(label)
+        return self.ids[label]
+
+    def getIds(self, labels):
+        """ Return the ids of labels as an array of uint32, giving new ones
+            if needed
+        """
+        return np.fromiter((self.getId(label) for label in labels),
+                           dtype = np.uint32, count = len(labels))
+
+    def __len__(self):
+        return len(self.labels)
+
+def fillRecords(records, offset, labelTable, batch, kind, field = "label",
+                keep = None):
+    """ Copy the rays of batch (a RayBatch or a FaceBatch) selected by keep
+        (a boolean mask, all of them if None) to records from offset on, as
+        RAYRECORD of kind labelled by field, and return the offset after
+        them. The ids of the labels of the batch are turned into ids of
+        labelTable at once, only the labels used are added to it
+    """
+    batchRecords = batch.records if keep is None else batch.records[keep]
+    end = offset + len(batchRecords)
+    if end == offset:
+        return end
+    ids = batchRecords[field]
+    used = np.flatnonzero(np.bincount(ids, minlength = len(batch.labels)))
+    batchIds = np.zeros(len(batch.labels), dtype = np.uint32)
+    batchIds[used] = labelTable.getIds([batch.labels[i]
+                                        for i in used.tolist()])
+    records = records[offset:end]
+    records["kind"] = kind
+    records["label"] = batchIds[ids]
+    records["confidence"] = batchRecords["confidence"]
+    records["near"] = batchRecords["near"]
+    records["far"] = batchRecords["far"]
+    records["frame"] = batch.frameId or 0
+    return end
+
+def encodeRays(labelTable, labelsSent, rays, faces = (), objects = ()):
+    """ Return the binary encoding of the rays (RayBatch), the faces
+        (FaceBatch, the ones faceRecognizer recognized coming first) and the
+        objects (Object3D), along with the labels of labelTable that haven't
+        been sent yet (the first labelsSent ones have already been sent). The
+        records are copied straight from the arrays of the batches. The
+        message looks like:
+            HEADER
+            [LABELLENGTH label] for each new label
+            [RAYRECORD] for each ray
+    """
+    records = np.zeros(sum(len(batch) for batch in rays) +
+                       sum(len(batch) for batch in faces) + len(objects),
+                       dtype = RAYRECORD)
+    offset = 0
+    for batch in rays:
+        offset = fillRecords(records, offset, labelTable, batch, OBJECTRAY)
+    for kind, recognized in ((RECOGNIZEDFACE, True), (UNKNOWNFACE, False)):
+        for batch in faces:
+            offset = fillRecords(records, offset, labelTable, batch, kind,
+                                 "name",
+                                 batch.records["recognized"] == recognized)
+    # an object is encoded as a ray starting and ending at its position
+    if objects:
+        objectRecords = records[offset:]
+        objectRecords["kind"] = OBJECTPOSITION
+        objectRecords["label"] = labelTable.getIds([obj.label
+                                                    for obj in objects])
+        objectRecords["confidence"] = [obj.confidence for obj in objects]
+        objectRecords["near"] = [(obj.x, obj.y, obj.z) for obj in objects]
+        objectRecords["far"] = objectRecords["near"]
+
+    newLabels = labelTable.labels[labelsSent:]
+    msg = [HEADER.pack(BINARYRAYSMAGIC, BINARYRAYSVERSION, len(newLabels),
+                       labelsSent, len(records))]
+    for label in newLabels:
+        encodedLabel = label.encode("utf8")
+        msg.append(LABELLENGTH.pack(len(encodedLabel)))
+        msg.append(encodedLabel)
+    msg.append(records.tobytes())
+
+    return b"".join(msg)
+
+def decodeRays(msg):
+    """ Inverse of encodeRays, return the new labels (as a dict id: label)
+        and the records
+    """
+    magic, version, nlabels, firstLabel, nrecords = HEADER.unpack_from(msg)
+    if magic != BINARYRAYSMAGIC:
+        raise ValueError("Not a binary rays message")
+    offset = HEADER.size
+    labels = {}
+    for i in range(nlabels):
+        length, = LABELLENGTH.unpack_from(msg, offset)
+        offset += LABELLENGTH.size
+        labels[firstLabel + i] = msg[offset:offset+length].decode("utf8")
+        offset += length
+    records = np.frombuffer(msg, dtype = RAYRECORD, count = nrecords,
+                            offset = offset)
+
+    return labels, records
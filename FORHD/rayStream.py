@@ -0,0 +1,95 @@
+ #-*- coding: utf-8 -*-
+""" Push the results of each frame to the clients listening for them """
+
+from collections import deque
+from threading import Condition, Lock
+from time import time
+
+from .const import STREAMBUFFERSIZE, STREAMIDLETIMEOUT
+
+class StreamListener:
+    """ A client listening for results. Events are buffered until the client
+        takes them, the buffer is bounded: when it is full, the oldest event
+        is dropped
+    """
+
+    def __init__(self, maxsize = STREAMBUFFERSIZE):
+        self.events = deque(maxlen = maxsize)
+        self.condition = Condition()
+        self.dropped = 0
+        self.lastSeen = time()
+
+    def push(self, event):
+        """ Buffer event and wake the client up
+        """
+        with self.condition:
+            if len(self.events) == self.events.maxlen:
+                self.dropped += 1
+            self.events.append(event)
+            self.condition.notify_all()
+
+    def take(self, timeout):
+        """ Wait (at most timeout seconds) for events and return all the
+            buffered ones, or an empty list if none came
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.events, timeout)
+            events = list(self.events)
+            self.events.clear()
+            self.lastSeen = time()
+            return events
+
+class RayStream:
+    """ Fan the events out to every listener. Listeners are either streaming
+        ones, which stay subscribed as long as their connection is open, or
+        long-polling ones, which are identified by a key and stay subscribed
+        between two polls until they stay idle for STREAMIDLETIMEOUT seconds
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.listeners = set()
+        self.pollListeners = {}
+
+    def subscribe(self):
+        """ Return a new listener
+        """
+        listener = StreamListener()
+        with self.lock:
+            self.listeners.add(listener)
+        return listener
+
+    def unsubscribe(self, listener):
+        """ Stop sending events to listener
+        """
+        with self.lock:
+            self.listeners.discard(listener)
+
+    def pollListener(self, key):
+        """ Return the long-polling listener of key, subscribing a new one if
+            needed
+        """
+        with self.lock:
+            now = time()
+            for otherKey, listener in list(self.pollListeners.items()):
+                if now - listener.lastSeen > STREAMIDLETIMEOUT:
+                    del self.pollListeners[otherKey]
+                    self.listeners.discard(listener)
+            if key not in self.pollListeners:
+                listener = StreamListener()
+                self.pollListeners[key] = listener
+                self.listeners.add(listener)
+            return self.pollListeners[key]
+
+    def publish(self, event):
+        """ Send event to every listener
+        """
+        with self.lock:
+            listeners = list(self.listeners)
+        for listener in listeners:
+            listener.push(event)
+
+    def hasListeners(self):
+        """ Return True if at least one client is listening
+        """
+        return bool(self.listeners)
@@ -3,20 +3,44 @@
 import numpy as np
 from .utils import str3DPoint
 
+class CameraMats():
+    """ The parameters of the camera at the time a photo was taken. Everything
+        that only depends on the camera is computed once here so that it can
+        be shared by all the raycasts of a frame. camsize is the resolution
+        of the camera, None if the client didn't tell us
+    """
+
+    def __init__(self, projection, world, camsize = None):
+        self.projection = projection
+        self.world = world
+        self.camsize = camsize
+        # (0, 0, 0) are the coordinates of the camera in its own space, its
+        # position in world space is thus the last column of world
+        self.wpointCamera = world.dot(np.array([0., 0., 0., 1.]))
+
 class Raycast():
-    """ A representation of a raycast """
+    """ A representation of a raycast. The points may be views on a bigger
+        array (the rays of a frame share the position of the camera and the
+        rows of a single array, see fromObjects2D and RayBatch)
+    """
 
-    def __init__(self, label, confidence, wpointCenterNear, wpointCenterFar):
+    __slots__ = ("label", "confidence", "wpointCenterNear", "wpointCenterFar",
+                 "frameId")
+
+    def __init__(self, label, confidence, wpointCenterNear, wpointCenterFar,
+                 frameId = None):
         self.label = label
         self.confidence = confidence
         self.wpointCenterNear = wpointCenterNear
         self.wpointCenterFar = wpointCenterFar
+        # id of the frame the raycast was computed from
+        self.frameId = frameId
 
     @staticmethod
     def parseMats(matsString):
         """ Parse a string that looks like
             "Projection:[ProjectionMat];World:[WorldMat]" and return them as
-            numpy 2D arrays
+            4x4 numpy 2D arrays. Raise ValueError if it doesn't look like that
         """
         def parseMatrix4x4(matString):
             """ Parse a matrix that looks like
@@ -37,9 +61,15 @@ class Raycast():
             return np.array(res)
 
         parseMatsString = matsString.split(";")
+        if len(parseMatsString) < 2 or\
+           any(":" not in s for s in parseMatsString[:2]):
+            raise ValueError("Malformed matrices")
 
         projection = parseMatrix4x4(parseMatsString[0].split(':')[1])
         world = parseMatrix4x4(parseMatsString[1].split(':')[1])
+        if projection.shape != (4, 4) or world.shape != (4, 4):
+            raise ValueError("Matrices of shapes %s and %s instead of 4x4" %
+                             (projection.shape, world.shape))
 
         return projection, world
 
@@ -61,6 +91,63 @@ class Raycast():
 
         return _from
 
+    @staticmethod
+    def unProjectVectors(projection, vectors):
+        """ Inputs:
+                - projection is a 4x4 numpy 2D array
+                - vectors is a Nx3 numpy array
+            Same as unProjectVector but for N vectors at once. Return a Nx3
+            numpy array
+        """
+        axsX = projection[0]
+        axsY = projection[1]
+        axsZ = projection[2]
+        _from = np.empty((len(vectors), 3))
+        _from[:, 2] = vectors[:, 2] / axsZ[2]
+        _from[:, 1] = (vectors[:, 1] - (_from[:, 2] * axsY[2])) / axsY[1]
+        _from[:, 0] = (vectors[:, 0] - (_from[:, 2] * axsX[2])) / axsX[0]
+
+        return _from
+
+    @staticmethod
+    def fromBoxes(boxes, mats, camsize):
+        """ boxes is a Nx4 numpy array where each line is the x, y, w, h of an
+            object on the image (x, y being the center of the bounding rect).
+            mats is the CameraMats of the frame and camsize the resolution of
+            the image.
+            Return the world space position of the camera and a Nx4 numpy
+            array containing, for each box, a point of the ray going from the
+            camera to the object
+        """
+        # same computation as in fromObject2D, but for all the boxes at once:
+        # relative coordinates, then coordinates between -1 and 1
+        imagePosProjected = np.empty((len(boxes), 3))
+        imagePosProjected[:, 0] = (boxes[:, 0] / camsize[0]) * 2 - 1
+        imagePosProjected[:, 1] = (1. - (boxes[:, 1] / camsize[1])) * 2 - 1
+        imagePosProjected[:, 2] = 1.
+
+        cameraSpacePos = np.ones((len(boxes), 4))
+        cameraSpacePos[:, :3] = Raycast.unProjectVectors(mats.projection,
+                                                         imagePosProjected)
+        wpoints = cameraSpacePos.dot(mats.world.T)
+
+        return mats.wpointCamera, wpoints
+
+    @staticmethod
+    def fromObjects2D(objects2D, mats, camsize, frameId = None):
+        """ Return the list of the raycasts pointing toward the objects of
+            objects2D, which all come from the frame frameId. This is
+            equivalent to calling fromObject2D on each object but costs a
+            single numpy pass
+        """
+        if not objects2D:
+            return []
+        boxes = np.array([[o.x, o.y, o.w, o.h] for o in objects2D])
+        wpointCamera, wpoints = Raycast.fromBoxes(boxes, mats, camsize)
+
+        return [Raycast(o.label, o.confidence, wpointCamera, wpoint, frameId)
+                for o, wpoint in zip(objects2D, wpoints)]
+
     @staticmethod
     def fromObject2D(object2D, projection, world, camsize):
         """ Return a raycast which pointing toward the location of object2D
@@ -111,6 +198,27 @@ class Raycast():
                                    str3DPoint(self.wpointCenterNear),
                                    str3DPoint(self.wpointCenterFar))
 
+    def toString(self, withFrameId = False):
+        """ Same as str, with the frame id appended if withFrameId is True
+        """
+        if withFrameId:
+            return "%s;%s" % (str(self), self.frameId)
+        return str(self)
+
     def __eq__(self, otherRaycast):
-        return self.wpointcamera == otherRaycast.wpointCenterNear\
-           and self.wpointCenter == otherRaycast.wpointCenterFar
+        """ Two raycasts are equal if they have the same label, confidence and
+            frame and go through the same points (only x, y, z are compared,
+            points may be homogeneous or not)
+        """
+        if not isinstance(otherRaycast, Raycast):
+            return NotImplemented
+        def samePoint(point, otherPoint):
+            return np.array_equal(np.asarray(point)[:3],
+                                  np.asarray(otherPoint)[:3])
+
+        return self.label == otherRaycast.label and\
+               self.confidence == otherRaycast.confidence and\
+               self.frameId == otherRaycast.frameId and\
+               samePoint(self.wpointCenterNear,
+                         otherRaycast.wpointCenterNear) and\
+               samePoint(self.wpointCenterFar, otherRaycast.wpointCenterFar)
@@ -0,0 +1,109 @@
+ #-*- coding: utf-8 -*-
+""" The results of a frame, packed to go from a handler process to the HTTP
+    server in a single message """
+
+import numpy as np
+
+from .raycast import Raycast
+from .objects import Face
+from .rayEncoding import LabelTable
+
+# one record per ray, label being the index of its label in the labels of
+# the batch
+RAYBATCHRECORD = np.dtype([("label", "<u4"),
+                           ("confidence", "<f8"),
+                           ("near", "<f8", (3,)),
+                           ("far", "<f8", (3,))])
+# faces also keep their name (an index in the labels too), their box and
+# whether faceRecognizer knew the person
+FACEBATCHRECORD = np.dtype(RAYBATCHRECORD.descr +
+                           [("name", "<u4"),
+                            ("box", "<i4", (4,)),
+                            ("recognized", "?")])
+
+class RayBatch:
+    """ The raycasts of the frame frameId as one contiguous structured array
+        (RAYBATCHRECORD) along with the labels they use. Pickling it costs
+        the same whatever the number of rays, unlike pickling each Raycast
+        and its numpy arrays
+    """
+
+    dtype = RAYBATCHRECORD
+
+    def __init__(self, frameId, labels, records):
+        self.frameId = frameId
+        self.labels = labels
+        self.records = records
+
+    @classmethod
+    def fromRaycasts(cls, frameId, raycasts):
+        """ Return the batch of the raycasts of the frame frameId
+        """
+        labelTable = LabelTable()
+        records = np.zeros(len(raycasts), dtype = cls.dtype)
+        if raycasts:
+            records["label"] = labelTable.getIds([r.label for r in raycasts])
+            records["confidence"] = [r.confidence for r in raycasts]
+            records["near"] = [r.wpointCenterNear[:3] for r in raycasts]
+            records["far"] = [r.wpointCenterFar[:3] for r in raycasts]
+        return cls(frameId, labelTable.labels, records)
+
+    def select(self, keep):
+        """ Return the batch of the rays of this one selected by keep (a
+            boolean mask or indices), sharing its labels
+        """
+        return type(self)(self.frameId, self.labels, self.records[keep])
+
+    def raycasts(self):
+        """ Return the raycasts of the batch, their points are views on the
+            records
+        """
+        labels = [self.labels[i] for i in self.records["label"].tolist()]
+        return [Raycast(label, confidence, near, far, self.frameId)
+                for label, confidence, near, far
+                in zip(labels, self.records["confidence"].tolist(),
+                       self.records["near"], self.records["far"])]
+
+    def __len__(self):
+        return len(self.records)
+
+class FaceBatch(RayBatch):
+    """ The faces of the frame frameId, recognized or not, packed like the
+        rays of a RayBatch (FACEBATCHRECORD)
+    """
+
+    dtype = FACEBATCHRECORD
+
+    @classmethod
+    def fromFaces(cls, frameId, faces, recognized):
+        """ Return the batch of the faces of the frame frameId, recognized
+            telling for each face whether faceRecognizer knew the person
+        """
+        batch = cls.fromRaycasts(frameId, [face.raycast for face in faces])
+        if faces:
+            labelTable = LabelTable()
+            labelTable.getIds(batch.labels)
+            batch.records["name"] = labelTable.getIds([face.name
+                                                       for face in faces])
+            batch.records["box"] = [face.box or (0, 0, 0, 0)
+                                    for face in faces]
+            batch.records["recognized"] = recognized
+            batch.labels = labelTable.labels
+        return batch
+
+    def faces(self):
+        """ Return the recognized faces and the unknown faces of the batch
+            (their files are gone, so they don't have any filepath)
+        """
+        recognizedFaces = []
+        unknownFaces = []
+        for raycast, name, box, recognized in zip(
+                self.raycasts(), self.records["name"].tolist(),
+                self.records["box"].tolist(),
+                self.records["recognized"].tolist()):
+            face = Face(None, raycast, self.labels[name], tuple(box))
+            if recognized:
+                recognizedFaces.append(face)
+            else:
+                unknownFaces.append(face)
+        return recognizedFaces, unknownFaces
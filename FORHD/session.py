@@ -0,0 +1,195 @@
+ #-*- coding: utf-8 -*-
+""" What the server keeps for each client """
+
+from collections import OrderedDict
+from itertools import count
+from time import time
+
+from .frameWindow import FrameWindow
+from .worldMap import WorldMap
+from .knownObjects import KnownObjects
+from .rayStream import RayStream
+from .pacer import Pacer
+from .utils import warninglog
+from .const import MAXSESSIONS, SESSIONTTL, FRAMESTORESLOTS
+
+class Session:
+    """ The state of one client: its settings, the resolution of its camera,
+        its frames in flight, the results it hasn't received yet, the rate it
+        should send its photos at and everything built from its previous
+        frames. index is the number of
+        its ring in the frameStore and of its queue in the dispatchers.
+        The frames are stored with the generation of the session, which
+        changes whenever the client starts over, and is never the same for two
+        sessions: the handlers keep what they know about a ring (see
+        SessionStates) only as long as its frames have the same generation
+    """
+
+    # the generations given so far, shared by all the sessions
+    generations = count(1)
+
+    def __init__(self, key, index, props):
+        self.key = key
+        self.index = index
+        self.generation = next(Session.generations)
+        self.props = dict(props)
+        # (width, height) of the camera, None until the client sends it
+        self.camsize = None
+        self.frameWindow = FrameWindow()
+        # the results waiting to be sent: a RayBatch and a FaceBatch per
+        # frame, and the objects of the world map
+        self.pendingRays = []
+        self.pendingFaces = []
+        self.pendingObjects = []
+        self.worldMap = WorldMap()
+        # the objects the client told us it already holds
+        self.knownObjects = KnownObjects()
+        # number of labels of the label table the client already knows
+        self.labelsSent = 0
+        self.rayStream = RayStream()
+        self.pacer = Pacer()
+        self.lastSeen = time()
+
+    def reset(self):
+        """ The client starts over: it will need the whole label table again,
+            it doesn't hold any object yet, the results of its previous frames
+            won't be sent and the handlers must forget what they know about
+            them
+        """
+        self.generation = next(Session.generations)
+        self.labelsSent = 0
+        self.knownObjects = KnownObjects()
+        self.worldMap = WorldMap()
+        self.takeResults()
+        self.frameWindow.clear()
+
+    def takeResults(self):
+        """ Return and forget the ray batches, face batches and objects
+            waiting to be sent
+        """
+        results = (self.pendingRays, self.pendingFaces, self.pendingObjects)
+        self.pendingRays = []
+        self.pendingFaces = []
+        self.pendingObjects = []
+        return results
+
+class Sessions:
+    """ The sessions of the clients, by key. There are at most size of them:
+        a new client gets the index of a session that stayed silent for more
+        than ttl seconds, or else of the least recently seen one.
+        We also remember which session each recent frame belongs to, so the
+        results can be sent to the right client
+    """
+
+    def __init__(self, size = MAXSESSIONS, ttl = SESSIONTTL):
+        self.size = size
+        self.ttl = ttl
+        # sessions from the least to the most recently seen
+        self.sessions = OrderedDict()
+        self.free = list(range(size))
+        # frame id to session, for the last frames received
+        self.frames = OrderedDict()
+        # frame window counters of the sessions that are over
+        self.dropped = 0
+        self.expired = 0
+
+    def get(self, key, props):
+        """ Return the session of key, opening it (with a copy of props as
+            its settings) if needed
+        """
+        session = self.sessions.get(key)
+        if session is None:
+            session = self.open(key, props)
+        session.lastSeen = time()
+        self.sessions.move_to_end(key)
+        return session
+
+    def open(self, key, props):
+        """ Start a new session for key
+        """
+        now = time()
+        for session in list(self.sessions.values()):
+            if now - session.lastSeen > self.ttl:
+                self.close(session)
+        if not self.free:
+            oldest = next(iter(self.sessions.values()))
+            warninglog("Too many clients, closing the session of %s" %
+                       oldest.key)
+            self.close(oldest)
+        session = Session(key, self.free.pop(0), props)
+        self.sessions[key] = session
+        return session
+
+    def close(self, session):
+        """ End session, its frames still in flight are forgotten
+        """
+        del self.sessions[session.key]
+        self.free.append(session.index)
+        self.dropped += session.frameWindow.dropped
+        self.expired += session.frameWindow.expired
+        self.forgetFrames(session)
+
+    def reset(self, session):
+        """ Start session over (see Session.reset), the results of its frames
+            still in flight are ignored
+        """
+        session.reset()
+        self.forgetFrames(session)
+
+    def forgetFrames(self, session):
+        """ Forget which frames belong to session
+        """
+        for frameId in [frameId for frameId, other in self.frames.items()
+                        if other is session]:
+            del self.frames[frameId]
+
+    def addFrame(self, frameId, session):
+        """ Remember that the frame frameId belongs to session
+        """
+        self.frames[frameId] = session
+        # results can't come for frames whose slot has been reused
+        while len(self.frames) > self.size * FRAMESTORESLOTS:
+            self.frames.popitem(last = False)
+
+    def sessionOf(self, frameId):
+        """ Return the session the frame frameId belongs to, None if we don't
+            know it anymore
+        """
+        return self.frames.get(frameId)
+
+    def counters(self):
+        """ Return the number of frames dropped and expired by the frame
+            windows of all the sessions so far
+        """
+        return (self.dropped + sum(session.frameWindow.dropped
+                                   for session in self),
+                self.expired + sum(session.frameWindow.expired
+                                   for session in self))
+
+    def __iter__(self):
+        return iter(list(self.sessions.values()))
+
+    def __len__(self):
+        return len(self.sessions)
+
+class SessionStates:
+    """ What a handler process keeps about each session (such as the faces it
+        tracks), by frameStore ring. A ring is given to another client once
+        its session is over, and a client may start over: the state of a
+        ring is made anew (by calling make) whenever a frame of another
+        generation (see Session) comes, so it is never inherited
+    """
+
+    def __init__(self, make):
+        self.make = make
+        # ring to the generation of the state and the state
+        self.states = {}
+
+    def get(self, ring, generation):
+        """ Return the state of ring for the frames of generation
+        """
+        current = self.states.get(ring)
+        if current is None or current[0] != generation:
+            current = (generation, self.make())
+            self.states[ring] = current
+        return current[1]
@@ -0,0 +1,66 @@
+ #-*- coding: utf-8 -*-
+""" Small records shared between processes, read without any lock """
+
+from multiprocessing import RawArray
+
+import numpy as np
+
+from .const import MAXSESSIONS
+
+# the camera resolution, as (width, height)
+CAMSIZE = np.dtype([("size", "<f8", (2,))])
+# the frame waiting to be taken from a FrameDispatcher for each session (a
+# sequence number of 0 means there is none), the session served next and the
+# number of frames published and dropped
+FRAMEDESCRIPTOR = np.dtype([("slot", "<i8", (MAXSESSIONS,)),
+                            ("seq", "<i8", (MAXSESSIONS,)),
+                            ("next", "<i8"),
+                            ("published", "<i8"),
+                            ("dropped", "<i8")])
+
+class SharedState:
+    """ A fixed-size record (of dtype) in shared memory, guarded by a seqlock:
+        the writer makes the sequence counter odd while it writes the record
+        and even again once it is done, so a reader knows it read a
+        consistent record if the counter was even and didn't change while it
+        was reading. Reads never block the writer and never go through
+        another process, they are plain memory reads.
+        There must be only one writer at a time, the callers writing from
+        several processes or threads have to serialize their writes
+    """
+
+    def __init__(self, dtype, **fields):
+        self.dtype = np.dtype(dtype)
+        # the counter comes first, it is 8 bytes long so the record stays
+        # aligned
+        self.buffer = RawArray('b', 8 + self.dtype.itemsize)
+        self.counter = np.frombuffer(self.buffer, dtype = "<u8", count = 1)
+        self.record = np.frombuffer(self.buffer, dtype = self.dtype, count = 1,
+                                    offset = 8)
+        if fields:
+            self.write(**fields)
+
+    def write(self, **fields):
+        """ Set the given fields of the record
+        """
+        self.counter[0] += 1
+        for name, value in fields.items():
+            self.record[name][0] = value
+        self.counter[0] += 1
+
+    def read(self):
+        """ Return a consistent copy of the record
+        """
+        while True:
+            before = self.counter[0]
+            if before & 1:
+                continue
+            record = self.record.copy()[0]
+            if self.counter[0] == before:
+                return record
+
+    def version(self):
+        """ Return the number of writes so far, a reader can use it to tell
+            whether the record changed since its last read
+        """
+        return int(self.counter[0]) // 2
@@ -0,0 +1,279 @@
+ #-*- coding: utf-8 -*-
+""" Merge the rays of successive frames into the objects of the room """
+
+from collections import OrderedDict, defaultdict
+
+import numpy as np
+
+from .objects import Object3D
+from .const import WORLDMAPCELLSIZE, WORLDMAPRADIUS, WORLDMAPMAXDISTANCE,\
+                   WORLDMAPMINSPREAD, WORLDMAPUPDATEDISTANCE, WORLDMAPTTL,\
+                   WORLDMAPMAXOBJECTS
+
+# offsets of a cell and its 26 neighbours
+NEIGHBOURS = np.array([(i, j, k) for i in (-1, 0, 1)
+                                 for j in (-1, 0, 1)
+                                 for k in (-1, 0, 1)])
+
+class WorldObject:
+    """ An object of the world map and the rays that point at it. Its position
+        is the point closest to all these rays (least squares), which is
+        only known once they come from different enough viewpoints
+    """
+
+    def __init__(self, objectId, label, frameId):
+        self.objectId = objectId
+        self.label = label
+        # sum over the rays of the projectors orthogonal to their direction,
+        # and of these projectors applied to their origin: the position x
+        # solves A x = b
+        self.A = np.zeros((3, 3))
+        self.b = np.zeros(3)
+        self.nrays = 0
+        self.confidence = 0.
+        # the last ray that pointed at the object
+        self.origin = None
+        self.direction = None
+        self.position = None
+        # the last position sent to the clients
+        self.sentPosition = None
+        self.lastSeen = frameId
+        self.cells = set()
+
+    def addRay(self, origin, direction, confidence, frameId):
+        """ Take the ray going from origin along direction (a unit vector)
+            into account
+        """
+        projector = np.eye(3) - np.outer(direction, direction)
+        self.A += projector
+        self.b += projector.dot(origin)
+        self.confidence += (confidence - self.confidence) / (self.nrays + 1)
+        self.nrays += 1
+        self.origin = origin
+        self.direction = direction
+        self.lastSeen = max(self.lastSeen, frameId)
+
+    def toObject3D(self):
+        """ Return the Object3D standing for this object
+        """
+        return Object3D(self.label, self.confidence, self.position[0],
+                        self.position[1], self.position[2], 0, 0)
+
+class WorldMap:
+    """ Associate the rays of each frame with the objects seen in the previous
+        frames. Objects are found through a spatial hash of cellSize wide
+        cells: an object whose position is known is in the cells around it,
+        an object seen from a single viewpoint so far is in all the cells its
+        last ray goes through (up to maxDistance) and their neighbours. A ray
+        belongs to an object of the same label if it passes within radius of
+        its position, or of its last ray when its position isn't known yet.
+        The position of the objects whose rays are spread enough (minSpread
+        is the smallest eigenvalue of their mean projector, about the square
+        of the sine of the angle between the rays) is solved at once for all
+        the objects a frame touched. An object is sent again only when its
+        position moved by more than updateDistance.
+        Objects without a position that are not seen for ttl frames are
+        forgotten, as well as the least recently seen objects when there
+        are more than maxObjects of them
+    """
+
+    def __init__(self, cellSize = WORLDMAPCELLSIZE, radius = WORLDMAPRADIUS,
+                 maxDistance = WORLDMAPMAXDISTANCE,
+                 minSpread = WORLDMAPMINSPREAD,
+                 updateDistance = WORLDMAPUPDATEDISTANCE, ttl = WORLDMAPTTL,
+                 maxObjects = WORLDMAPMAXOBJECTS):
+        self.cellSize = cellSize
+        self.radius = radius
+        self.maxDistance = maxDistance
+        self.minSpread = minSpread
+        self.updateDistance = updateDistance
+        self.ttl = ttl
+        self.maxObjects = maxObjects
+        # (label, i, j, k) to the ids of the objects in that cell
+        self.grid = defaultdict(set)
+        # objects ordered from the least to the most recently seen
+        self.objects = OrderedDict()
+        self.nextId = 0
+        # distances along a ray where we look for its cells
+        self.steps = np.arange(0., maxDistance + cellSize, cellSize / 2.)
+
+    @staticmethod
+    def rayArrays(rays):
+        """ Return the origins and the unit directions of rays as two Nx3
+            arrays
+        """
+        origins = np.array([ray.wpointCenterNear[:3] for ray in rays],
+                           dtype = float).reshape(-1, 3)
+        directions = np.array([ray.wpointCenterFar[:3] for ray in rays],
+                              dtype = float).reshape(-1, 3) - origins
+        norms = np.linalg.norm(directions, axis = 1)
+        directions /= np.where(norms > 0, norms, 1.)[:, None]
+        return origins, directions
+
+    def cellsAlong(self, origin, direction, dilate = False):
+        """ Return the indices of the cells the ray goes through, along with
+            their neighbours if dilate is True
+        """
+        points = origin + self.steps[:, None] * direction
+        cells = np.floor(points / self.cellSize).astype(int)
+        if dilate:
+            cells = (cells[:, None, :] + NEIGHBOURS).reshape(-1, 3)
+        return set(map(tuple, np.unique(cells, axis = 0)))
+
+    def cellsAround(self, position):
+        """ Return the indices of the cells a ray passing within radius of
+            position may be looked for in
+        """
+        # the points we look the rays up at are up to a quarter of a cell
+        # away from the point closest to position
+        reach = self.radius + self.cellSize / 4.
+        low = np.floor((position - reach) / self.cellSize).astype(int)
+        high = np.floor((position + reach) / self.cellSize).astype(int)
+        return set((i, j, k) for i in range(low[0], high[0] + 1)
+                             for j in range(low[1], high[1] + 1)
+                             for k in range(low[2], high[2] + 1))
+
+    def unindex(self, obj):
+        """ Remove obj from its cells
+        """
+        for cell in obj.cells:
+            key = (obj.label,) + cell
+            self.grid[key].discard(obj.objectId)
+            if not self.grid[key]:
+                del self.grid[key]
+        obj.cells = set()
+
+    def index(self, obj):
+        """ Put obj in the cells it belongs to
+        """
+        self.unindex(obj)
+        if obj.position is not None:
+            obj.cells = self.cellsAround(obj.position)
+        else:
+            obj.cells = self.cellsAlong(obj.origin, obj.direction,
+                                        dilate = True)
+        for cell in obj.cells:
+            self.grid[(obj.label,) + cell].add(obj.objectId)
+
+    def forget(self, obj):
+        """ Remove obj from the map
+        """
+        self.unindex(obj)
+        del self.objects[obj.objectId]
+
+    def distances(self, candidates, origin, direction):
+        """ Return the distance between the ray and each of candidates: to
+            their position if it is known, else to their last ray
+        """
+        distances = np.empty(len(candidates))
+        located = np.array([obj.position is not None for obj in candidates])
+        if located.any():
+            positions = np.array([obj.position for obj, isLocated
+                                  in zip(candidates, located) if isLocated])
+            offsets = positions - origin
+            along = np.clip(offsets.dot(direction), 0., None)
+            distances[located] = np.linalg.norm(
+                offsets - along[:, None] * direction, axis = 1)
+        if not located.all():
+            # closest points of the two rays, clamped to their segments
+            others = [obj for obj, isLocated in zip(candidates, located)
+                      if not isLocated]
+            origins = np.array([obj.origin for obj in others])
+            directions = np.array([obj.direction for obj in others])
+            w = origin - origins
+            b = directions.dot(direction)
+            d = w.dot(direction)
+            e = (directions * w).sum(axis = 1)
+            denominator = 1. - b**2
+            parallel = denominator < 1e-9
+            s = np.where(parallel, 0.,
+                         (b*e - d) / np.where(parallel, 1., denominator))
+            s = np.clip(s, 0., self.maxDistance)
+            t = np.clip(e + b*s, 0., self.maxDistance)
+            closest = origin + s[:, None] * direction
+            otherClosest = origins + t[:, None] * directions
+            distances[~located] = np.linalg.norm(closest - otherClosest,
+                                                 axis = 1)
+        return distances
+
+    def match(self, label, origin, direction, taken):
+        """ Return the object of label closest to the ray, if there is one
+            within radius that is not in taken
+        """
+        ids = set()
+        for cell in self.cellsAlong(origin, direction):
+            ids |= self.grid.get((label,) + cell, set())
+        candidates = [self.objects[objectId] for objectId in ids - taken]
+        if not candidates:
+            return None
+        distances = self.distances(candidates, origin, direction)
+        best = distances.argmin()
+        if distances[best] > self.radius:
+            return None
+        return candidates[best]
+
+    def locate(self, objs):
+        """ Solve the position of all of objs at once, for the ones whose rays
+            are spread enough
+        """
+        A = np.array([obj.A / obj.nrays for obj in objs])
+        b = np.array([obj.b / obj.nrays for obj in objs])
+        spread = np.linalg.eigvalsh(A)[:, 0] >= self.minSpread
+        if not spread.any():
+            return
+        positions = np.linalg.solve(A[spread], b[spread][:, :, None])[:, :, 0]
+        for obj, position in zip([obj for obj, isSpread in zip(objs, spread)
+                                  if isSpread], positions):
+            obj.position = position
+
+    def expire(self, frameId):
+        """ Forget the objects without a position not seen for ttl frames,
+            and the least recently seen ones if there are too many
+        """
+        for obj in list(self.objects.values()):
+            if obj.position is None and frameId - obj.lastSeen > self.ttl:
+                self.forget(obj)
+        while len(self.objects) > self.maxObjects:
+            self.forget(next(iter(self.objects.values())))
+
+    def update(self, rays, frameId):
+        """ Add the rays of the frame frameId to the map. Return the rays that
+            don't belong to any known object (they are the first ones seen of
+            their object) and the Object3D of the objects whose position is
+            new or moved
+        """
+        if not rays:
+            return [], []
+        origins, directions = self.rayArrays(rays)
+        newRays = []
+        touched = OrderedDict()
+        for ray, origin, direction in zip(rays, origins, directions):
+            # two rays of a frame never point at the same object
+            obj = self.match(ray.label, origin, direction, set(touched))
+            if obj is None:
+                obj = WorldObject(self.nextId, ray.label, frameId)
+                self.objects[obj.objectId] = obj
+                self.nextId += 1
+                newRays.append(ray)
+            obj.addRay(origin, direction, ray.confidence, frameId)
+            self.objects.move_to_end(obj.objectId)
+            touched[obj.objectId] = obj
+
+        objs = list(touched.values())
+        self.locate(objs)
+        updates = []
+        for obj in objs:
+            self.index(obj)
+            if obj.position is None:
+                continue
+            if obj.sentPosition is None or\
+               np.linalg.norm(obj.position - obj.sentPosition) >\
+               self.updateDistance:
+                obj.sentPosition = obj.position
+                updates.append(obj.toObject3D())
+        self.expire(frameId)
+
+        return newRays, updates
+
+    def __len__(self):
+        return len(self.objects)
@@ -1,152 +1,221 @@
  #-*- coding: utf-8 -*-
 
-import os, os.path, sys
-from time import sleep
-
-from multiprocessing import Queue, Process, Value, Manager, Array
-from ctypes import c_char_p
-from subprocess import Popen, PIPE, DEVNULL, STDOUT
+from collections import deque
+from multiprocessing import Process, Value, Pipe, Lock
+from queue import Empty
+from threading import Lock as ThreadLock
+from time import time
 
 from blinker import signal
 
-from .objects import Object2D
 from .raycast import Raycast
+from .resultBatch import RayBatch
+from .frameDispatcher import FrameDispatcher
+from .detectorBackend import makeBackend
+from .sharedState import SharedState, CAMSIZE
+from .metrics import Metrics, DETECTSTAGE, RAYCASTSTAGE
 from .utils import infolog, warninglog
-from .const import DARKNETBASEPATH, DARKNETPATH, DARKNETMAKECOMMAND, DATAPATH,\
-                   CFGPATH, WEIGHTPATH, PROGRAM, MODE, FEEDPIPE, DETECTIONSPIPE,\
+from .const import DETECTORBACKEND, DETECTORINSTANCES, DETECTORFRAMETIMEOUT,\
                    PHOTORECEIVEDSIGNAL
 
 class YoloHandler():
-    """ The class used to communicate with YOLO """
-
-    def __init__(self, verbose = True):
+    """ The class used to communicate with YOLO, through one of the backends
+        of detectorBackend. Several instances of the backend run side by
+        side, each new frame goes to the first instance that is idle.
+        A frame not done frameTimeout seconds after it was taken is given
+        back without any ray, its detector being crashed or stuck
+    """
+
+    def __init__(self, frameStore, backend = DETECTORBACKEND,
+                 instances = DETECTORINSTANCES, metrics = None, verbose = True,
+                 frameTimeout = DETECTORFRAMETIMEOUT):
         self.verbose = verbose
+        self.frameStore = frameStore
+        self.frameTimeout = frameTimeout
+        # where the detector processes record how long their stages take
+        self.metrics = Metrics() if metrics is None else metrics
 
         # running is a synchronized int that we use to run and stop the
         # processes we spawn
-        infolog("Initializing yoloHandler")
+        infolog("Initializing yoloHandler with %d instances of the %s backend"
+                % (instances, backend))
         self.running = Value('i', 1)
 
-        # open YOLO in a new thread, after it is opened we can send it filepaths
-        # by writing to yolo.stdin
-        infolog("Launching YOLO")
-
-        if not os.path.isfile(DARKNETBASEPATH+DARKNETPATH):
-            warninglog("Couldn't find %s%s, running %s%s" %\
-                        (DARKNETBASEPATH,
-                         DARKNETPATH,
-                         DARKNETBASEPATH,
-                         DARKNETMAKECOMMAND))
-            Popen(DARKNETMAKECOMMAND.split(), cwd = DARKNETBASEPATH)
-
-        self.yolo = Popen([DARKNETPATH, PROGRAM, MODE, DATAPATH, CFGPATH,
-                           WEIGHTPATH], stdin = PIPE, bufsize = 1,
-                           stdout = DEVNULL, stderr = STDOUT,
-                           universal_newlines = True, cwd = DARKNETBASEPATH)
-
-        # manager that will enable us to share state between processes
-        self.manager = Manager()
-        # synchronized string that stores the path to the last photo taken
-        self.nextPhoto = self.manager.Value(c_char_p, "")
-        # synchronized string that stores the path to the last matrices received
-        self.nextMats = self.manager.Value(c_char_p, "")
-
-        # synchronized queue where we store the rays we compute
-        self.raycastQueue = Queue()
-        # synchronized float array used to store the camera resolution
-        self.camsize = Array('f', (896., 504.))
-
-        # we spawn a process that will feed yolo whenever it needs to (which is
-        # at every new picture received if yolo is finished with the previous
-        # one)
-        infolog("Start feeding YOLO")
-        self.yoloFeeder = Process(target = self.writeToYolo)
-        self.yoloFeeder.start()
-
-        # we spawn a process that will constantly retrieve data from yolo, parse
-        # it, convert the 2D points data to raycasts and store them in the queue
-        infolog("Start listening to YOLO")
-        self.yoloListener = Process(target = self.retrievefromYolo)
-        self.yoloListener.start()
+        self.backends = [makeBackend(backend, i) for i in range(instances)]
+
+        # dispatcher handing the last frame received to the first idle
+        # detector process
+        self.dispatcher = FrameDispatcher()
+
+        # the detector processes send on this pipe the id of each frame they
+        # take as (frameId, None), in the order they take them, then the id
+        # and the RayBatch of each frame they processed. Unlike a Queue, a
+        # pipe is written synchronously so the ids stay in order
+        self.reader, self.writer = Pipe(duplex = False)
+        self.writeLock = Lock()
+        # the ids of the frames taken and not given back yet, in order, along
+        # with the time they must be done by, and the batches of the ones
+        # processed (only used by the main process)
+        self.inFlight = deque()
+        self.done = {}
+        # the ids of the frames given back empty because they took too long,
+        # whose batches are ignored if they come after all
+        self.abandoned = set()
+        self.orderLock = ThreadLock()
+        # camera resolution of the frames whose session didn't send its own,
+        # read without any lock by the detector processes
+        self.camsize = SharedState(CAMSIZE, size = (896., 504.))
+
+        # we spawn a process per instance that will give each new frame to its
+        # backend whenever it is done with the previous one, convert the 2D
+        # objects it finds to raycasts and send them back
+        infolog("Start detecting objects")
+        self.detectors = [Process(target = self.detectObjects,
+                                  args = (backend,))
+                          for backend in self.backends]
+        for detector in self.detectors:
+            detector.start()
 
         # we connect to the photoreceived signal
         self.PhotoReceivedEvent = signal(PHOTORECEIVEDSIGNAL)
         self.PhotoReceivedEvent.connect(self.write)
 
     def write(self, sender, **kw):
-        """ Give yoloHandler the new IMGPATH and the corresponding
-            matrices in MATSPATH.
+        """ Give yoloHandler the slot and the sequence number of the new frame
+            in the frameStore
         """
-        IMGPATH = kw["imgpath"]
-        MATSPATH = kw["matspath"]
-
-        # we update the synchronized strings storing those values
-        self.nextPhoto.value = ("../"+IMGPATH+"\n")
-        self.nextMats.value = (MATSPATH)
+        self.dispatcher.publish(kw["slot"], kw["seq"], kw.get("session", 0))
 
-    def writeToYolo(self):
-        """ Launched in a new process. We listen for a "SendMore" request from
-            YOLO on FEEDPIPE and we send the path to the last picture taken
-            if it has not already been processed.
+    def send(self, msg):
+        """ Send msg to the main process
         """
-        while not os.path.exists(FEEDPIPE):
-            sleep(1)
-        yolopipe = open(FEEDPIPE, 'rb+', buffering = 0)
-
-        while(self.running.value):
-            lastLine = yolopipe.readline()[:-1].decode("utf8")
-            if lastLine == "SendMore":
-                while self.nextPhoto.value == "":
-                    pass
-                self.yolo.stdin.write(self.nextPhoto.value)
-                self.nextPhoto.value = ""
-
-        yolopipe.close()
-
-    def retrievefromYolo(self):
-        """ Launched in a new process. We listen for new inputs on
-            DETECTIONSPIPE, we parse each input (which looks like
-            "label;confidence;x;y;width;height\n"), we ask for a Raycast from
-            our 2D object and we add that raycast to the queue
+        with self.writeLock:
+            self.writer.send(msg)
+
+    def detectObjects(self, backend):
+        """ Launched in a new process. We wait for a new frame, give it to
+            backend, then we compute the raycasts of all the 2D objects it
+            found at once and send them along with the frame id, as a single
+            RayBatch. We stop if the backend is gone
         """
-        while not os.path.exists(DETECTIONSPIPE):
-            sleep(1)
-        yolopipe = open(DETECTIONSPIPE, 'rb+', buffering = 0)
+        backend.start()
 
         while(self.running.value):
-            # Lines look like label;x;y;w;h where x,y are the center of the
-            # the bounding rect and w,h half its width and height
-            lastLine = yolopipe.readline()[:-1].decode("utf8")
+            # the id is sent while no other process can take a frame
+            frame = self.dispatcher.take(
+                onTake = lambda slot, seq: self.send((seq, None)))
+            if frame is None:
+                continue
+            slot, seq = frame
             try:
-                parsedLine = lastLine.split(";")
-                object2D = Object2D(parsedLine[0], parsedLine[1], parsedLine[2],
-                                    parsedLine[3], parsedLine[4], parsedLine[5])
-                matsString = self.nextMats.value
-                while matsString == "":
-                    matsString = self.nextMats.value
-                with open(matsString, 'r') as f:
-                    projection, world = Raycast.parseMats(f.read())
-                raycast = Raycast.fromObject2D(object2D, projection, world, self.camsize)
-                self.raycastQueue.put(raycast)
-            except:
-                continue;
-
-        yolopipe.close()
-
-    def getNextRaycast(self, block = True, timeout = None):
-        """ Return the next element in the raycast queue
+                with self.metrics.time(DETECTSTAGE):
+                    objects2D = backend.detect(self.frameStore, slot, seq)
+            except EOFError as e:
+                warninglog("Detector stopped: %s" % e)
+                self.send((seq, RayBatch.fromRaycasts(seq, [])))
+                break
+            raycasts = []
+            if objects2D:
+                mats = self.frameStore.mats(slot)
+                if self.frameStore.isValid(slot, seq):
+                    camsize = mats.camsize or self.camsize.read()["size"]
+                    with self.metrics.time(RAYCASTSTAGE):
+                        raycasts = Raycast.fromObjects2D(objects2D, mats,
+                                                         camsize, seq)
+            self.send((seq, RayBatch.fromRaycasts(seq, raycasts)))
+
+    def receive(self, timeout = 0):
+        """ Wait at most timeout seconds for the detector processes to send
+            something, then read everything they sent
+        """
+        self.reader.poll(timeout)
+        with self.orderLock:
+            while self.reader.poll():
+                seq, batch = self.reader.recv()
+                if batch is None:
+                    self.inFlight.append((seq, time() + self.frameTimeout))
+                elif seq in self.abandoned:
+                    self.abandoned.discard(seq)
+                else:
+                    self.done[seq] = batch
+
+    def popNextFrame(self, pop = True):
+        """ Return the RayBatch of the oldest frame taken by a detector
+            process if it is done (or if it is late, see frameTimeout), else
+            None. The frame is only forgotten if pop is True
+        """
+        with self.orderLock:
+            if not self.inFlight:
+                return None
+            seq, deadline = self.inFlight[0]
+            if seq not in self.done:
+                if time() < deadline:
+                    return None
+                warninglog("Frame %d took more than %gs to detect, giving it "
+                           "back without any ray" % (seq, self.frameTimeout))
+                self.done[seq] = RayBatch.fromRaycasts(seq, [])
+                self.abandoned.add(seq)
+            if not pop:
+                return self.done[seq]
+            self.inFlight.popleft()
+            return self.done.pop(seq)
+
+    def untilLate(self, timeout):
+        """ Return timeout (in seconds, None for ever) shortened so that we
+            stop waiting once the oldest frame in flight is late
+        """
+        with self.orderLock:
+            if not self.inFlight:
+                return timeout
+            late = max(self.inFlight[0][1] - time(), 0)
+        return late if timeout is None else min(timeout, late)
+
+    def waitFrame(self, timeout = None):
+        """ Wait at most timeout seconds (None for ever) for the next frame to
+            be done, without taking it. Return True if it is
+        """
+        deadline = None if timeout is None else time() + timeout
+        while not self.hasObject():
+            remaining = None if deadline is None else max(deadline - time(), 0)
+            if remaining == 0:
+                return False
+            self.receive(self.untilLate(remaining))
+        return True
+
+    def getNextFrame(self, block = True, timeout = None):
+        """ Return the RayBatch of the next frame, frames are given back in
+            the order they were taken even if the detector processes finish
+            them in another order. Raise queue.Empty if no frame is done
+            before timeout
+        """
+        if not self.waitFrame(timeout if block else 0):
+            raise Empty
+        return self.popNextFrame()
+
+    def takeFrames(self):
+        """ Return the RayBatch of all the frames done, in order, without
+            waiting
         """
-        return self.raycastQueue.get(block, timeout)
+        self.receive()
+        frames = []
+        frame = self.popNextFrame()
+        while frame is not None:
+            frames.append(frame)
+            frame = self.popNextFrame()
+        return frames
 
     def hasObject(self):
-        """ Return if the queue has at least an object in it or not
+        """ Return if there is at least a frame done or not
         """
-        return not self.raycastQueue.empty()
+        self.receive()
+        return self.popNextFrame(pop = False) is not None
 
     def close(self):
         """ Clean everything, that means stop the processes by setting running
             to false (0) and join them
         """
         self.running.value = 0
-        self.yoloFeeder.join()
-        self.yoloListener.join()
+        for backend in self.backends:
+            backend.close()
+        for detector in self.detectors:
+            detector.join()
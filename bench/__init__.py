@@ -0,0 +1 @@
+""" Tools to measure the FORHD server without a HoloLens, models or a GPU """
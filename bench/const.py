@@ -0,0 +1,71 @@
+# CONST:fakeDarknet.py
+
+# the stand-ins are launched by the server with the arguments of the real
+# executables, so they are configured through these environment variables
+# mean and standard deviation (in seconds) of the time a detection takes
+FAKEDARKNETDELAY = "FORHD_FAKEDARKNET_DELAY"
+FAKEDARKNETJITTER = "FORHD_FAKEDARKNET_JITTER"
+# number of objects found on each photo
+FAKEDARKNETOBJECTS = "FORHD_FAKEDARKNET_OBJECTS"
+FAKEDARKNETDEFAULTDELAY = .05
+FAKEDARKNETDEFAULTJITTER = .01
+FAKEDARKNETDEFAULTOBJECTS = 5
+FAKEDARKNETLABELS = ("person", "chair", "tvmonitor", "cup", "laptop")
+
+# CONST:fakeFaceRecognizer.py
+
+# mean and standard deviation (in seconds) of the time a recognition takes
+FAKERECOGNIZERDELAY = "FORHD_FAKERECOGNIZER_DELAY"
+FAKERECOGNIZERJITTER = "FORHD_FAKERECOGNIZER_JITTER"
+# share of the faces that are not recognized
+FAKERECOGNIZERUNKNOWN = "FORHD_FAKERECOGNIZER_UNKNOWN"
+FAKERECOGNIZERDEFAULTDELAY = .02
+FAKERECOGNIZERDEFAULTJITTER = .005
+FAKERECOGNIZERDEFAULTUNKNOWN = .3
+FAKERECOGNIZERNAMES = ("Alice", "Bob", "Carol")
+
+# CONST:sandbox.py
+
+# where the cascade the faceRecognizerHandler loads is looked for
+HAARCASCADE = "models/haarcascade_frontalface_default.xml"
+
+# CONST:recorder.py
+
+# the recorded PUT requests are saved as RECORDPREFIX + number + RECORDEXTENSION
+RECORDPREFIX = "put"
+RECORDEXTENSION = ".bin"
+
+# CONST:replay.py
+
+# default rate (in requests per second), number of connections and number of
+# requests of a replay
+REPLAYRATE = 10.
+REPLAYCONCURRENCY = 2
+# number of clients the connections pretend to be, each with its session
+REPLAYSESSIONS = 1
+REPLAYREQUESTS = 200
+# how long (in milliseconds) each request asks the server to wait for its
+# results
+REPLAYWAITRESULTS = 2000
+# size of the synthetic photos sent when no recording is given
+REPLAYPHOTOSIZE = (1280, 720)
+# latency percentiles reported
+REPLAYPERCENTILES = (50, 90, 99)
+
+# CONST:micro.py
+
+# where the baselines of the microbenchmarks are stored
+MICROBASELINES = "bench/baselines.json"
+# a benchmark regresses when it gets slower than its baseline by more than
+# this ratio
+MICROTHRESHOLD = .3
+# how many times each benchmark is timed, the fastest run is kept
+MICROREPEAT = 5
+# a benchmark slower than its baseline is timed again up to this many times
+# before it is deemed a regression, to rule out a busy machine
+MICRORETRIES = 2
+# numbers of detections and sizes (in MB) of the uploads we time
+MICRODETECTIONS = (1, 50, 500)
+MICROUPLOADSIZES = (1, 3)
+# sizes (width, height) of the photos whose decoding we time
+MICROPHOTOSIZES = ((1280, 720),)
@@ -0,0 +1,85 @@
+ #-*- coding: utf-8 -*-
+""" Stand-in for the darknet executable DarknetBackend drives. It speaks the
+    same protocol as test_detector (see darknet/src/detector.c) but finds
+    random objects after a synthetic delay, so the server can be loaded
+    without weights or a GPU. It is configured through the environment
+    (see bench/const.py)
+"""
+
+import os, os.path
+import random
+import sys
+from time import sleep
+
+import cv2
+
+from FORHD.const import FEEDPIPE, DETECTIONSPIPE, ENDOFFRAMEMSG
+from .const import FAKEDARKNETDELAY, FAKEDARKNETJITTER, FAKEDARKNETOBJECTS,\
+                   FAKEDARKNETDEFAULTDELAY, FAKEDARKNETDEFAULTJITTER,\
+                   FAKEDARKNETDEFAULTOBJECTS, FAKEDARKNETLABELS
+
+def findArg(argv, name, default):
+    """ Return the value following name in argv, like find_char_arg
+    """
+    if name in argv[:-1]:
+        return argv[argv.index(name) + 1]
+    return default
+
+def openFifo(path):
+    """ Create the named pipe at path if needed and open it for writing, which
+        blocks until the server opens it
+    """
+    if not os.path.exists(path):
+        os.mkfifo(path, 0o666)
+    return open(path, "wb", buffering = 0)
+
+def detections(path, nobjects, rng):
+    """ Return the detection lines of nobjects random objects on the photo
+        saved at path
+    """
+    img = cv2.imread(path, cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if img is None:
+        return []
+    height, width = img.shape[0] * 8, img.shape[1] * 8
+    lines = []
+    for _ in range(nobjects):
+        w = rng.uniform(.05, .3) * width
+        h = rng.uniform(.05, .3) * height
+        lines.append("%s;%.3f;%.0f;%.0f;%.0f;%.0f\n" % (
+            rng.choice(FAKEDARKNETLABELS), rng.uniform(.3, 1.),
+            rng.uniform(w/2., width - w/2.), rng.uniform(h/2., height - h/2.),
+            w, h))
+    return lines
+
+def run(argv, stdin = sys.stdin):
+    """ Ask for a photo on the feed pipe, read "frameId;path" on stdin, wait
+        and send the detections of the photo followed by the end of frame
+        line, until stdin is closed
+    """
+    delay = float(os.environ.get(FAKEDARKNETDELAY, FAKEDARKNETDEFAULTDELAY))
+    jitter = float(os.environ.get(FAKEDARKNETJITTER, FAKEDARKNETDEFAULTJITTER))
+    nobjects = int(os.environ.get(FAKEDARKNETOBJECTS,
+                                  FAKEDARKNETDEFAULTOBJECTS))
+    rng = random.Random(0)
+
+    feed = openFifo(findArg(argv, "-feed", FEEDPIPE))
+    detectionsPipe = openFifo(findArg(argv, "-detections", DETECTIONSPIPE))
+    try:
+        while True:
+            feed.write(b"SendMore\n")
+            line = stdin.readline()
+            if not line:
+                break
+            frameId, _, path = line.strip().rpartition(";")
+            lines = detections(path, nobjects, rng)
+            sleep(max(rng.gauss(delay, jitter), 0.))
+            lines.append("%s;%s\n" % (ENDOFFRAMEMSG, frameId))
+            detectionsPipe.write("".join(lines).encode("utf8"))
+    except BrokenPipeError:
+        pass
+    finally:
+        feed.close()
+        detectionsPipe.close()
+
+if __name__ == "__main__":
+    run(sys.argv)
@@ -0,0 +1,46 @@
+ #-*- coding: utf-8 -*-
+""" Stand-in for the faceRecognizer executable RecognizerWorker drives: it
+    asks for a path, waits a synthetic delay and answers a random name, or
+    that it doesn't know the person. It is configured through the
+    environment (see bench/const.py)
+"""
+
+import os
+import random
+import sys
+from time import sleep
+
+from FORHD.const import FACERECOGNIZERPROMPT, FACERECOGNIZERUNKNOWN
+from .const import FAKERECOGNIZERDELAY, FAKERECOGNIZERJITTER,\
+                   FAKERECOGNIZERUNKNOWN, FAKERECOGNIZERDEFAULTDELAY,\
+                   FAKERECOGNIZERDEFAULTJITTER, FAKERECOGNIZERDEFAULTUNKNOWN,\
+                   FAKERECOGNIZERNAMES
+
+def run(stdin = sys.stdin, stdout = sys.stdout):
+    """ Answer the paths read on stdin until it is closed or we are asked to
+        stop
+    """
+    delay = float(os.environ.get(FAKERECOGNIZERDELAY,
+                                 FAKERECOGNIZERDEFAULTDELAY))
+    jitter = float(os.environ.get(FAKERECOGNIZERJITTER,
+                                  FAKERECOGNIZERDEFAULTJITTER))
+    unknown = float(os.environ.get(FAKERECOGNIZERUNKNOWN,
+                                   FAKERECOGNIZERDEFAULTUNKNOWN))
+    rng = random.Random(0)
+
+    while True:
+        print(FACERECOGNIZERPROMPT, file = stdout, flush = True)
+        path = stdin.readline().strip()
+        if path in ("", "Stop"):
+            break
+        sleep(max(rng.gauss(delay, jitter), 0.))
+        if rng.random() < unknown:
+            print(FACERECOGNIZERUNKNOWN, file = stdout, flush = True)
+        else:
+            print(rng.choice(FAKERECOGNIZERNAMES), file = stdout, flush = True)
+
+if __name__ == "__main__":
+    try:
+        run()
+    except BrokenPipeError:
+        pass
@@ -0,0 +1,219 @@
+ #-*- coding: utf-8 -*-
+""" Microbenchmarks of the code that runs on every frame: parsing the
+    uploads and the detections, computing the rays and building the
+    answers. Each benchmark is compared with its stored baseline and the
+    suite fails if one got slower by more than a threshold
+"""
+
+import argparse
+import email.message
+import json
+import os.path
+import pickle
+import sys
+import timeit
+
+import numpy as np
+import cv2
+
+from FORHD.const import UPLOADMAGIC, UPLOADVERSION
+from FORHD.httpHandler import HttpHandler, UPLOADHEADER
+from FORHD.detectorBackend import DarknetBackend
+from FORHD.raycast import Raycast, CameraMats
+from FORHD.rayEncoding import LabelTable, encodeRays
+from FORHD.resultBatch import RayBatch
+from FORHD.session import Session
+from FORHD.objects import Object2D, Object3D
+from .const import MICROBASELINES, MICROTHRESHOLD, MICROREPEAT,\
+                   MICRORETRIES, MICRODETECTIONS, MICROUPLOADSIZES,\
+                   MICROPHOTOSIZES, FAKEDARKNETLABELS
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+MATSSTRING = "Projection:1.5 0 0.1 0\n0 2.6 0.2 0\n0 0 -1 0\n0 0 -1 0\n;"\
+             "World:0 0.1 -1 0.5\n0.1 1 0 1.2\n1 0 0 -0.3\n0 0 0 1\n"
+CAMSIZE = (1280., 720.)
+
+def detectionLines(n, seed = 0):
+    """ Return n detection lines, as YOLO sends them
+    """
+    rng = np.random.default_rng(seed)
+    return ["%s;%.3f;%.0f;%.0f;%.0f;%.0f" % (
+                FAKEDARKNETLABELS[i % len(FAKEDARKNETLABELS)],
+                rng.uniform(.3, 1.), rng.uniform(0, CAMSIZE[0]),
+                rng.uniform(0, CAMSIZE[1]), rng.uniform(10, 300),
+                rng.uniform(10, 300))
+            for i in range(n)]
+
+def uploads(megabytes, seed = 0):
+    """ Return a binary and a text upload carrying a photo of megabytes MB
+    """
+    photo = np.random.default_rng(seed).integers(
+        0, 256, megabytes * 1024 * 1024, dtype = np.uint8).tobytes()
+    projection, world = Raycast.parseMats(MATSSTRING)
+    binary = UPLOADHEADER.pack(UPLOADMAGIC, UPLOADVERSION, 0, len(photo)) +\
+             photo + projection.astype("<f4").tobytes() +\
+             world.astype("<f4").tobytes()
+    text = len(photo).to_bytes(4, 'little') + photo +\
+           MATSSTRING.encode("utf8") + b"\x00"
+    return binary, text
+
+def photo(size, seed = 0):
+    """ Return a JPEG photo of size (width, height), smooth enough to
+        compress like a real one
+    """
+    width, height = size
+    img = np.random.default_rng(seed).integers(
+        0, 256, (height // 16, width // 16, 3), dtype = np.uint8)
+    img = cv2.resize(img, size, interpolation = cv2.INTER_CUBIC)
+    return cv2.imencode(".jpg", img)[1].tobytes()
+
+def answerer(binary):
+    """ Return a request handler answering the client of a session holding
+        an object of each label, away from the rays, in binary or in text
+    """
+    handler = HttpHandler.__new__(HttpHandler)
+    handler.headers = email.message.Message()
+    session = Session("micro", 0, HttpHandler.props)
+    session.props[HttpHandler.ServerProperty.BINARY_RAYS] = binary
+    session.knownObjects.update([Object3D(label, 1., 100., 100., 100., 0, 0)
+                                 for label in FAKEDARKNETLABELS])
+    return handler, session
+
+def benchmarks():
+    """ Return the benchmarks as a dict from their name to the function they
+        time
+    """
+    projection, world = Raycast.parseMats(MATSSTRING)
+    mats = CameraMats(projection, world)
+    vector = np.array([.2, -.4, 1.])
+    textHandler, textSession = answerer(False)
+    binaryHandler, binarySession = answerer(True)
+    suite = {
+        "parseMats": lambda: Raycast.parseMats(MATSSTRING),
+        "unProjectVector": lambda: Raycast.unProjectVector(projection,
+                                                           vector),
+    }
+    for n in MICRODETECTIONS:
+        lines = detectionLines(n)
+        objects2D = [DarknetBackend.parseDetection(line) for line in lines]
+        rays = Raycast.fromObjects2D(objects2D, mats, CAMSIZE, 1)
+        batch = RayBatch.fromRaycasts(1, rays)
+        suite.update({
+            "parseDetection/%d" % n:
+                lambda lines = lines: [DarknetBackend.parseDetection(line)
+                                       for line in lines],
+            "fromObject2D/%d" % n:
+                lambda objects2D = objects2D: [
+                    Raycast.fromObject2D(o, projection, world, CAMSIZE)
+                    for o in objects2D],
+            "fromObjects2D/%d" % n:
+                lambda objects2D = objects2D: Raycast.fromObjects2D(
+                    objects2D, mats, CAMSIZE, 1),
+            # the answers send_all_rays builds from the rays of a frame
+            "textRays/%d" % n:
+                lambda batch = batch: textHandler.encode_results(
+                    textSession, [batch], [], []),
+            "binaryRays/%d" % n:
+                lambda batch = batch: binaryHandler.encode_results(
+                    binarySession, [batch], [], []),
+            "encodeRays/%d" % n:
+                lambda batch = batch: encodeRays(LabelTable(), 0, [batch]),
+            # what handing the rays of a frame to the HTTP side costs
+            "rayBatch/%d" % n:
+                lambda rays = rays: pickle.loads(pickle.dumps(
+                    RayBatch.fromRaycasts(1, rays))),
+        })
+    for megabytes in MICROUPLOADSIZES:
+        binary, text = uploads(megabytes)
+        suite.update({
+            "splitImageMats/binary/%dMB" % megabytes:
+                lambda binary = binary: HttpHandler.splitImageMats(binary),
+            "splitImageMats/text/%dMB" % megabytes:
+                lambda text = text: HttpHandler.splitImageMats(text),
+        })
+    for size in MICROPHOTOSIZES:
+        suite["decodePhoto/%dx%d" % size] =\
+            lambda rawImage = photo(size): HttpHandler.decodePhoto(rawImage)
+    return suite
+
+def measure(function, repeat = MICROREPEAT):
+    """ Return the time (in seconds) a call to function takes, the fastest of
+        repeat runs of enough calls to last a fraction of a second
+    """
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat, number)) / number
+
+def compare(timings, baselines, threshold = MICROTHRESHOLD):
+    """ Return the (name, timing, baseline) of the benchmarks of timings
+        slower than their baseline by more than threshold
+    """
+    return [(name, timing, baselines[name])
+            for name, timing in sorted(timings.items())
+            if name in baselines and timing > baselines[name] * (1+threshold)]
+
+def loadBaselines(path = os.path.join(ROOT, MICROBASELINES)):
+    """ Return the stored baselines, a dict from the names of the benchmarks
+        to their time in seconds
+    """
+    if not os.path.isfile(path):
+        return {}
+    with open(path) as baselines:
+        return json.load(baselines)
+
+def saveBaselines(timings, path = os.path.join(ROOT, MICROBASELINES)):
+    """ Store timings as the new baselines
+    """
+    with open(path, "w") as baselines:
+        json.dump(timings, baselines, indent = 4, sort_keys = True)
+        baselines.write("\n")
+
+def run(pattern = "", threshold = MICROTHRESHOLD, save = False):
+    """ Time the benchmarks whose name contains pattern, print them along
+        with their baseline and return the regressions
+    """
+    baselines = loadBaselines()
+    suite = benchmarks()
+    timings = {}
+    for name, function in suite.items():
+        if pattern not in name:
+            continue
+        timings[name] = measure(function)
+        for _ in range(MICRORETRIES):
+            if save or not compare({name: timings[name]}, baselines,
+                                   threshold):
+                break
+            timings[name] = min(timings[name], measure(function))
+        baseline = baselines.get(name)
+        print("%-28s %10.2fus %s" % (
+            name, timings[name] * 1e6,
+            "" if baseline is None else
+            "(baseline %.2fus, %+.0f%%)" % (baseline * 1e6,
+                                             (timings[name]/baseline-1) * 100)))
+    if save:
+        baselines.update(timings)
+        saveBaselines(baselines)
+        return []
+    return compare(timings, baselines, threshold)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description = 'Run the microbenchmarks of FORHD server')
+    parser.add_argument('-k', dest='pattern', default='',
+                        help='only run the benchmarks whose name contains '
+                             'this')
+    parser.add_argument('-t', dest='threshold', type=float,
+                        default=MICROTHRESHOLD,
+                        help='allowed slowdown over the baselines '
+                             '(default : %g)' % MICROTHRESHOLD)
+    parser.add_argument('-s', dest='save', action='store_const',
+                        const=True, default=False,
+                        help='store the timings as the new baselines')
+
+    args = parser.parse_args()
+    regressions = run(args.pattern, args.threshold, args.save)
+    for name, timing, baseline in regressions:
+        print("REGRESSION %s: %.2fus instead of %.2fus" %
+              (name, timing * 1e6, baseline * 1e6))
+    sys.exit(1 if regressions else 0)
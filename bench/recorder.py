@@ -0,0 +1,110 @@
+ #-*- coding: utf-8 -*-
+""" A proxy standing between the HoloLens and the server, which saves the
+    body of every PUT request (the photos and their matrices) so that they
+    can be replayed later (see replay.py)
+"""
+
+import argparse
+import os, os.path
+from http.client import HTTPConnection
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import count
+from threading import Lock
+
+from FORHD.const import LOCALPORT, KEEPALIVETIMEOUT
+from .const import RECORDPREFIX, RECORDEXTENSION
+
+def recordPath(directory, number):
+    """ Return the path of the recording number in directory
+    """
+    return os.path.join(directory, "%s%06d%s" % (RECORDPREFIX, number,
+                                                 RECORDEXTENSION))
+
+class RecorderHandler(BaseHTTPRequestHandler):
+    """ Forward each request to upstream and its answer back to the client,
+        on a connection of its own, and save the PUT bodies in directory
+    """
+
+    protocol_version = "HTTP/1.1"
+    timeout = KEEPALIVETIMEOUT
+    upstream = ("localhost", LOCALPORT)
+    directory = "."
+    numbers = count()
+    lock = Lock()
+    upstreamConnection = None
+
+    def finish(self):
+        BaseHTTPRequestHandler.finish(self)
+        if self.upstreamConnection is not None:
+            self.upstreamConnection.close()
+
+    def forward(self):
+        """ Send the request to upstream and its answer to the client, and
+            return the body of the request
+        """
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length) if length else None
+        if self.upstreamConnection is None:
+            self.upstreamConnection = HTTPConnection(*self.upstream)
+        headers = {key: value for key, value in self.headers.items()
+                   if key.lower() not in ("host", "connection")}
+        self.upstreamConnection.request(self.command, self.path, body,
+                                         headers)
+        response = self.upstreamConnection.getresponse()
+        answer = response.read()
+        self.send_response(response.status)
+        for key, value in response.getheaders():
+            if key.lower() not in ("connection", "transfer-encoding",
+                                   "content-length"):
+                self.send_header(key, value)
+        self.send_header("Content-Length", len(answer))
+        self.end_headers()
+        self.wfile.write(answer)
+        return body
+
+    def do_PUT(self):
+        body = self.forward()
+        with self.lock:
+            number = next(self.numbers)
+        with open(recordPath(self.directory, number), "wb") as record:
+            record.write(body)
+
+    def do_GET(self):
+        self.forward()
+
+    def do_POST(self):
+        self.forward()
+
+    def log_message(self, *args):
+        pass
+
+def record(directory, port, upstream):
+    """ Listen on port and record the PUT requests in directory until we are
+        interrupted
+    """
+    os.makedirs(directory, exist_ok = True)
+    RecorderHandler.directory = directory
+    RecorderHandler.upstream = upstream
+    server = ThreadingHTTPServer(("", port), RecorderHandler)
+    server.daemon_threads = True
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description = 'Record the photos sent to FORHD server')
+    parser.add_argument('directory', help='where the recordings are saved')
+    parser.add_argument('-p', dest='port', type=int, default=LOCALPORT + 1,
+                        help='port the HoloLens connects to (default : %d)' %
+                             (LOCALPORT + 1))
+    parser.add_argument('-u', dest='upstream', default='localhost:%d' %
+                                                       LOCALPORT,
+                        help='address of the server (default : '
+                             'localhost:%d)' % LOCALPORT)
+
+    args = parser.parse_args()
+    host, _, port = args.upstream.rpartition(":")
+    record(args.directory, args.port, (host, int(port)))
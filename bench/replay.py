@@ -0,0 +1,298 @@
+ #-*- coding: utf-8 -*-
+""" Replay recorded PUT requests (see recorder.py) against a running server,
+    at a given rate and with a given number of connections, and report the
+    latency percentiles, the throughput and the drops
+"""
+
+import argparse
+import glob
+import os.path
+import queue
+from http.client import HTTPConnection, HTTPException
+from threading import Thread, Semaphore
+from time import perf_counter, sleep
+
+import numpy as np
+import cv2
+
+from FORHD.const import LOCALPORT, WAITRESULTSHEADER, FRAMEIDHEADER,\
+                        UPLOADMAGIC, UPLOADVERSION, METRICSPATH,\
+                        SESSIONHEADER, UPLOADDELAYHEADER
+from FORHD.httpHandler import UPLOADHEADER
+from .const import RECORDPREFIX, RECORDEXTENSION, REPLAYRATE,\
+                   REPLAYCONCURRENCY, REPLAYREQUESTS, REPLAYWAITRESULTS,\
+                   REPLAYPHOTOSIZE, REPLAYPERCENTILES, REPLAYSESSIONS
+
+# the matrices of the synthetic payloads: a camera at the origin looking
+# down -z
+PROJECTION = np.array([[1.5, 0., 0., 0.],
+                       [0., 2.6, 0., 0.],
+                       [0., 0., -1., 0.],
+                       [0., 0., -1., 0.]], dtype = np.float32)
+WORLD = np.eye(4, dtype = np.float32)
+
+def loadPayloads(directory):
+    """ Return the bodies recorded in directory, in the order they were sent
+    """
+    paths = sorted(glob.glob(os.path.join(directory, RECORDPREFIX + "*" +
+                                          RECORDEXTENSION)))
+    payloads = []
+    for path in paths:
+        with open(path, "rb") as record:
+            payloads.append(record.read())
+    return payloads
+
+def syntheticPayload(size = REPLAYPHOTOSIZE, seed = 0):
+    """ Return the body of a PUT request carrying a random photo of size
+        (width, height), in the binary upload format
+    """
+    rng = np.random.default_rng(seed)
+    width, height = size
+    img = rng.integers(0, 256, (height // 8, width // 8, 3), dtype = np.uint8)
+    img = cv2.resize(img, (width, height), interpolation = cv2.INTER_LINEAR)
+    _, photo = cv2.imencode(".jpg", img)
+    photo = photo.tobytes()
+    return UPLOADHEADER.pack(UPLOADMAGIC, UPLOADVERSION, 0, len(photo)) +\
+           photo + PROJECTION.tobytes() + WORLD.tobytes()
+
+def parseMetrics(text):
+    """ Return the samples of a Prometheus text exposition as a dict from
+        "name{labels}" to value
+    """
+    samples = {}
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        name, _, value = line.rpartition(" ")
+        samples[name] = float(value)
+    return samples
+
+class Result:
+    """ The outcome of a replayed request """
+
+    def __init__(self, scheduled, latency = None, status = None,
+                 frameId = None, error = None, delay = None):
+        self.scheduled = scheduled
+        self.latency = latency
+        self.status = status
+        self.frameId = frameId
+        self.error = error
+        # how long (in seconds) the server asked us to wait before the next
+        # upload
+        self.delay = delay
+
+class Replayer:
+    """ Send payloads (cycling through them) requests times, one every
+        1/rate second (as fast as possible if rate is 0), on concurrency
+        keep-alive connections. Each request asks the server to wait at most
+        waitResults milliseconds for the results of its frame, so its latency
+        is the end-to-end latency of the frame. The connections are spread
+        over sessions clients (see FORHD.session).
+        When paced, each connection waits the delay the server asks for
+        between two uploads instead of following rate.
+        Like the HoloLens, we don't queue photos: a photo due while all the
+        connections are busy is skipped
+    """
+
+    def __init__(self, payloads, host = "localhost", port = LOCALPORT,
+                 rate = REPLAYRATE, concurrency = REPLAYCONCURRENCY,
+                 requests = REPLAYREQUESTS, waitResults = REPLAYWAITRESULTS,
+                 sessions = REPLAYSESSIONS, paced = False):
+        self.payloads = payloads
+        self.host = host
+        self.port = port
+        self.rate = rate
+        self.concurrency = concurrency
+        self.requests = requests
+        self.waitResults = waitResults
+        self.sessions = sessions
+        self.paced = paced
+        self.tasks = queue.Queue()
+        self.results = queue.Queue()
+        self.idle = Semaphore(concurrency)
+
+    def metrics(self):
+        """ Return the metrics of the server, or None if it doesn't serve them
+        """
+        connection = HTTPConnection(self.host, self.port)
+        try:
+            connection.request("GET", METRICSPATH)
+            response = connection.getresponse()
+            text = response.read().decode("utf8")
+            if response.status != 200:
+                return None
+            return parseMetrics(text)
+        except (OSError, HTTPException, ValueError):
+            return None
+        finally:
+            connection.close()
+
+    def send(self, connection, payload, session):
+        """ PUT payload on connection, for the client session, and return
+            the status, the frame id and the upload delay of the answer
+        """
+        connection.request("PUT", "/", payload,
+                           {WAITRESULTSHEADER: str(self.waitResults),
+                            SESSIONHEADER: "replay%d" % session})
+        response = connection.getresponse()
+        response.read()
+        delay = response.getheader(UPLOADDELAYHEADER)
+        return response.status, response.getheader(FRAMEIDHEADER),\
+               None if delay is None else float(delay) / 1000.
+
+    def work(self, session):
+        """ Launched in a new thread. Send the requests of tasks on a
+            connection of our own, as the client session, until we get None
+        """
+        connection = HTTPConnection(self.host, self.port)
+        while True:
+            task = self.tasks.get()
+            if task is None:
+                break
+            scheduled, payload = task
+            start = perf_counter()
+            try:
+                status, frameId, delay = self.send(connection, payload,
+                                                   session)
+                self.results.put(Result(scheduled, perf_counter() - start,
+                                        status, frameId, delay = delay))
+                if self.paced and delay:
+                    sleep(delay)
+            except (OSError, HTTPException) as e:
+                connection.close()
+                connection = HTTPConnection(self.host, self.port)
+                self.results.put(Result(scheduled, error = str(e)))
+            self.idle.release()
+        connection.close()
+
+    def run(self):
+        """ Replay the requests and return the Report
+        """
+        before = self.metrics()
+        workers = [Thread(target = self.work, args = (i % self.sessions,),
+                          daemon = True)
+                   for i in range(self.concurrency)]
+        for worker in workers:
+            worker.start()
+
+        # paced connections set their own rate
+        rate = 0 if self.paced else self.rate
+        skipped = 0
+        start = perf_counter()
+        for i in range(self.requests):
+            scheduled = start + i / rate if rate else perf_counter()
+            delay = scheduled - perf_counter()
+            if delay > 0:
+                sleep(delay)
+            if not self.idle.acquire(blocking = not rate):
+                skipped += 1
+                continue
+            self.tasks.put((scheduled, self.payloads[i % len(self.payloads)]))
+        for _ in workers:
+            self.tasks.put(None)
+        for worker in workers:
+            worker.join()
+        duration = perf_counter() - start
+
+        results = []
+        while not self.results.empty():
+            results.append(self.results.get())
+        return Report(results, skipped, duration, before, self.metrics())
+
+class Report:
+    """ The summary of a replay """
+
+    def __init__(self, results, skipped, duration, before = None,
+                 after = None):
+        self.sent = len(results)
+        self.skipped = skipped
+        self.duration = duration
+        self.errors = sum(result.error is not None or result.status != 200
+                          for result in results)
+        # answers without a frame id are photos the server couldn't store
+        self.rejected = sum(result.status == 200 and result.frameId is None
+                            for result in results)
+        latencies = np.array([result.latency for result in results
+                              if result.error is None and
+                                 result.frameId is not None])
+        self.completed = len(latencies)
+        delays = [result.delay for result in results
+                  if result.delay is not None]
+        self.meanDelay = np.mean(delays) if delays else None
+        self.throughput = self.completed / duration if duration else 0.
+        self.percentiles = {}
+        if len(latencies):
+            for percentile, value in zip(REPLAYPERCENTILES,
+                                         np.percentile(latencies,
+                                                       REPLAYPERCENTILES)):
+                self.percentiles[percentile] = value
+        # the frames the server dropped meanwhile, by reason
+        self.serverDrops = {}
+        if before is not None and after is not None:
+            for name, value in after.items():
+                if name.startswith("forhd_frames_dropped_total"):
+                    self.serverDrops[name[len("forhd_frames_dropped_total"):]]\
+                        = value - before.get(name, 0.)
+
+    def format(self):
+        """ Return the report as text
+        """
+        lines = ["requests: %d sent, %d completed, %d skipped, %d rejected, "
+                 "%d errors" % (self.sent, self.completed, self.skipped,
+                                self.rejected, self.errors),
+                 "throughput: %.2f frames/s over %.2fs" % (self.throughput,
+                                                           self.duration)]
+        for percentile, value in self.percentiles.items():
+            lines.append("latency p%d: %.1fms" % (percentile, value * 1000.))
+        if self.meanDelay is not None:
+            lines.append("upload delay asked: %.1fms on average" %
+                         (self.meanDelay * 1000.))
+        for labels, value in sorted(self.serverDrops.items()):
+            lines.append("server drops %s: %d" % (labels, value))
+        return "\n".join(lines)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description = 'Replay photos against FORHD server')
+    parser.add_argument('-u', dest='server', default='localhost:%d' %
+                                                     LOCALPORT,
+                        help='address of the server (default : '
+                             'localhost:%d)' % LOCALPORT)
+    parser.add_argument('-p', dest='payloads', default=None,
+                        help='directory of the recordings (default : '
+                             'synthetic photos)')
+    parser.add_argument('-r', dest='rate', type=float, default=REPLAYRATE,
+                        help='requests per second, 0 for as many as possible '
+                             '(default : %g)' % REPLAYRATE)
+    parser.add_argument('-c', dest='concurrency', type=int,
+                        default=REPLAYCONCURRENCY,
+                        help='number of connections (default : %d)' %
+                             REPLAYCONCURRENCY)
+    parser.add_argument('-s', dest='sessions', type=int,
+                        default=REPLAYSESSIONS,
+                        help='number of clients the connections pretend to '
+                             'be (default : %d)' % REPLAYSESSIONS)
+    parser.add_argument('-a', dest='paced', action='store_true',
+                        help='wait the delay the server asks for between two '
+                             'uploads of a connection instead of following '
+                             'the rate')
+    parser.add_argument('-n', dest='requests', type=int,
+                        default=REPLAYREQUESTS,
+                        help='number of requests (default : %d)' %
+                             REPLAYREQUESTS)
+    parser.add_argument('-w', dest='waitResults', type=int,
+                        default=REPLAYWAITRESULTS,
+                        help='how long (in milliseconds) the server waits '
+                             'for the results of a frame (default : %d)' %
+                             REPLAYWAITRESULTS)
+
+    args = parser.parse_args()
+    if args.payloads is None:
+        payloads = [syntheticPayload(seed = i) for i in range(8)]
+    else:
+        payloads = loadPayloads(args.payloads)
+    host, _, port = args.server.rpartition(":")
+    replayer = Replayer(payloads, host, int(port), args.rate,
+                        args.concurrency, args.requests, args.waitResults,
+                        args.sessions, args.paced)
+    print(replayer.run().format())
@@ -0,0 +1,79 @@
+ #-*- coding: utf-8 -*-
+""" Run the FORHD server with the stand-ins of darknet and faceRecognizer.
+    The server finds its executables relatively to its working directory
+    (see DARKNETBASEPATH and FACERECOGNIZERBASEPATH), so we build a
+    directory where they are replaced by the stand-ins and run it from there
+"""
+
+import argparse
+import os, os.path
+import stat
+import sys
+import tempfile
+
+import cv2
+
+from FORHD.const import DARKNETBASEPATH, DARKNETPATH, FACERECOGNIZERBASEPATH,\
+                        FACERECOGNIZERPATH, DETECTORINSTANCES
+from .const import HAARCASCADE
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+def writeLauncher(path, module):
+    """ Write at path an executable running the python module module with
+        the arguments it is given
+    """
+    os.makedirs(os.path.dirname(path), exist_ok = True)
+    with open(path, "w") as launcher:
+        launcher.write('#!/bin/sh\nPYTHONPATH="%s" exec "%s" -m %s "$@"\n'
+                       % (ROOT, sys.executable, module))
+    os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP |
+                   stat.S_IXOTH)
+
+def prepare(directory):
+    """ Fill directory with the stand-ins and the cascade the server needs,
+        and return it
+    """
+    writeLauncher(os.path.join(directory, DARKNETBASEPATH, DARKNETPATH),
+                  "bench.fakeDarknet")
+    writeLauncher(os.path.join(directory, FACERECOGNIZERBASEPATH,
+                               FACERECOGNIZERPATH),
+                  "bench.fakeFaceRecognizer")
+    cascade = os.path.join(directory, HAARCASCADE)
+    if not os.path.lexists(cascade):
+        os.makedirs(os.path.dirname(cascade), exist_ok = True)
+        source = os.path.join(ROOT, "FORHD", HAARCASCADE)
+        if not os.path.exists(source):
+            source = os.path.join(cv2.data.haarcascades,
+                                  os.path.basename(HAARCASCADE))
+        os.symlink(source, cascade)
+    return directory
+
+def serve(directory = None, instances = DETECTORINSTANCES, verbose = False):
+    """ Run the server with the stand-ins, from directory (a temporary one
+        if None)
+    """
+    from FORHD import Main
+
+    if directory is None:
+        directory = tempfile.mkdtemp(prefix = "FORHD_bench_")
+    os.chdir(prepare(directory))
+    Main(verbose = verbose, detector = "darknet", instances = instances)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description = 'Run FORHD server with stand-ins of darknet and '
+                      'faceRecognizer (see bench/const.py for their settings)')
+    parser.add_argument('-v', dest='verbose', action='store_const',
+                        const=True, default=False,
+                        help='verbose (default : False)')
+    parser.add_argument('-n', dest='instances', type=int,
+                        default=DETECTORINSTANCES,
+                        help='number of detector instances (default : %d)' %
+                             DETECTORINSTANCES)
+    parser.add_argument('-w', dest='directory', default=None,
+                        help='working directory (default : a new temporary '
+                             'one)')
+
+    args = parser.parse_args()
+    serve(args.directory, args.instances, args.verbose)
@@ -5,9 +5,29 @@ import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
 
 import FORHD.faceRecognizerHandler as faceRecognizerHandler
+import FORHD.faceRecognizerPool as faceRecognizerPool
+import FORHD.faceCache as faceCache
+import FORHD.faceTracker as faceTracker
 import FORHD.httpHandler as httpHandler
 import FORHD.yoloHandler as yoloHandler
+import FORHD.detectorBackend as detectorBackend
 import FORHD.raycast as raycast
+import FORHD.rayEncoding as rayEncoding
+import FORHD.rayStream as rayStream
+import FORHD.resultBatch as resultBatch
+import FORHD.worldMap as worldMap
+import FORHD.knownObjects as knownObjects
+import FORHD.frameStore as frameStore
+import FORHD.sharedState as sharedState
+import FORHD.frameDispatcher as frameDispatcher
+import FORHD.frameWindow as frameWindow
+import FORHD.session as session
+import FORHD.pacer as pacer
+import FORHD.metrics as metrics
 import FORHD.objects as objects
 import FORHD.utils as utils
 import FORHD.const as const
+import bench.fakeDarknet as fakeDarknet
+import bench.fakeFaceRecognizer as fakeFaceRecognizer
+import bench.micro as micro
+import bench.replay as replay
@@ -0,0 +1,72 @@
+import unittest
+import os
+import numpy as np
+from context import detectorBackend
+
+class FakeNet:
+    """ Stands for a cv2.dnn network, returning the given outputs """
+
+    def __init__(self, outputs):
+        self.outputs = outputs
+
+    def setInput(self, blob):
+        self.blob = blob
+
+    def forward(self, names):
+        return self.outputs
+
+class TestDetectorBackend(unittest.TestCase):
+
+    def testParseDetection(self):
+        object2D = detectorBackend.DarknetBackend.parseDetection(
+            "chair;0.540;640;360;100;50")
+
+        self.assertEqual(object2D.label, "chair")
+        self.assertEqual(object2D.confidence, 0.54)
+        self.assertEqual((object2D.x, object2D.y, object2D.w, object2D.h),
+                         (640., 360., 100., 50.))
+
+    def testReadLineEndOfFile(self):
+        reader, writer = os.pipe()
+        os.write(writer, b"SendMore\n")
+        os.close(writer)
+        with os.fdopen(reader, "rb", buffering = 0) as pipe:
+            self.assertEqual(
+                detectorBackend.DarknetBackend.readLine(pipe), "SendMore")
+            with self.assertRaises(EOFError):
+                detectorBackend.DarknetBackend.readLine(pipe)
+
+    def testRescale(self):
+        objects2D = detectorBackend.DetectorBackend.rescale(
+            [detectorBackend.Object2D("chair", .5, 320, 180, 50, 20)],
+            (640, 360), (1280, 720))
+
+        self.assertEqual((objects2D[0].x, objects2D[0].y, objects2D[0].w,
+                          objects2D[0].h), (640., 360., 100., 40.))
+        self.assertEqual(objects2D[0].label, "chair")
+
+    def testOpenCVDetectImage(self):
+        backend = detectorBackend.OpenCVBackend.__new__(
+            detectorBackend.OpenCVBackend)
+        backend.labels = ["person", "chair"]
+        backend.outputs = None
+        # x, y, w, h, objectness, p(person), p(chair)
+        backend.net = FakeNet([np.array([
+            [0.5, 0.5, 0.2, 0.4, 0.9, 0.1, 0.8],
+            # overlaps the first one, same class: removed by NMS
+            [0.51, 0.5, 0.2, 0.4, 0.9, 0.1, 0.6],
+            # same place, other class: kept
+            [0.5, 0.5, 0.2, 0.4, 0.9, 0.7, 0.1],
+            # below the threshold
+            [0.1, 0.1, 0.1, 0.1, 0.1, 0.1, 0.1]], dtype = np.float32)])
+
+        objects2D = backend.detectImage(np.zeros((100, 200, 3), np.uint8))
+
+        self.assertEqual(sorted(o.label for o in objects2D),
+                         ["chair", "person"])
+        chair = [o for o in objects2D if o.label == "chair"][0]
+        self.assertAlmostEqual(chair.confidence, 0.8, places = 5)
+        self.assertAlmostEqual(chair.x, 100., places = 3)
+        self.assertAlmostEqual(chair.y, 50., places = 3)
+        self.assertAlmostEqual(chair.w, 40., places = 3)
+        self.assertAlmostEqual(chair.h, 40., places = 3)
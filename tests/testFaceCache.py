@@ -0,0 +1,132 @@
+import unittest
+import numpy as np
+from context import faceCache
+from context import objects
+from context import raycast
+
+def makeFace(direction, box, name = "Unknown"):
+    ray = raycast.Raycast("face", 100, np.array([0., 0., 0., 1.]),
+                          np.append(direction, 1.))
+    return objects.Face("dummy", ray, name, box)
+
+class TestFaceCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = faceCache.FaceCache(size = 2, ttl = 5, verifyPeriod = 3,
+                                         maxAngle = .1, minIoU = .3,
+                                         minConfidence = .5)
+
+    def testUnknownFaceNeedsVerification(self):
+        face = makeFace([0., 0., 1.], (0, 0, 10, 10))
+
+        (key, confidence), = self.cache.match([face], 1)
+
+        self.assertIsNone(key)
+        self.assertTrue(self.cache.needsVerification(key, confidence, 1))
+
+    def testMatchReusesName(self):
+        face = makeFace([0., 0., 1.], (0, 0, 10, 10), "Alice")
+        self.cache.verified(None, face, True, 1)
+
+        # same direction, the person moved on the photo since the camera did
+        newFace = makeFace([0., 0.001, 1.], (50, 50, 10, 10))
+        (key, confidence), = self.cache.match([newFace], 2)
+        self.assertFalse(self.cache.needsVerification(key, confidence, 2))
+        entry = self.cache.seen(key, newFace, 2)
+
+        self.assertEqual(newFace.name, "Alice")
+        self.assertTrue(entry.recognized)
+
+    def testMatchByBoxOverlap(self):
+        self.cache.verified(None, makeFace([0., 0., 1.], (0, 0, 10, 10),
+                                           "Alice"), True, 1)
+
+        newFace = makeFace([1., 0., 0.], (1, 0, 10, 10))
+        (key, confidence), = self.cache.match([newFace], 2)
+
+        self.assertIsNotNone(key)
+        self.assertAlmostEqual(confidence, 90/110.)
+
+    def testTwoFacesDontMatchTheSameEntry(self):
+        self.cache.verified(None, makeFace([0., 0., 1.], (0, 0, 10, 10),
+                                           "Alice"), True, 1)
+
+        faces = [makeFace([0., 0.05, 1.], (100, 0, 10, 10)),
+                 makeFace([0., 0., 1.], (200, 0, 10, 10))]
+        matches = self.cache.match(faces, 2)
+
+        self.assertIsNone(matches[0][0])
+        self.assertIsNotNone(matches[1][0])
+
+    def testVerifyPeriodically(self):
+        face = makeFace([0., 0., 1.], (0, 0, 10, 10), "Alice")
+        key, _ = self.cache.verified(None, face, True, 1)
+
+        self.assertFalse(self.cache.needsVerification(key, 1., 3))
+        self.assertTrue(self.cache.needsVerification(key, 1., 4))
+        self.assertTrue(self.cache.needsVerification(key, .2, 2))
+
+    def testExpire(self):
+        self.cache.verified(None, makeFace([0., 0., 1.], (0, 0, 10, 10)),
+                            True, 1)
+        self.cache.verified(None, makeFace([1., 0., 0.], (50, 0, 10, 10)),
+                            True, 4)
+        self.assertEqual(len(self.cache), 2)
+
+        # the first one is too old
+        self.cache.match([], 7)
+        self.assertEqual(len(self.cache), 1)
+
+        # the least recently seen one is evicted when the cache is full
+        self.cache.verified(None, makeFace([0., 1., 0.], (100, 0, 10, 10)),
+                            True, 8)
+        self.cache.verified(None, makeFace([0., -1., 0.], (150, 0, 10, 10)),
+                            True, 8)
+        self.cache.match([], 8)
+        self.assertEqual(len(self.cache), 2)
+        self.assertEqual([entry.lastSeen for entry
+                          in self.cache.entries.values()], [8, 8])
+
+    def testPendingFaceIsNotSubmittedAgain(self):
+        face = makeFace([0., 0., 1.], (0, 0, 10, 10))
+        key = self.cache.submitted(None, face, 1)
+
+        # the recognizer didn't answer yet, the next frames wait for it
+        newFace = makeFace([0., 0.001, 1.], (1, 0, 10, 10))
+        (matched, confidence), = self.cache.match([newFace], 2)
+        self.assertEqual(matched, key)
+        self.assertFalse(self.cache.needsVerification(key, confidence, 9))
+        self.cache.wait(key, 2, 0)
+
+        face.name = "Alice"
+        self.assertEqual(self.cache.verified(key, face, True, 1),
+                         (key, [(2, 0)]))
+        self.assertFalse(self.cache.get(key).pending)
+        self.assertEqual(self.cache.get(key).name, "Alice")
+
+    def testPendingEntriesDontExpire(self):
+        key = self.cache.submitted(None, makeFace([0., 0., 1.],
+                                                  (0, 0, 10, 10)), 1)
+        self.cache.match([], 20)
+
+        self.assertTrue(self.cache.get(key).pending)
+
+    def testFullCacheKeepsTheKeysOfAFrame(self):
+        self.cache.verified(None, makeFace([0., 0., 1.], (0, 0, 10, 10),
+                                           "Alice"), True, 1)
+        self.cache.verified(None, makeFace([1., 0., 0.], (50, 0, 10, 10),
+                                           "Bob"), True, 2)
+
+        # a new face, then one matching the least recently seen entry
+        faces = [makeFace([0., 1., 0.], (100, 0, 10, 10)),
+                 makeFace([0., 0., 1.], (0, 0, 10, 10))]
+        (newKey, _), (key, confidence) = self.cache.match(faces, 3)
+        self.assertIsNone(newKey)
+        self.cache.submitted(newKey, faces[0], 3)
+        self.assertFalse(self.cache.needsVerification(key, confidence, 3))
+        self.cache.seen(key, faces[1], 3)
+
+        self.assertEqual(faces[1].name, "Alice")
+        # the extra entry goes when the next frame is matched
+        self.cache.match([], 4)
+        self.assertEqual(len(self.cache), 2)
@@ -1,7 +1,12 @@
 import unittest
 import os.path
+from time import sleep
 from context import faceRecognizerHandler as FRH
+from context import frameDispatcher
+from context import frameStore
 from context import objects
+from context import raycast
+from context import resultBatch
 from context import const
 
 import os
@@ -9,51 +14,46 @@ os.chdir("FORHD")
 
 class TestFRH(unittest.TestCase):
 
-    frh = FRH.FaceRecognizerHandler()
+    frh = FRH.FaceRecognizerHandler(frameStore.FrameStore())
 
     def test_write(self):
-        IMGPATH = "randomImgPath"
-        MATSPATH = "randomMatsPath"
-
-        self.frh.write(self, imgpath = IMGPATH, matspath = MATSPATH)
-        self.assertEquals(self.frh.nextPhoto.value, IMGPATH+"\n")
-        self.assertEquals(self.frh.nextMats.value, MATSPATH)
+        SLOT = 3
+        SEQ = 11
+
+        # faceMaker takes the frames of the dispatcher it was started with,
+        # write to one nobody else takes from
+        dispatcher = self.frh.dispatcher
+        self.frh.dispatcher = frameDispatcher.FrameDispatcher()
+        try:
+            self.frh.write(self, slot = SLOT, seq = SEQ)
+            self.assertEqual(self.frh.dispatcher.take(timeout = 0),
+                             (SLOT, SEQ))
+        finally:
+            self.frh.dispatcher = dispatcher
 
     def testGetFaceFilepath(self):
         filepath = self.frh.getFaceFilepath()
         self.assertFalse(os.path.isfile(filepath))
-
-    def testEmptyRecognizedFaces(self):
-        self.frh.emptyRecognizedFaces()
-        self.assertFalse(self.frh.hasRecognizedFaces())
-
-    def testEmptyUnknownFaces(self):
-        self.frh.emptyUnknownFaces()
-        self.assertFalse(self.frh.hasUnknownFaces())
-
-    def testAddGetHasRecognizedFace(self):
-        self.frh.emptyRecognizedFaces()
-        filepath = "dummy"
-        raycast = Raycast("dummy", 0, (0,0,0), (0,0,0))
-        addedFace = objects.Face("dummy", raycast)
-        self.frh.addRecognizedFace(addedFace)
-
-        self.assertTrue(self.frh.hasRecognizedFaces())
-        face = self.frh.getRecognizedFace()
-
-        self.assertEquals(face, addedFace)
-
-    def testAddGetHasUnknownFace(self):
-        self.frh.emptyUnknownFaces()
-        filepath = "dummy"
-        raycast = Raycast("dummy", 0, (0,0,0), (0,0,0))
-        addedFace = objects.Face("dummy", raycast)
-        self.frh.addUnknownFace(addedFace)
-
-        self.assertTrue(self.frh.hasUnknownFaces())
-        face = self.frh.getUnknownFace()
-
-        self.assertEquals(face, addedFace)
+        self.assertTrue(filepath.startswith(const.FACEDIR))
+        self.assertNotEqual(self.frh.getFaceFilepath(), filepath)
+
+    def testAddTakeDoneFrames(self):
+        self.frh.takeFrames()
+        ray = raycast.Raycast("Unknown face", 0, (0,0,0), (0,0,1), 5)
+        faces = [objects.Face("dummy", ray, "Ada")]
+        self.frh.addDoneFrame(resultBatch.FaceBatch.fromFaces(5, faces,
+                                                              [True]))
+        self.frh.addDoneFrame(resultBatch.FaceBatch.fromFaces(6, [], []))
+
+        # the queue is fed by a thread
+        sleep(0.1)
+        self.assertTrue(self.frh.hasDoneFrames())
+        batches = self.frh.takeFrames()
+
+        self.assertEqual([batch.frameId for batch in batches], [5, 6])
+        self.assertEqual([face.name for face in batches[0].faces()[0]],
+                         ["Ada"])
+        self.assertFalse(self.frh.hasDoneFrames())
 
     def testClose(self):
         self.frh.close()
@@ -0,0 +1,94 @@
+import unittest
+import queue
+import sys
+from context import faceRecognizerPool
+from context import const
+
+# stands for faceRecognizer: it knows alice, doesn't know anybody else, dies
+# when given crash and gets stuck when given hang
+FAKERECOGNIZER = """
+import sys
+import time
+while True:
+    print(%r, flush = True)
+    path = sys.stdin.readline().strip()
+    if path in ("Stop", ""):
+        break
+    if path == "crash":
+        sys.exit(1)
+    if path == "hang":
+        time.sleep(60)
+    print("Alice" if path == "alice" else %r, flush = True)
+""" % (const.FACERECOGNIZERPROMPT, const.FACERECOGNIZERUNKNOWN)
+
+class FakeWorker(faceRecognizerPool.RecognizerWorker):
+
+    def start(self):
+        self.faceRecognizer = faceRecognizerPool.Popen(
+            [sys.executable, "-c", FAKERECOGNIZER],
+            stdin = faceRecognizerPool.PIPE, stdout = faceRecognizerPool.PIPE,
+            bufsize = 1, universal_newlines = True)
+
+class UnrestartableWorker(FakeWorker):
+
+    def start(self):
+        if self.faceRecognizer is not None:
+            raise OSError("no more faceRecognizer")
+        super().start()
+
+class TestFaceRecognizerPool(unittest.TestCase):
+
+    def setUp(self):
+        self.startPool([FakeWorker(i, verbose = False, timeout = 0.5)
+                        for i in range(2)])
+
+    def startPool(self, workers):
+        self.results = queue.Queue()
+        self.pool = faceRecognizerPool.FaceRecognizerPool(len(workers),
+                                                          self.results,
+                                                          verbose = False)
+        self.pool.workers = workers
+        self.pool.start()
+
+    def tearDown(self):
+        self.pool.close()
+
+    def getResults(self, n):
+        return dict(self.results.get(timeout = 5) for _ in range(n))
+
+    def testRecognize(self):
+        self.pool.submit(1, "alice")
+        self.pool.submit(2, "bob")
+
+        self.assertEqual(self.getResults(2), {1: "Alice", 2: None})
+
+    def testRestartOnCrash(self):
+        self.pool.submit(1, "crash")
+        self.pool.submit(2, "alice")
+        self.pool.submit(3, "alice")
+
+        results = self.getResults(3)
+
+        # the crashing face is given up on after FACERECOGNIZERRETRIES
+        self.assertEqual(results, {1: None, 2: "Alice", 3: "Alice"})
+        self.assertEqual(sum(worker.restarts for worker in self.pool.workers),
+                         const.FACERECOGNIZERRETRIES + 1)
+        self.assertTrue(all(worker.isHealthy()
+                            for worker in self.pool.workers))
+
+    def testKillStuckRecognizer(self):
+        self.pool.submit(1, "hang")
+        self.pool.submit(2, "alice")
+
+        self.assertEqual(self.getResults(2), {1: None, 2: "Alice"})
+        self.assertEqual(sum(worker.restarts for worker in self.pool.workers),
+                         const.FACERECOGNIZERRETRIES + 1)
+
+    def testResultWhenRestartFails(self):
+        self.pool.close()
+        self.startPool([UnrestartableWorker(0, verbose = False)])
+
+        self.pool.submit(1, "crash")
+        self.pool.submit(2, "alice")
+
+        self.assertEqual(self.getResults(2), {1: None, 2: None})
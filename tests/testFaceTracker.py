@@ -0,0 +1,75 @@
+import unittest
+import numpy as np
+from context import faceTracker
+
+class FakeCascade:
+    """ Stands for a cv2.CascadeClassifier, returning the given faces and
+        remembering the shape of the images it was given
+    """
+
+    def __init__(self, faces):
+        self.faces = faces
+        self.shapes = []
+
+    def detectMultiScale(self, img, scaleFactor, minNeighbors, **kw):
+        self.shapes.append(img.shape)
+        return self.faces
+
+class TestFaceTracker(unittest.TestCase):
+
+    def setUp(self):
+        self.img = np.random.RandomState(0).randint(0, 255, (720, 1280),
+                                                    dtype = np.uint8)
+
+    def testDetectMapsBackToFullResolution(self):
+        cascade = FakeCascade([(10, 20, 30, 40)])
+        tracker = faceTracker.FaceTracker(cascade, period = 3, scale = .5)
+
+        self.assertEqual(tracker.update(self.img), [(20, 40, 60, 80)])
+        self.assertEqual(cascade.shapes, [(360, 640)])
+
+    def testDetectOnGivenDownscaledPhoto(self):
+        cascade = FakeCascade([(10, 20, 30, 40)])
+        tracker = faceTracker.FaceTracker(cascade, period = 3, scale = .5)
+        # not the size img would be downscaled to, to tell them apart
+        small = np.zeros((100, 200), dtype = np.uint8)
+
+        self.assertEqual(tracker.update(self.img, small), [(20, 40, 60, 80)])
+        self.assertEqual(cascade.shapes, [(100, 200)])
+
+    def testCascadeOnlyRunsAroundFacesBetweenDetections(self):
+        cascade = FakeCascade([(100, 100, 50, 50)])
+        tracker = faceTracker.FaceTracker(cascade, period = 3, scale = .5,
+                                          margin = .5)
+
+        tracker.update(self.img)
+        # the face is at (200, 200, 100, 100) at full resolution, the ROI is
+        # (150, 150) to (350, 350) and the cascade finds the face at 100, 100
+        # in it
+        self.assertEqual(tracker.update(self.img), [(250, 250, 50, 50)])
+        self.assertEqual(cascade.shapes[1], (200, 200))
+
+        tracker.update(self.img)
+        # the period is over, back to a full detection
+        tracker.update(self.img)
+        self.assertEqual(cascade.shapes[3], (360, 640))
+
+    def testFollowByTemplateWhenTheCascadeMissesTheFace(self):
+        cascade = FakeCascade([(100, 100, 50, 50)])
+        tracker = faceTracker.FaceTracker(cascade, period = 5, scale = .5)
+        tracker.update(self.img)
+
+        cascade.faces = []
+        moved = np.roll(self.img, (5, -3), axis = (0, 1))
+        self.assertEqual(tracker.update(moved), [(197, 205, 100, 100)])
+
+    def testLoseFaceThatCantBeFollowed(self):
+        cascade = FakeCascade([(100, 100, 50, 50)])
+        tracker = faceTracker.FaceTracker(cascade, period = 5, scale = .5)
+        tracker.update(self.img)
+
+        cascade.faces = []
+        other = np.random.RandomState(1).randint(0, 255, (720, 1280),
+                                                 dtype = np.uint8)
+        self.assertEqual(tracker.update(other), [])
+        self.assertEqual(tracker.boxes, [])
@@ -0,0 +1,59 @@
+import unittest
+import os, os.path
+import sys
+import tempfile
+from context import fakeDarknet, detectorBackend, frameStore, httpHandler
+from context import replay
+
+class StandInBackend(detectorBackend.DarknetBackend):
+    """ DarknetBackend driving the stand-in instead of darknet """
+
+    def __init__(self, directory):
+        self.feedpath = os.path.join(directory, "feed")
+        self.detectionspath = os.path.join(directory, "detections")
+        env = dict(os.environ, FORHD_FAKEDARKNET_DELAY = "0",
+                   FORHD_FAKEDARKNET_OBJECTS = "3")
+        self.yolo = detectorBackend.Popen(
+            [sys.executable, "-m", "bench.fakeDarknet", "-feed", self.feedpath,
+             "-detections", self.detectionspath],
+            stdin = detectorBackend.PIPE, bufsize = 1,
+            universal_newlines = True, env = env,
+            cwd = os.path.dirname(os.path.dirname(fakeDarknet.__file__)))
+
+class TestFakeDarknet(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = frameStore.FrameStore(nslots = 2)
+        self.backend = StandInBackend(self.directory.name)
+        self.backend.start()
+
+    def tearDown(self):
+        self.backend.close()
+        self.backend.yolo.wait()
+        self.backend.yolo.stdin.close()
+        self.backend.feedpipe.close()
+        self.backend.detectionspipe.close()
+        self.store.close()
+        self.directory.cleanup()
+
+    def testFindArg(self):
+        argv = ["darknet", "detector", "-feed", "/tmp/feed3"]
+
+        self.assertEqual(fakeDarknet.findArg(argv, "-feed", None),
+                         "/tmp/feed3")
+        self.assertEqual(fakeDarknet.findArg(argv, "-detections", "default"),
+                         "default")
+
+    def testDetect(self):
+        rawImage, projection, world = httpHandler.HttpHandler.splitImageMats(
+            replay.syntheticPayload((320, 240)))
+        img = httpHandler.HttpHandler.decodePhoto(rawImage)
+        for _ in range(2):
+            slot, seq = self.store.put(img, projection, world)
+            objects2D = self.backend.detect(self.store, slot, seq)
+
+            self.assertEqual(len(objects2D), 3)
+            for object2D in objects2D:
+                self.assertTrue(0 <= object2D.x <= 320)
+                self.assertTrue(0 <= object2D.y <= 240)
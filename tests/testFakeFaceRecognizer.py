@@ -0,0 +1,37 @@
+import unittest
+import os, os.path
+import sys
+from context import fakeFaceRecognizer, faceRecognizerPool
+
+class StandInWorker(faceRecognizerPool.RecognizerWorker):
+    """ RecognizerWorker driving the stand-in instead of faceRecognizer """
+
+    def __init__(self, unknown, *args, **kwargs):
+        faceRecognizerPool.RecognizerWorker.__init__(self, *args, **kwargs)
+        self.unknown = unknown
+
+    def start(self):
+        env = dict(os.environ, FORHD_FAKERECOGNIZER_DELAY = "0",
+                   FORHD_FAKERECOGNIZER_UNKNOWN = self.unknown)
+        self.faceRecognizer = faceRecognizerPool.Popen(
+            [sys.executable, "-m", "bench.fakeFaceRecognizer"],
+            stdin = faceRecognizerPool.PIPE, stdout = faceRecognizerPool.PIPE,
+            bufsize = 1, universal_newlines = True, env = env,
+            cwd = os.path.dirname(os.path.dirname(fakeFaceRecognizer.__file__)))
+
+class TestFakeFaceRecognizer(unittest.TestCase):
+
+    def recognize(self, unknown, n):
+        worker = StandInWorker(unknown, 0, verbose = False)
+        worker.start()
+        try:
+            return [worker.recognize("face%d.pgm" % i) for i in range(n)]
+        finally:
+            worker.stop()
+
+    def testRecognized(self):
+        for name in self.recognize("0", 5):
+            self.assertIn(name, fakeFaceRecognizer.FAKERECOGNIZERNAMES)
+
+    def testUnknown(self):
+        self.assertEqual(self.recognize("1", 3), [None] * 3)
@@ -0,0 +1,60 @@
+import unittest
+from multiprocessing import Process, Queue
+from context import frameDispatcher
+
+def consume(dispatcher, results):
+    results.put(dispatcher.take(timeout = 5))
+
+class TestFrameDispatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.dispatcher = frameDispatcher.FrameDispatcher()
+
+    def testTakeLastFrame(self):
+        self.dispatcher.publish(1, 1)
+        self.dispatcher.publish(2, 2)
+
+        self.assertEqual(self.dispatcher.take(), (2, 2))
+        self.assertEqual(self.dispatcher.peek()["published"], 2)
+        self.assertEqual(self.dispatcher.peek()["dropped"], 1)
+
+    def testTakeTimeout(self):
+        self.assertIsNone(self.dispatcher.take(timeout = 0.01))
+
+    def testTakeOnce(self):
+        self.dispatcher.publish(1, 1)
+        self.dispatcher.take()
+
+        self.assertIsNone(self.dispatcher.take(timeout = 0.01))
+
+    def testWakeUpConsumer(self):
+        results = Queue()
+        consumer = Process(target = consume, args = (self.dispatcher, results))
+        consumer.start()
+        self.dispatcher.publish(3, 11)
+        consumer.join()
+
+        self.assertEqual(results.get(timeout = 1), (3, 11))
+        self.assertEqual(self.dispatcher.peek()["dropped"], 0)
+
+    def testOnTake(self):
+        taken = []
+        self.dispatcher.publish(3, 11)
+
+        self.dispatcher.take(
+            onTake = lambda slot, seq: taken.append((slot, seq)))
+
+        self.assertEqual(taken, [(3, 11)])
+
+    def testRoundRobin(self):
+        self.dispatcher.publish(1, 1, session = 0)
+        self.dispatcher.publish(2, 2, session = 0)
+        self.dispatcher.publish(5, 3, session = 1)
+        self.dispatcher.publish(9, 4, session = 2)
+
+        self.assertEqual(self.dispatcher.take(), (2, 2))
+        self.dispatcher.publish(3, 5, session = 0)
+        self.assertEqual(self.dispatcher.take(), (5, 3))
+        self.assertEqual(self.dispatcher.take(), (9, 4))
+        self.assertEqual(self.dispatcher.take(), (3, 5))
+        self.assertEqual(self.dispatcher.peek()["dropped"], 1)
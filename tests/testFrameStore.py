@@ -0,0 +1,90 @@
+import unittest
+import numpy as np
+import cv2
+from context import frameStore
+
+def photo(value, width = 8, height = 6):
+    """ A BGR photo whose pixels are (value, value+1, value+2) """
+    return np.full((height, width, 3), (value, value+1, value+2),
+                   dtype = np.uint8)
+
+class TestFrameStore(unittest.TestCase):
+
+    def setUp(self):
+        self.store = frameStore.FrameStore(nslots = 2, slotsize = 256)
+        self.projection = np.arange(16.).reshape(4, 4)
+        self.world = np.eye(4)
+
+    def tearDown(self):
+        self.store.close()
+
+    def testPutGet(self):
+        slot, seq = self.store.put(photo(10), self.projection, self.world)
+
+        self.assertTrue(self.store.isValid(slot, seq))
+        self.assertEqual(self.store.size(slot), (8, 6))
+        # pixels are stored as RGB
+        np.testing.assert_array_equal(self.store.image(slot)[0, 0],
+                                      (12, 11, 10))
+        mats = self.store.mats(slot)
+        np.testing.assert_array_equal(mats.projection, self.projection)
+        np.testing.assert_array_equal(mats.world, self.world)
+
+    def testPathIsPPM(self):
+        slot, _ = self.store.put(photo(10), self.projection, self.world)
+
+        np.testing.assert_array_equal(cv2.imread(self.store.path(slot)),
+                                      photo(10))
+        np.testing.assert_array_equal(cv2.imread(self.store.path(slot, 2)),
+                                      photo(10, 4, 3))
+
+    def testDownscaled(self):
+        img = photo(10)
+        img[:, :4] = 0
+        slot, _ = self.store.put(img, self.projection, self.world)
+
+        self.assertEqual(self.store.size(slot, 2), (4, 3))
+        small = self.store.image(slot, 2)
+        self.assertEqual(small.shape, (3, 4, 3))
+        np.testing.assert_array_equal(small[:, :2], 0)
+        np.testing.assert_array_equal(small[0, 3], (12, 11, 10))
+
+    def testOverwrittenFrameIsInvalid(self):
+        slot, seq = self.store.put(photo(1), self.projection, self.world)
+        self.store.put(photo(2), self.projection, self.world)
+        self.store.put(photo(3), self.projection, self.world)
+
+        self.assertFalse(self.store.isValid(slot, seq))
+        np.testing.assert_array_equal(self.store.image(slot)[0, 0], (5, 4, 3))
+
+    def testRings(self):
+        # the segments are named after the process, so one store at a time
+        self.store.close()
+        self.store = frameStore.FrameStore(nslots = 2, slotsize = 256,
+                                           nrings = 2)
+        first, _ = self.store.put(photo(1), self.projection, self.world,
+                                  ring = 1, camsize = (1280., 720.))
+        self.store.put(photo(2), self.projection, self.world, ring = 0)
+        self.store.put(photo(3), self.projection, self.world, ring = 0)
+        self.store.put(photo(4), self.projection, self.world, ring = 0)
+
+        self.assertEqual(self.store.ringOf(first), 1)
+        self.assertEqual(self.store.generation(first), 0)
+        np.testing.assert_array_equal(self.store.image(first)[0, 0],
+                                      (3, 2, 1))
+        self.assertEqual(self.store.mats(first).camsize, (1280., 720.))
+
+    def testGeneration(self):
+        slot, _ = self.store.put(photo(1), self.projection, self.world,
+                                 generation = 7)
+
+        self.assertEqual(self.store.generation(slot), 7)
+
+    def testNoCamsize(self):
+        slot, _ = self.store.put(photo(1), self.projection, self.world)
+
+        self.assertIsNone(self.store.mats(slot).camsize)
+
+    def testTooBigImage(self):
+        with self.assertRaises(ValueError):
+            self.store.put(photo(1, 16, 16), self.projection, self.world)
@@ -0,0 +1,44 @@
+import unittest
+from context import frameWindow
+
+class TestFrameWindow(unittest.TestCase):
+
+    def setUp(self):
+        self.window = frameWindow.FrameWindow(size = 3)
+
+    def testFrameDoneOnceAllStagesAreOver(self):
+        self.window.open(1)
+        self.window.complete(1, frameWindow.OBJECTSTAGE)
+        self.assertTrue(self.window.isPending(1))
+
+        self.window.complete(1, frameWindow.FACESTAGE)
+        self.assertFalse(self.window.isPending(1))
+        self.assertIsNotNone(self.window.lastLatency)
+
+    def testSkippedFramesAreDropped(self):
+        self.window.open(1)
+        self.window.open(2)
+        for stage in frameWindow.STAGES:
+            self.window.complete(2, stage)
+
+        self.assertFalse(self.window.isPending(1))
+        self.assertFalse(self.window.isPending(2))
+        self.assertEqual(self.window.dropped, 1)
+
+    def testNewerFramesStayPending(self):
+        self.window.open(1)
+        self.window.open(2)
+        for stage in frameWindow.STAGES:
+            self.window.complete(1, stage)
+
+        self.assertFalse(self.window.isPending(1))
+        self.assertTrue(self.window.isPending(2))
+
+    def testWindowIsBounded(self):
+        for frameId in range(1, 6):
+            self.window.open(frameId)
+
+        self.assertEqual(len(self.window), 3)
+        self.assertEqual(self.window.expired, 2)
+        self.assertFalse(self.window.isPending(1))
+        self.assertTrue(self.window.isPending(5))
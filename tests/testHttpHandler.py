@@ -0,0 +1,222 @@
+import unittest
+from http.client import HTTPConnection
+from http.server import ThreadingHTTPServer
+from threading import Thread
+import numpy as np
+from context import httpHandler
+from context import frameStore
+from context import raycast
+from context import resultBatch
+from context import rayEncoding
+from context import replay
+from context import const
+
+MATSSTRING = "Projection:1.5 0 0.1 0\n0 2.6 0.2 0\n0 0 -1 0\n0 0 -1 0\n;"\
+             "World:0 0.1 -1 0.5\n0.1 1 0 1.2\n1 0 0 -0.3\n0 0 0 1\n"
+
+class TestSplitImageMats(unittest.TestCase):
+
+    photo = b"\xff\xd8jpeg\x00bytes\xff\xd9"
+
+    def testTextFormat(self):
+        upload = len(self.photo).to_bytes(4, 'little') + self.photo +\
+                 MATSSTRING.encode("utf8") + b"\x00"
+        rawImage, projection, world =\
+            httpHandler.HttpHandler.splitImageMats(upload)
+
+        self.assertEqual(bytes(rawImage), self.photo)
+        self.assertEqual(projection[1][1], 2.6)
+        self.assertEqual(world[0][3], 0.5)
+
+    def testBinaryFormat(self):
+        projection = np.arange(16, dtype = np.float32).reshape(4, 4)
+        world = np.eye(4, dtype = np.float32)
+        upload = httpHandler.UPLOADHEADER.pack(const.UPLOADMAGIC,
+                                               const.UPLOADVERSION, 0,
+                                               len(self.photo)) +\
+                 self.photo + projection.tobytes() + world.tobytes()
+        rawImage, parsedProjection, parsedWorld =\
+            httpHandler.HttpHandler.splitImageMats(upload)
+
+        self.assertIsInstance(rawImage, memoryview)
+        self.assertEqual(bytes(rawImage), self.photo)
+        np.testing.assert_array_equal(parsedProjection, projection)
+        np.testing.assert_array_equal(parsedWorld, world)
+
+    def testDecodePhoto(self):
+        _, photo = httpHandler.cv2.imencode(".png",
+                                            np.full((6, 8, 3), 7, np.uint8))
+
+        img = httpHandler.HttpHandler.decodePhoto(memoryview(photo.tobytes()))
+
+        self.assertEqual(img.shape, (6, 8, 3))
+        with self.assertRaises(ValueError):
+            httpHandler.HttpHandler.decodePhoto(self.photo)
+
+    def testMalformedTextMats(self):
+        for mats in (b"1 2 3", b"Projection:1 2;World:3", b"\xff\xfe",
+                     MATSSTRING[:40].encode("utf8")):
+            upload = len(self.photo).to_bytes(4, 'little') + self.photo + mats
+            with self.assertRaises(ValueError):
+                httpHandler.HttpHandler.splitImageMats(upload)
+
+    def testTruncatedBinaryHeader(self):
+        with self.assertRaises(ValueError):
+            httpHandler.HttpHandler.splitImageMats(const.UPLOADMAGIC + b"\x01")
+
+    def testUnknownVersion(self):
+        upload = httpHandler.UPLOADHEADER.pack(const.UPLOADMAGIC, 99, 0, 0) +\
+                 bytes(128)
+        with self.assertRaises(ValueError):
+            httpHandler.HttpHandler.splitImageMats(upload)
+
+class TestParseMilliseconds(unittest.TestCase):
+
+    def testValid(self):
+        parse = httpHandler.HttpHandler.parse_milliseconds
+        self.assertEqual(parse("1500"), 1.5)
+        self.assertEqual(parse(0), 0.)
+
+    def testInvalid(self):
+        for value in ("abc", "", "-5", "nan", "inf", None):
+            with self.assertRaises(ValueError):
+                httpHandler.HttpHandler.parse_milliseconds(value)
+
+class StubHandler:
+    """ Stands for the yoloHandler and the faceRecognizerHandler, handing
+        over the frames put in frames
+    """
+
+    def __init__(self):
+        self.frames = []
+
+    def takeFrames(self):
+        frames = self.frames
+        self.frames = []
+        return frames
+
+class TestServer(unittest.TestCase):
+    """ Run the server, with stand-ins for the handlers, on an ephemeral port
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        handler = httpHandler.HttpHandler
+        cls.saved = (handler.yoloHandler, handler.faceRecognizerHandler,
+                     handler.frameStore, handler.verbose)
+        handler.frameStore = frameStore.FrameStore(nslots = 2,
+                                                   slotsize = 64*48*3,
+                                                   nrings = const.MAXSESSIONS)
+        handler.yoloHandler = StubHandler()
+        handler.faceRecognizerHandler = StubHandler()
+        handler.verbose = False
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        cls.server.daemon_threads = True
+        cls.thread = Thread(target = cls.server.serve_forever, daemon = True)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        handler = httpHandler.HttpHandler
+        handler.frameStore.close()
+        handler.yoloHandler, handler.faceRecognizerHandler,\
+            handler.frameStore, handler.verbose = cls.saved
+
+    def setUp(self):
+        # a request left without an answer fails instead of hanging
+        self.connection = HTTPConnection(*self.server.server_address,
+                                         timeout = 5)
+        self.headers = {const.SESSIONHEADER: self.id()}
+
+    def tearDown(self):
+        self.connection.close()
+
+    def request(self, method, path = "/", body = None, decode = True):
+        """ Send a request on our connection and return its status and body
+        """
+        self.connection.request(method, path, body, self.headers)
+        response = self.connection.getresponse()
+        body = response.read()
+        return response.status, body.decode("utf8") if decode else body
+
+    def pushRays(self, frameId):
+        """ Make the stand-in detector find a known chair and a new cup in
+            frameId and move them to the listeners
+        """
+        handler = httpHandler.HttpHandler
+        handler.sessions.addFrame(frameId, handler.get_session(self.id()))
+        rays = [raycast.Raycast("chair", .5, [0., 0., 0.], [0., 0., -2.],
+                                frameId),
+                raycast.Raycast("cup", .5, [0., 0., 0.], [1., 0., 0.],
+                                frameId)]
+        handler.yoloHandler.frames.append(
+            resultBatch.RayBatch.fromRaycasts(frameId, rays))
+        handler.collect_results()
+
+    def testOneAnswerPerRequestOnOneConnection(self):
+        self.assertEqual(self.request("POST", body = "letsgo"),
+                         (200, "PhotoRequest"))
+        sock = self.connection.sock
+        session = httpHandler.HttpHandler.get_session(self.id())
+        httpHandler.HttpHandler.sessions.addFrame(1000, session)
+        ray = raycast.Raycast("chair", .5, [0., 0., 0.], [1., 2., 3.], 1000)
+        httpHandler.HttpHandler.yoloHandler.frames.append(
+            resultBatch.RayBatch.fromRaycasts(1000, [ray]))
+        self.assertEqual(self.request("POST", body = "whatever"),
+                         (200, "Good"))
+        self.assertEqual(self.request("GET"), (200, "Good"))
+        self.assertEqual(self.request("POST", body = "nextrays"),
+                         (200, "rays:ray:chair;0.5;0.0,0.0,0.0;1.0,2.0,3.0"))
+        self.assertEqual(self.request("POST", body = "nextrays"),
+                         (200, "rays:"))
+        # all the requests went through the same connection
+        self.assertIs(self.connection.sock, sock)
+
+    def testInvalidWaitResultsIsIgnored(self):
+        self.headers[const.WAITRESULTSHEADER] = "soon"
+        self.connection.request("PUT", "/", replay.syntheticPayload((64, 48)),
+                                self.headers)
+        response = self.connection.getresponse()
+        response.read()
+
+        self.assertEqual(response.status, 200)
+        self.assertIsNotNone(response.getheader(const.FRAMEIDHEADER))
+
+    def testPollCullsKnownObjects(self):
+        path = const.POLLPATH + "?id=poller&timeout="
+        self.assertEqual(self.request("GET", path + "0"), (200, "rays:"))
+        self.assertEqual(self.request("POST", body = "obj\nchair;1;0;0;-1"),
+                         (200, "Good"))
+        self.pushRays(1001)
+
+        self.assertEqual(self.request("GET", path + "0"),
+                         (200, "rays:ray:cup;0.5;0.0,0.0,0.0;1.0,0.0,0.0"))
+
+    def testListenersGetTheResultsOnce(self):
+        path = const.POLLPATH + "?id=poller&timeout="
+        self.request("GET", path + "0")
+        self.pushRays(1003)
+
+        self.assertEqual(self.request("POST", body = "nextrays"),
+                         (200, "rays:"))
+        self.assertNotEqual(self.request("GET", path + "0"), (200, "rays:"))
+
+    def testPollSendsBinaryRays(self):
+        path = const.POLLPATH + "?id=poller&timeout="
+        self.request("GET", path + "0")
+        self.assertEqual(self.request("POST", body = "settingBINARYRAYStrue"),
+                         (200, "Good"))
+        self.request("POST", body = "obj\nchair;1;0;0;-1")
+        self.pushRays(1002)
+
+        status, body = self.request("GET", path + "0", decode = False)
+        labels, records = rayEncoding.decodeRays(body)
+        self.assertEqual(status, 200)
+        self.assertEqual([labels[label] for label in records["label"]],
+                         ["cup"])
+
+    def testPollInvalidTimeout(self):
+        self.assertEqual(
+            self.request("GET", const.POLLPATH + "?timeout=soon")[0], 400)
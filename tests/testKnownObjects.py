@@ -0,0 +1,61 @@
+import unittest
+import numpy as np
+from context import knownObjects
+from context import objects
+from context import raycast
+from context import resultBatch
+
+def ray(label, direction):
+    return raycast.Raycast(label, 0.5, np.array([0., 0., 0., 1.]),
+                           np.append(direction, 1.), 1)
+
+def batch(*rays):
+    return resultBatch.RayBatch.fromRaycasts(1, list(rays))
+
+class TestKnownObjects(unittest.TestCase):
+
+    def setUp(self):
+        self.known = knownObjects.KnownObjects(tolerance = .3)
+        self.known.update(knownObjects.KnownObjects.parse(
+            "obj\nchair;0.5;0;0;3\ncup;0.7;1;0;2\nnot an object\n"))
+
+    def testParse(self):
+        objs = knownObjects.KnownObjects.parse("obj\nchair;0.5;1;2;3\n"
+                                               "chair;x;1;2;3\n")
+
+        self.assertEqual(len(objs), 1)
+        self.assertEqual((objs[0].label, objs[0].x, objs[0].y, objs[0].z),
+                         ("chair", 1., 2., 3.))
+        self.assertEqual(len(self.known), 2)
+
+    def testCullRays(self):
+        rays = [ray("chair", [0., 0., 1.]),
+                # passes 0.5m away from the chair
+                ray("chair", [.5/3, 0., 1.]),
+                # right through the chair, but another label
+                ray("cup", [0., 0., 1.]),
+                ray("cup", [.5, 0., 1.]),
+                ray("person", [0., 0., 1.])]
+
+        kept = self.known.cullRays(batch(*rays))
+
+        self.assertEqual(kept.raycasts(), [rays[1], rays[2], rays[4]])
+
+    def testObjectBehindTheCameraIsNotHit(self):
+        self.assertEqual(len(self.known.cullRays(batch(ray("chair",
+                                                           [0., 0., -1.])))),
+                         1)
+
+    def testCullObjects(self):
+        objs = [objects.Object3D("chair", 0.5, 0., 0.1, 3., 0, 0),
+                objects.Object3D("chair", 0.5, 0., 1., 3., 0, 0),
+                objects.Object3D("person", 0.5, 0., 0., 3., 0, 0)]
+
+        self.assertEqual(self.known.cullObjects(objs), objs[1:])
+
+    def testUpdateReplaces(self):
+        self.known.update([])
+
+        self.assertEqual(len(self.known.cullRays(batch(ray("chair",
+                                                           [0., 0., 1.])))),
+                         1)
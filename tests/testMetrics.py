@@ -0,0 +1,52 @@
+import unittest
+from multiprocessing import Process
+from context import metrics
+
+def observe(recorder, stage, seconds):
+    recorder.observe(stage, seconds)
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics = metrics.Metrics(buckets = (.01, .1, 1.), writers = 4)
+
+    def testBuckets(self):
+        self.metrics.observe(metrics.DETECTSTAGE, .05)
+        self.metrics.observe(metrics.DETECTSTAGE, .5)
+        self.metrics.observe(metrics.DETECTSTAGE, 2.)
+
+        counts, total = self.metrics.histograms()[metrics.DETECTSTAGE]
+        self.assertEqual(list(counts), [0, 1, 2, 3])
+        self.assertAlmostEqual(total, 2.55)
+
+    def testOtherProcesses(self):
+        self.metrics.observe(metrics.HAARSTAGE, .05)
+        recorders = [Process(target = observe,
+                             args = (self.metrics, metrics.HAARSTAGE, .005))
+                     for _ in range(2)]
+        for recorder in recorders:
+            recorder.start()
+        for recorder in recorders:
+            recorder.join()
+
+        counts, _ = self.metrics.histograms()[metrics.HAARSTAGE]
+        self.assertEqual(list(counts), [2, 3, 3, 3])
+
+    def testTimer(self):
+        with self.metrics.time(metrics.RESPONSESTAGE):
+            pass
+
+        counts, _ = self.metrics.histograms()[metrics.RESPONSESTAGE]
+        self.assertEqual(counts[-1], 1)
+
+    def testRender(self):
+        self.metrics.observe(metrics.FRAMESTAGE, .05)
+
+        text = self.metrics.render([("forhd_queue_depth", "gauge", "Depth",
+                                     [({"queue": "faces"}, 3)])])
+
+        self.assertIn('forhd_stage_seconds_bucket{stage="frame",le="0.1"} 1',
+                      text)
+        self.assertIn('forhd_stage_seconds_count{stage="frame"} 1', text)
+        self.assertIn("# TYPE forhd_queue_depth gauge", text)
+        self.assertIn('forhd_queue_depth{queue="faces"} 3', text)
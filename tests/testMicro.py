@@ -0,0 +1,28 @@
+import unittest
+from context import micro
+
+class TestMicro(unittest.TestCase):
+
+    def testCompare(self):
+        baselines = {"fast": 1e-6, "slow": 1e-3}
+        timings = {"fast": 1.2e-6, "slow": 2e-3, "new": 5e-3}
+
+        self.assertEqual(micro.compare(timings, baselines, .3),
+                         [("slow", 2e-3, 1e-3)])
+
+    def testBenchmarksRun(self):
+        suite = micro.benchmarks()
+
+        self.assertIn("splitImageMats/binary/3MB", suite)
+        self.assertIn("fromObjects2D/500", suite)
+        for function in suite.values():
+            function()
+
+    def testBaselinesCoverSuite(self):
+        self.assertEqual(set(micro.loadBaselines()), set(micro.benchmarks()))
+
+    def testDetectionLines(self):
+        lines = micro.detectionLines(50)
+
+        self.assertEqual(len(lines), 50)
+        self.assertEqual(len(lines[0].split(";")), 6)
@@ -0,0 +1,39 @@
+import unittest
+from context import pacer
+
+class TestPacer(unittest.TestCase):
+
+    def setUp(self):
+        self.pacer = pacer.Pacer(inFlight = 2, maxRate = 10., maxDelay = 1.,
+                                 smoothing = .5)
+
+    def testMaxRateBeforeAnyFrame(self):
+        self.assertEqual(self.pacer.interval(), .1)
+        self.assertEqual(self.pacer.delay(0), .1)
+
+    def testIntervalFollowsLatency(self):
+        self.pacer.observe(.6)
+        self.assertAlmostEqual(self.pacer.interval(), .3)
+        self.pacer.observe(1.)
+        self.assertAlmostEqual(self.pacer.interval(), .4)
+        self.assertAlmostEqual(self.pacer.rate(), 2.5)
+
+    def testIntervalBounds(self):
+        self.pacer.observe(.01)
+        self.assertEqual(self.pacer.interval(), .1)
+        self.pacer.latency = 10.
+        self.assertEqual(self.pacer.interval(), 1.)
+
+    def testDelaySinceLastUpload(self):
+        self.pacer.observe(.6)
+        self.pacer.uploaded(now = 10.)
+
+        self.assertAlmostEqual(self.pacer.delay(1, now = 10.1), .2)
+        self.assertEqual(self.pacer.delay(1, now = 11.), 0.)
+
+    def testDelayWhenFallingBehind(self):
+        self.pacer.observe(.6)
+        self.pacer.uploaded(now = 10.)
+
+        self.assertAlmostEqual(self.pacer.delay(4, now = 10.), .9)
+        self.assertEqual(self.pacer.delay(10, now = 10.), 1.)
@@ -0,0 +1,98 @@
+import unittest
+import numpy as np
+from context import rayEncoding
+from context import raycast
+from context import objects
+from context import resultBatch
+
+class TestRayEncoding(unittest.TestCase):
+
+    def makeRaycast(self, label, frameId):
+        return raycast.Raycast(label, 0.5, np.array([1., 2., 3., 1.]),
+                               np.array([4., 5., 6., 1.]), frameId)
+
+    def makeBatch(self, frameId, *labels):
+        return resultBatch.RayBatch.fromRaycasts(
+            frameId, [self.makeRaycast(label, frameId) for label in labels])
+
+    def testEncodeDecode(self):
+        labelTable = rayEncoding.LabelTable()
+        rays = [self.makeRaycast("chair", 7), self.makeRaycast("cup", 7)]
+        recognized = [objects.Face("dummy", self.makeRaycast("face", 8),
+                                   "Alice")]
+
+        msg = rayEncoding.encodeRays(
+            labelTable, 0, [resultBatch.RayBatch.fromRaycasts(7, rays)],
+            [resultBatch.FaceBatch.fromFaces(8, recognized, [True])])
+        labels, records = rayEncoding.decodeRays(msg)
+
+        self.assertEqual(labels, {0: "chair", 1: "cup", 2: "Alice"})
+        self.assertEqual(len(records), 3)
+        self.assertEqual(list(records["kind"]),
+                         [rayEncoding.OBJECTRAY, rayEncoding.OBJECTRAY,
+                          rayEncoding.RECOGNIZEDFACE])
+        self.assertEqual(list(records["label"]), [0, 1, 2])
+        self.assertEqual(list(records["frame"]), [7, 7, 8])
+        np.testing.assert_allclose(records["near"][0], [1., 2., 3.])
+        np.testing.assert_allclose(records["far"][1], [4., 5., 6.])
+
+    def testOnlyNewLabelsAreSent(self):
+        labelTable = rayEncoding.LabelTable()
+        rayEncoding.encodeRays(labelTable, 0, [self.makeBatch(1, "chair")])
+
+        msg = rayEncoding.encodeRays(labelTable, len(labelTable),
+                                     [self.makeBatch(2, "chair", "cup")])
+        labels, records = rayEncoding.decodeRays(msg)
+
+        self.assertEqual(labels, {1: "cup"})
+        self.assertEqual(list(records["label"]), [0, 1])
+
+    def testEncodeNothing(self):
+        labels, records = rayEncoding.decodeRays(
+            rayEncoding.encodeRays(rayEncoding.LabelTable(), 0, []))
+        self.assertEqual(labels, {})
+        self.assertEqual(len(records), 0)
+
+    def testEncodeObjects(self):
+        objs = [objects.Object3D("chair", 0.5, 1., 2., 3., 0, 0)]
+
+        labels, records = rayEncoding.decodeRays(
+            rayEncoding.encodeRays(rayEncoding.LabelTable(), 0, [], [],
+                                   objs))
+
+        self.assertEqual(labels, {0: "chair"})
+        self.assertEqual(list(records["kind"]), [rayEncoding.OBJECTPOSITION])
+        np.testing.assert_allclose(records["near"][0], [1., 2., 3.])
+        np.testing.assert_allclose(records["far"][0], [1., 2., 3.])
+
+    def testFacesAndBatchLabels(self):
+        labelTable = rayEncoding.LabelTable()
+        labelTable.getId("Bob")
+        faces = [objects.Face("dummy", self.makeRaycast("Unknown face", 3),
+                              name, (0, 0, 1, 1))
+                 for name in ("Unknown", "Alice", "Unknown")]
+
+        labels, records = rayEncoding.decodeRays(rayEncoding.encodeRays(
+            labelTable, 1,
+            [self.makeBatch(2, "cup", "chair", "cup"), self.makeBatch(3)],
+            [resultBatch.FaceBatch.fromFaces(3, faces, [False, True, False])]))
+
+        # the ids of each batch are mapped to the ones of the table, the
+        # labels of the faces are their names, recognized faces come first
+        self.assertEqual(labels, {1: "cup", 2: "chair", 3: "Alice",
+                                  4: "Unknown"})
+        self.assertEqual(records["label"].tolist(), [1, 2, 1, 3, 4, 4])
+        self.assertEqual(records["kind"].tolist(),
+                         [rayEncoding.OBJECTRAY] * 3 +
+                         [rayEncoding.RECOGNIZEDFACE] +
+                         [rayEncoding.UNKNOWNFACE] * 2)
+        self.assertEqual(records["frame"].tolist(), [2, 2, 2, 3, 3, 3])
+
+    def testGetIds(self):
+        labelTable = rayEncoding.LabelTable()
+        labelTable.getId("person")
+        ids = labelTable.getIds(["tvmonitor", "person", "chair", "tvmonitor"])
+        self.assertEqual(ids.dtype, np.uint32)
+        self.assertEqual(ids.tolist(), [1, 0, 2, 1])
+        self.assertEqual(labelTable.labels, ["person", "tvmonitor", "chair"])
+        self.assertEqual(labelTable.getIds([]).tolist(), [])
@@ -0,0 +1,39 @@
+import unittest
+from context import rayStream
+
+class TestRayStream(unittest.TestCase):
+
+    def setUp(self):
+        self.stream = rayStream.RayStream()
+
+    def testPublishToEveryListener(self):
+        first = self.stream.subscribe()
+        second = self.stream.subscribe()
+        self.stream.publish("rays:a")
+
+        self.assertEqual(first.take(0), ["rays:a"])
+        self.assertEqual(second.take(0), ["rays:a"])
+        self.assertEqual(first.take(0), [])
+
+    def testUnsubscribe(self):
+        listener = self.stream.subscribe()
+        self.stream.unsubscribe(listener)
+        self.stream.publish("rays:a")
+
+        self.assertFalse(self.stream.hasListeners())
+        self.assertEqual(listener.take(0), [])
+
+    def testBoundedBuffer(self):
+        listener = rayStream.StreamListener(maxsize = 2)
+        for event in ["rays:a", "rays:b", "rays:c"]:
+            listener.push(event)
+
+        self.assertEqual(listener.take(0), ["rays:b", "rays:c"])
+        self.assertEqual(listener.dropped, 1)
+
+    def testPollListenerIsKeptBetweenPolls(self):
+        listener = self.stream.pollListener("device")
+        self.stream.publish("rays:a")
+
+        self.assertIs(self.stream.pollListener("device"), listener)
+        self.assertEqual(listener.take(0), ["rays:a"])
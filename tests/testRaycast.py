@@ -0,0 +1,71 @@
+import unittest
+import numpy as np
+from context import raycast
+from context import objects
+
+MATSSTRING = "Projection:1.5 0 0.1 0\n0 2.6 0.2 0\n0 0 -1 0\n0 0 -1 0\n;"\
+             "World:0 0.1 -1 0.5\n0.1 1 0 1.2\n1 0 0 -0.3\n0 0 0 1\n"
+
+class TestRaycast(unittest.TestCase):
+
+    camsize = (1280., 720.)
+
+    def testParseMats(self):
+        projection, world = raycast.Raycast.parseMats(MATSSTRING)
+        self.assertEqual(projection.shape, (4, 4))
+        self.assertEqual(world.shape, (4, 4))
+        self.assertEqual(projection[1][1], 2.6)
+        self.assertEqual(world[0][3], 0.5)
+
+    def testFromObjects2DMatchesFromObject2D(self):
+        projection, world = raycast.Raycast.parseMats(MATSSTRING)
+        mats = raycast.CameraMats(projection, world)
+        objects2D = [objects.Object2D("chair", 0.5, 10, 20, 30, 40),
+                     objects.Object2D("tvmonitor", 0.8, 640, 360, 100, 50),
+                     objects.Object2D("person", 0.9, 1200, 700, 80, 160)]
+
+        raycasts = raycast.Raycast.fromObjects2D(objects2D, mats, self.camsize)
+
+        self.assertEqual(len(raycasts), len(objects2D))
+        for object2D, ray in zip(objects2D, raycasts):
+            expected = raycast.Raycast.fromObject2D(object2D, projection,
+                                                    world, self.camsize)
+            self.assertEqual(ray.label, expected.label)
+            self.assertEqual(ray.confidence, expected.confidence)
+            np.testing.assert_allclose(ray.wpointCenterNear,
+                                       expected.wpointCenterNear)
+            np.testing.assert_allclose(ray.wpointCenterFar,
+                                       expected.wpointCenterFar)
+
+    def testFromObjects2DEmpty(self):
+        projection, world = raycast.Raycast.parseMats(MATSSTRING)
+        mats = raycast.CameraMats(projection, world)
+        self.assertEqual(raycast.Raycast.fromObjects2D([], mats, self.camsize),
+                         [])
+
+    def testEquality(self):
+        ray = raycast.Raycast("chair", 0.5, np.array([0., 0., 0., 1.]),
+                              np.array([1., 2., 3., 1.]))
+        same = raycast.Raycast("chair", 0.5, np.array([0., 0., 0.]),
+                               np.array([1., 2., 3.]))
+        self.assertEqual(ray, same)
+        self.assertNotEqual(ray, raycast.Raycast("tvmonitor", 0.5,
+                                                 [0., 0., 0.], [1., 2., 3.]))
+        self.assertNotEqual(ray, raycast.Raycast("chair", 0.5, [0., 0., 0.],
+                                                 [1., 2., 4.]))
+        self.assertNotEqual(ray, raycast.Raycast("chair", 0.7, [0., 0., 0.],
+                                                 [1., 2., 3.]))
+        self.assertNotEqual(ray, raycast.Raycast("chair", 0.5, [0., 0., 0.],
+                                                 [1., 2., 3.], 1))
+        self.assertNotEqual(ray, "chair")
+
+        face = objects.Face("dummy", ray, "Ada")
+        self.assertEqual(face, objects.Face(None, same, "Ada"))
+        self.assertNotEqual(face, objects.Face("dummy", ray, "Bob"))
+
+    def testSlots(self):
+        ray = raycast.Raycast("chair", 0.5, [0., 0., 0.], [1., 2., 3.])
+        with self.assertRaises(AttributeError):
+            ray.wpointCenter = [1., 2., 3.]
+        with self.assertRaises(AttributeError):
+            objects.Object2D("chair", 0.5, 1, 2, 3, 4).z = 0.
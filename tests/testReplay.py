@@ -0,0 +1,50 @@
+import unittest
+from context import replay, httpHandler
+
+class TestReplay(unittest.TestCase):
+
+    def testSyntheticPayload(self):
+        rawImage, projection, world = httpHandler.HttpHandler.splitImageMats(
+            replay.syntheticPayload((64, 48)))
+
+        self.assertEqual(bytes(rawImage[:2]), b"\xff\xd8")
+        self.assertEqual(projection[1][1], replay.PROJECTION[1][1])
+        self.assertEqual(world[3][3], 1.)
+
+    def testParseMetrics(self):
+        samples = replay.parseMetrics(
+            "# TYPE forhd_queue_depth gauge\n"
+            'forhd_queue_depth{queue="faces"} 3\n'
+            "forhd_stream_listeners 1\n")
+
+        self.assertEqual(samples, {'forhd_queue_depth{queue="faces"}': 3.,
+                                   "forhd_stream_listeners": 1.})
+
+    def testReport(self):
+        results = [replay.Result(0., latency = i / 100., status = 200,
+                                 frameId = str(i)) for i in range(1, 101)]
+        results.append(replay.Result(0., latency = .5, status = 200))
+        results.append(replay.Result(0., error = "reset"))
+        name = 'forhd_frames_dropped_total{reason="window"}'
+
+        report = replay.Report(results, 3, 10., {name: 2.}, {name: 7.})
+
+        self.assertEqual(report.sent, 102)
+        self.assertEqual(report.completed, 100)
+        self.assertEqual(report.skipped, 3)
+        self.assertEqual(report.rejected, 1)
+        self.assertEqual(report.errors, 1)
+        self.assertEqual(report.throughput, 10.)
+        self.assertAlmostEqual(report.percentiles[50], .505)
+        self.assertEqual(report.serverDrops, {'{reason="window"}': 5.})
+        self.assertIn("latency p99", report.format())
+
+    def testReportDelays(self):
+        results = [replay.Result(0., latency = .1, status = 200,
+                                 frameId = "1", delay = delay)
+                   for delay in (.1, .3)]
+
+        report = replay.Report(results, 0, 1.)
+
+        self.assertAlmostEqual(report.meanDelay, .2)
+        self.assertIn("upload delay asked: 200.0ms", report.format())
@@ -0,0 +1,57 @@
+import unittest
+import pickle
+import numpy as np
+from context import resultBatch
+from context import raycast
+from context import objects
+
+def ray(label, x):
+    return raycast.Raycast(label, .5, np.array([0., 0., 0., 1.]),
+                           np.array([x, 1., -1., 1.]), 7)
+
+class TestRayBatch(unittest.TestCase):
+
+    def testRoundTrip(self):
+        rays = [ray("chair", 1.), ray("cup", 2.), ray("chair", 3.)]
+
+        batch = pickle.loads(pickle.dumps(
+            resultBatch.RayBatch.fromRaycasts(7, rays)))
+
+        self.assertEqual(batch.frameId, 7)
+        self.assertEqual(batch.labels, ["chair", "cup"])
+        self.assertEqual(len(batch), 3)
+        unpacked = batch.raycasts()
+        self.assertEqual([r.label for r in unpacked], ["chair", "cup", "chair"])
+        self.assertEqual([r.frameId for r in unpacked], [7, 7, 7])
+        self.assertEqual([str(r) for r in unpacked], [str(r) for r in rays])
+
+    def testEmpty(self):
+        batch = resultBatch.RayBatch.fromRaycasts(3, [])
+
+        self.assertEqual(len(batch), 0)
+        self.assertEqual(batch.raycasts(), [])
+
+class TestFaceBatch(unittest.TestCase):
+
+    def testFaces(self):
+        faces = [objects.Face("/dev/shm/0", ray("Unknown face", 1.), "Ada",
+                              (1, 2, 3, 4)),
+                 objects.Face("/dev/shm/1", ray("Unknown face", 2.),
+                              "Unknown", (5, 6, 7, 8))]
+
+        batch = pickle.loads(pickle.dumps(
+            resultBatch.FaceBatch.fromFaces(7, faces, [True, False])))
+        recognizedFaces, unknownFaces = batch.faces()
+
+        self.assertEqual([f.name for f in recognizedFaces], ["Ada"])
+        self.assertEqual([f.name for f in unknownFaces], ["Unknown"])
+        self.assertEqual(recognizedFaces[0].box, (1, 2, 3, 4))
+        self.assertEqual(unknownFaces[0].raycast.label, "Unknown face")
+        self.assertEqual(unknownFaces[0].toString(True),
+                         faces[1].toString(True))
+
+    def testNoFaces(self):
+        batch = resultBatch.FaceBatch.fromFaces(4, [], [])
+
+        self.assertEqual(batch.frameId, 4)
+        self.assertEqual(batch.faces(), ([], []))
@@ -0,0 +1,116 @@
+import unittest
+from context import session
+
+PROPS = {"setting": True}
+
+class TestSessions(unittest.TestCase):
+
+    def setUp(self):
+        self.sessions = session.Sessions(size = 2, ttl = 60)
+
+    def testGetSameSession(self):
+        first = self.sessions.get("a", PROPS)
+
+        self.assertIs(self.sessions.get("a", PROPS), first)
+        self.assertEqual(len(self.sessions), 1)
+
+    def testOwnSettings(self):
+        first = self.sessions.get("a", PROPS)
+        first.props["setting"] = False
+
+        self.assertTrue(self.sessions.get("b", PROPS).props["setting"])
+        self.assertTrue(PROPS["setting"])
+
+    def testEvictLeastRecentlySeen(self):
+        first = self.sessions.get("a", PROPS)
+        self.sessions.get("b", PROPS)
+        self.sessions.get("a", PROPS)
+
+        third = self.sessions.get("c", PROPS)
+
+        self.assertEqual(sorted(s.key for s in self.sessions), ["a", "c"])
+        self.assertNotEqual(third.index, first.index)
+
+    def testExpire(self):
+        first = self.sessions.get("a", PROPS)
+        self.sessions.get("b", PROPS)
+        first.lastSeen -= 120
+
+        self.sessions.get("c", PROPS)
+
+        self.assertEqual(sorted(s.key for s in self.sessions), ["b", "c"])
+
+    def testFrames(self):
+        first = self.sessions.get("a", PROPS)
+        second = self.sessions.get("b", PROPS)
+        self.sessions.addFrame(1, first)
+        self.sessions.addFrame(2, second)
+
+        self.assertIs(self.sessions.sessionOf(1), first)
+        self.assertIs(self.sessions.sessionOf(2), second)
+        self.sessions.close(first)
+        self.assertIsNone(self.sessions.sessionOf(1))
+
+    def testResetForgetsFrames(self):
+        first = self.sessions.get("a", PROPS)
+        self.sessions.addFrame(1, first)
+
+        self.sessions.reset(first)
+
+        self.assertIsNone(self.sessions.sessionOf(1))
+        self.assertIs(self.sessions.get("a", PROPS), first)
+
+    def testCountersKeepClosedSessions(self):
+        first = self.sessions.get("a", PROPS)
+        first.frameWindow.dropped = 3
+        self.sessions.get("b", PROPS).frameWindow.expired = 1
+
+        self.sessions.close(first)
+
+        self.assertEqual(self.sessions.counters(), (3, 1))
+
+class TestSession(unittest.TestCase):
+
+    def testTakeResults(self):
+        client = session.Session("a", 0, PROPS)
+        client.pendingRays.append("ray")
+
+        rays, faces, objects = client.takeResults()
+
+        self.assertEqual(rays, ["ray"])
+        self.assertEqual(client.pendingRays, [])
+
+    def testResetForgetsResults(self):
+        client = session.Session("a", 0, PROPS)
+        worldMap = client.worldMap
+        client.pendingRays.append("ray")
+        client.pendingObjects.append("object")
+        client.frameWindow.open(1)
+
+        client.reset()
+
+        self.assertEqual(client.takeResults(), ([], [], []))
+        self.assertIsNot(client.worldMap, worldMap)
+        self.assertFalse(client.frameWindow.isPending(1))
+        self.assertEqual(client.frameWindow.dropped, 1)
+
+    def testGenerations(self):
+        client = session.Session("a", 0, PROPS)
+        other = session.Session("b", 0, PROPS)
+        generation = client.generation
+
+        self.assertNotEqual(other.generation, generation)
+        client.reset()
+        self.assertNotIn(client.generation, (generation, other.generation))
+
+class TestSessionStates(unittest.TestCase):
+
+    def testNewGenerationStartsOver(self):
+        states = session.SessionStates(list)
+        state = states.get(0, 1)
+        state.append("face")
+
+        self.assertIs(states.get(0, 1), state)
+        self.assertEqual(states.get(1, 1), [])
+        self.assertEqual(states.get(0, 2), [])
+        self.assertIsNot(states.get(0, 1), state)
@@ -0,0 +1,43 @@
+import unittest
+from multiprocessing import Process, Queue
+import numpy as np
+from context import sharedState
+
+PAIR = np.dtype([("a", "<i8"), ("b", "<i8")])
+
+def readMany(state, n, results):
+    """ Read state n times and count the torn records (a != b) """
+    torn = 0
+    for _ in range(n):
+        record = state.read()
+        torn += record["a"] != record["b"]
+    results.put(torn)
+
+class TestSharedState(unittest.TestCase):
+
+    def testReadWrite(self):
+        state = sharedState.SharedState(sharedState.CAMSIZE,
+                                        size = (1280., 720.))
+
+        np.testing.assert_array_equal(state.read()["size"], (1280., 720.))
+        state.write(size = (896., 504.))
+        np.testing.assert_array_equal(state.read()["size"], (896., 504.))
+        self.assertEqual(state.version(), 2)
+
+    def testReadIsACopy(self):
+        state = sharedState.SharedState(PAIR, a = 1, b = 1)
+        record = state.read()
+        state.write(a = 2, b = 2)
+
+        self.assertEqual(record["a"], 1)
+
+    def testSharedWithOtherProcesses(self):
+        state = sharedState.SharedState(PAIR, a = 0, b = 0)
+        results = Queue()
+        reader = Process(target = readMany, args = (state, 20000, results))
+        reader.start()
+        for i in range(20000):
+            state.write(a = i, b = i)
+        reader.join()
+
+        self.assertEqual(results.get(timeout = 1), 0)
@@ -0,0 +1,75 @@
+import unittest
+import numpy as np
+from context import worldMap
+from context import raycast
+
+CHAIR = np.array([2., 0., 3.])
+
+def rayTowards(label, origin, target, frameId = 1):
+    origin = np.array(origin, dtype = float)
+    direction = (target - origin) / np.linalg.norm(target - origin)
+    return raycast.Raycast(label, 0.5, np.append(origin, 1.),
+                           np.append(origin + direction, 1.), frameId)
+
+class TestWorldMap(unittest.TestCase):
+
+    def setUp(self):
+        self.map = worldMap.WorldMap(cellSize = .5, radius = .2,
+                                     maxDistance = 8., minSpread = .01,
+                                     updateDistance = .1, ttl = 5,
+                                     maxObjects = 10)
+
+    def testFirstRayIsSent(self):
+        ray = rayTowards("chair", (0., 0., 0.), CHAIR)
+
+        newRays, updates = self.map.update([ray], 1)
+
+        self.assertEqual(newRays, [ray])
+        self.assertEqual(updates, [])
+        self.assertEqual(len(self.map), 1)
+
+    def testTriangulate(self):
+        self.map.update([rayTowards("chair", (0., 0., 0.), CHAIR)], 1)
+        newRays, updates = self.map.update(
+            [rayTowards("chair", (3., 0., 0.), CHAIR)], 2)
+
+        self.assertEqual(newRays, [])
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(updates[0].label, "chair")
+        np.testing.assert_allclose((updates[0].x, updates[0].y, updates[0].z),
+                                   CHAIR, atol = 1e-9)
+        self.assertEqual(len(self.map), 1)
+
+    def testSendOnlyWhenMoved(self):
+        self.map.update([rayTowards("chair", (0., 0., 0.), CHAIR)], 1)
+        self.map.update([rayTowards("chair", (3., 0., 0.), CHAIR)], 2)
+
+        newRays, updates = self.map.update(
+            [rayTowards("chair", (1., 0., -1.), CHAIR)], 3)
+
+        self.assertEqual((newRays, updates), ([], []))
+
+    def testOtherLabelIsAnotherObject(self):
+        self.map.update([rayTowards("chair", (0., 0., 0.), CHAIR)], 1)
+
+        cup = rayTowards("cup", (0., 0., 0.), CHAIR)
+        newRays, _ = self.map.update([cup], 2)
+
+        self.assertEqual(newRays, [cup])
+        self.assertEqual(len(self.map), 2)
+
+    def testTwoRaysOfAFrameAreTwoObjects(self):
+        rays = [rayTowards("chair", (0., 0., 0.), CHAIR),
+                rayTowards("chair", (0., 0., 0.), CHAIR + [.1, 0., 0.])]
+
+        newRays, _ = self.map.update(rays, 1)
+
+        self.assertEqual(len(newRays), 2)
+
+    def testExpire(self):
+        self.map.update([rayTowards("chair", (0., 0., 0.), CHAIR)], 1)
+        self.map.update([rayTowards("cup", (0., 0., 0.), -CHAIR)], 10)
+
+        self.assertEqual([obj.label for obj in self.map.objects.values()],
+                         ["cup"])
+        self.assertEqual(set(key[0] for key in self.map.grid), {"cup"})
@@ -0,0 +1,114 @@
+import unittest
+import queue
+from time import sleep
+import numpy as np
+from context import yoloHandler
+from context import detectorBackend
+from context import frameStore
+from context import objects
+
+class FakeBackend(detectorBackend.DetectorBackend):
+    """ Finds a chair on every frame, the odd frames take longer """
+
+    def __init__(self, index = 0):
+        self.index = index
+
+    def detect(self, frameStore, slot, seq):
+        sleep(0.3 if seq % 2 else 0)
+        return [objects.Object2D("chair", 0.5, 10, 10, 4, 4)]
+
+class StuckBackend(FakeBackend):
+    """ Stays stuck on the first frame, dies on the second one """
+
+    def detect(self, frameStore, slot, seq):
+        if seq == 1:
+            sleep(1)
+        elif seq == 2:
+            raise EOFError("gone")
+        return super().detect(frameStore, slot, seq)
+
+class TestYoloHandler(unittest.TestCase):
+
+    def setUp(self):
+        detectorBackend.BACKENDS["fake"] = FakeBackend
+        detectorBackend.BACKENDS["stuck"] = StuckBackend
+        self.store = frameStore.FrameStore(nslots = 4, slotsize = 256)
+        self.handler = yoloHandler.YoloHandler(self.store, backend = "fake",
+                                               instances = 2, verbose = False)
+
+    def tearDown(self):
+        self.handler.close()
+        self.store.close()
+        del detectorBackend.BACKENDS["fake"]
+        del detectorBackend.BACKENDS["stuck"]
+
+    def publish(self):
+        projection = np.eye(4)
+        projection[2, 2] = -1
+        slot, seq = self.store.put(np.zeros((6, 8, 3), np.uint8), projection,
+                                   np.eye(4))
+        self.handler.write(self, slot = slot, seq = seq)
+        return seq
+
+    def testFramesComeBackInOrder(self):
+        first = self.publish()
+        sleep(0.1)
+        second = self.publish()
+
+        # the second frame is done first, but it only comes after the first
+        batch = self.handler.getNextFrame(timeout = 5)
+        self.assertEqual(batch.frameId, first)
+        raycasts = batch.raycasts()
+        self.assertEqual([ray.label for ray in raycasts], ["chair"])
+        self.assertEqual(raycasts[0].frameId, first)
+        self.assertEqual(self.handler.getNextFrame(timeout = 5).frameId,
+                         second)
+
+    def testTakeFrames(self):
+        first = self.publish()
+        self.handler.getNextFrame(timeout = 5)
+        second = self.publish()
+        sleep(0.5)
+        third = self.publish()
+        sleep(0.5)
+
+        frames = self.handler.takeFrames()
+
+        self.assertEqual([batch.frameId for batch in frames], [second, third])
+        self.assertEqual(self.handler.takeFrames(), [])
+
+    def testWaitFrameDoesntTakeIt(self):
+        first = self.publish()
+
+        self.assertTrue(self.handler.waitFrame(timeout = 5))
+        self.assertEqual([batch.frameId for batch in self.handler.takeFrames()],
+                         [first])
+        self.assertFalse(self.handler.waitFrame(timeout = 0.01))
+
+    def testGetNextFrameTimeout(self):
+        self.assertFalse(self.handler.hasObject())
+        with self.assertRaises(queue.Empty):
+            self.handler.getNextFrame(timeout = 0.01)
+        with self.assertRaises(queue.Empty):
+            self.handler.getNextFrame(block = False)
+
+    def testStuckFramesDontHoldTheOthersBack(self):
+        self.handler.close()
+        self.handler = yoloHandler.YoloHandler(self.store, backend = "stuck",
+                                               instances = 2, verbose = False,
+                                               frameTimeout = 0.3)
+        first = self.publish()
+        sleep(0.1)
+        second = self.publish()
+
+        # the first frame is given back empty once late, the second one
+        # comes from the instance that died on it
+        for frameId in (first, second):
+            batch = self.handler.getNextFrame(timeout = 5)
+            self.assertEqual((batch.frameId, len(batch)), (frameId, 0))
+        # the batch of the first frame comes after all, it is ignored
+        sleep(1)
+        self.assertEqual(self.handler.takeFrames(), [])
+        self.assertEqual([detector.is_alive()
+                          for detector in self.handler.detectors].count(True),
+                         1)
@@ -1,4 +1,27 @@
+import testDetectorBackend
+import testFakeDarknet
+import testFakeFaceRecognizer
+import testFaceCache
 import testFaceRecognizerHandler
+import testFaceRecognizerPool
+import testFaceTracker
+import testFrameDispatcher
+import testFrameStore
+import testFrameWindow
+import testHttpHandler
+import testKnownObjects
+import testMetrics
+import testMicro
+import testPacer
+import testRayEncoding
+import testRayStream
+import testRaycast
+import testReplay
+import testResultBatch
+import testSession
+import testSharedState
+import testWorldMap
+import testYoloHandler
 import unittest
 
 if __name__ == "__main__":